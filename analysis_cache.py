@@ -0,0 +1,202 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from llm_utils import estimate_tokens
+
+ANALYSIS_CACHE_FILENAME = 'analysis_cache.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    analysis TEXT NOT NULL,
+    -- Estimated tokens of the call, what a hit saves
+    tokens INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_hit_at REAL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS analyses_created_at ON analyses (created_at);
+CREATE INDEX IF NOT EXISTS analyses_prompt_version ON analyses (prompt_version);
+-- Lookups over the cache's lifetime, for its hit rate; misses leave no entry to count on
+CREATE TABLE IF NOT EXISTS lookups (
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (model, prompt_version)
+);
+"""
+
+def prompt_version(prompt_template: str) -> str:
+    """Short hash identifying a prompt template, so editing the prompt invalidates its analyses"""
+    return hashlib.sha256(prompt_template.encode('utf-8')).hexdigest()[:12]
+
+def cache_key(model: str, prompt_template: str, conversation: str) -> str:
+    """Hash of everything that determines an analysis: the model, the prompt template and the conversation"""
+    digest = hashlib.sha256()
+    for part in (model, prompt_template, conversation):
+        digest.update(part.encode('utf-8'))
+        # Separate the parts, so moving text from one to the next changes the key
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+class AnalysisCache:
+    """
+    Persistent SQLite cache of parsed analyses, keyed by model, prompt template and conversation
+    
+    Hits skip the API call altogether, so re-running after a crash, into a new
+    CSV or over re-extracted conversations only bills new conversations. The
+    connection is shared by the analyzer's worker threads behind a lock.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        # Counters of this run
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+    
+    def close(self):
+        self.conn.close()
+    
+    def get(self, model: str, prompt_template: str, conversation: str) -> Optional[Dict]:
+        """Get the cached analysis of a conversation, or None"""
+        key = cache_key(model, prompt_template, conversation)
+        with self.lock:
+            row = self.conn.execute("SELECT analysis, tokens FROM analyses WHERE key = ?", (key,)).fetchone()
+            hit = row is not None
+            self.conn.execute(
+                """
+                INSERT INTO lookups (model, prompt_version, hits, misses) VALUES (?, ?, ?, ?)
+                ON CONFLICT (model, prompt_version) DO UPDATE SET hits = hits + excluded.hits, misses = misses + excluded.misses
+                """,
+                (model, prompt_version(prompt_template), int(hit), int(not hit))
+            )
+            if not hit:
+                self.conn.commit()
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE analyses SET hits = hits + 1, last_hit_at = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            self.hits += 1
+            self.tokens_saved += row[1]
+        return json.loads(row[0])
+    
+    def put(self, model: str, prompt_template: str, conversation: str, analysis: Dict):
+        """Store the parsed analysis of a conversation"""
+        self.put_key(cache_key(model, prompt_template, conversation), model, prompt_template,
+                     estimate_tokens(prompt_template + conversation), analysis)
+    
+    def put_key(self, key: str, model: str, prompt_template: str, tokens: int, analysis: Dict):
+        """Store a parsed analysis under a key computed earlier, when the conversation is no longer at hand"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO analyses (key, model, prompt_version, analysis, tokens, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, prompt_version(prompt_template), json.dumps(analysis, ensure_ascii=False), tokens, time.time())
+            )
+            self.conn.commit()
+    
+    def print_run_stats(self, price_per_million_tokens: float = None):
+        """Print this run's hit rate and the estimated tokens (and cost) the hits saved"""
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        print(f"\nAnalysis cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1%} hit rate)")
+        saved = f"~{self.tokens_saved} tokens"
+        if price_per_million_tokens is not None:
+            saved += f" (~${self.tokens_saved * price_per_million_tokens / 1e6:.2f})"
+        print(f"Estimated savings: {saved}")
+    
+    def stats(self) -> list:
+        """
+        Get entries, hits, misses and estimated tokens saved over the cache's lifetime, by model and prompt version
+        
+        Rows are (model, prompt version, entries, hits, misses, tokens saved,
+        oldest entry, newest entry). Hits and misses count every lookup,
+        including hits on entries pruned since.
+        """
+        with self.lock:
+            return self.conn.execute(
+                """
+                SELECT entries.model, entries.prompt_version, entries.count, COALESCE(lookups.hits, entries.hits),
+                       COALESCE(lookups.misses, 0), entries.tokens_saved, entries.oldest, entries.newest
+                FROM (
+                    SELECT model, prompt_version, COUNT(*) AS count, SUM(hits) AS hits, SUM(hits * tokens) AS tokens_saved,
+                           MIN(created_at) AS oldest, MAX(created_at) AS newest
+                    FROM analyses
+                    GROUP BY model, prompt_version
+                ) AS entries
+                LEFT JOIN lookups ON lookups.model = entries.model AND lookups.prompt_version = entries.prompt_version
+                ORDER BY entries.newest DESC
+                """
+            ).fetchall()
+    
+    def prune(self, older_than_days: float = None, prompt_version: str = None, keep_prompt_version: str = None) -> int:
+        """Delete entries by age or prompt version and compact the file; returns the entries deleted"""
+        conditions = []
+        params = []
+        if older_than_days is not None:
+            conditions.append("created_at < ?")
+            params.append(time.time() - older_than_days * 86400)
+        if prompt_version is not None:
+            conditions.append("prompt_version = ?")
+            params.append(prompt_version)
+        if keep_prompt_version is not None:
+            conditions.append("prompt_version != ?")
+            params.append(keep_prompt_version)
+        if not conditions:
+            raise ValueError("Prune needs an age or a prompt version")
+        with self.lock:
+            deleted = self.conn.execute(f"DELETE FROM analyses WHERE {' AND '.join(conditions)}", params).rowcount
+            self.conn.commit()
+            self.conn.execute("VACUUM")
+        return deleted
+
+def main():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    parser = argparse.ArgumentParser(description="Inspect or prune the LLM analysis cache")
+    parser.add_argument('--cache', default=os.path.join(current_dir, ANALYSIS_CACHE_FILENAME), help="Analysis cache file")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    stats_parser = subparsers.add_parser('stats', help="Show entries, hits and savings by model and prompt version")
+    stats_parser.add_argument('--price-per-million-tokens', type=float, default=None, help="Price to estimate the cost saved")
+    prune_parser = subparsers.add_parser('prune', help="Delete entries by age or prompt version")
+    prune_parser.add_argument('--older-than-days', type=float, help="Delete entries created more than this many days ago")
+    prune_parser.add_argument('--prompt-version', help="Delete entries of this prompt version")
+    prune_parser.add_argument('--keep-prompt-version', help="Delete entries of every other prompt version")
+    args = parser.parse_args()
+    if args.command == 'prune' and args.older_than_days is None and args.prompt_version is None and args.keep_prompt_version is None:
+        parser.error("prune needs --older-than-days, --prompt-version or --keep-prompt-version")
+    
+    if not os.path.exists(args.cache):
+        raise FileNotFoundError(f"Analysis cache not found: {args.cache}")
+    cache = AnalysisCache(args.cache)
+    try:
+        if args.command == 'stats':
+            print(f"{'model':<30} {'prompt':<12} {'entries':>9} {'hits':>9} {'misses':>9} {'hit rate':>9} {'tokens saved':>14} {'newest':>20}")
+            for model, version, entries, hits, misses, tokens_saved, _, newest in cache.stats():
+                newest = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(newest))
+                hit_rate = hits / (hits + misses) if hits + misses else 0.0
+                line = f"{model:<30} {version:<12} {entries:>9} {hits:>9} {misses:>9} {hit_rate:>9.1%} {tokens_saved:>14} {newest:>20}"
+                if args.price_per_million_tokens is not None:
+                    line += f"  ~${tokens_saved * args.price_per_million_tokens / 1e6:.2f} saved"
+                print(line)
+        else:
+            deleted = cache.prune(args.older_than_days, args.prompt_version, args.keep_prompt_version)
+            print(f"Deleted {deleted} cached analyses")
+    finally:
+        cache.close()
+
+if __name__ == "__main__":
+    main()
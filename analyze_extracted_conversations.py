@@ -1,11 +1,41 @@
+import argparse
 import json
 import os
 import csv
 import time
-import requests
 import google.generativeai as genai
-from typing import Dict, List, Literal
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, List, Literal, Optional
 from dotenv import load_dotenv
+from analysis_cache import ANALYSIS_CACHE_FILENAME, AnalysisCache, cache_key
+from batch_jobs import (MAX_BATCH_REQUESTS, LocalBatchBackend, OpenAIBatchBackend, batch_request_line, iter_jsonl,
+                        load_batch_state, result_content, save_batch_state, wait_for_batch)
+from llm_utils import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, HTTPClient, RateLimiter, ResponseParseError, RetryPolicy, estimate_tokens, parse_json_content
+
+# Columns of the analysis CSV, in the order process_conversation_file writes them
+ANALYSIS_COLUMNS = [
+    'ticket_id',
+    'business_id',
+    'business_type',
+    'business_order_count',
+    'summary',
+    'raw_discovery_tags',
+    'category',
+    'subcategory',
+    'user_intent_failed',
+    'error_code',
+    'system_message',
+    'affected_component',
+    'description',
+    'resolution',
+    'root_cause_hypothesis'
+]
+
+# pyarrow is optional and only needed to read Parquet extraction outputs
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
 
 # Load environment variables
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -21,7 +51,8 @@ def format_business_url(business_id: int) -> str:
     return f'=HYPERLINK("https://admin.coingate.com/admin/businesses/{business_id}", "{business_id}")'
 
 class ConversationAnalyzer:
-    def __init__(self, api_key: str, prompt_template: str, model: Literal["gemini", "deepseek"] = "deepseek"):
+    def __init__(self, api_key: str, prompt_template: str, model: Literal["gemini", "deepseek"] = "deepseek",
+                 retry_policy: RetryPolicy = None, http_client: HTTPClient = None):
         """
         Initialize the analyzer with API key and prompt template
         
@@ -29,145 +60,108 @@ class ConversationAnalyzer:
             api_key: The API key for the selected model
             prompt_template: The template for the analysis prompt
             model: Which model to use ("gemini" or "deepseek")
+            retry_policy: Retry policy for API calls, shared by all threads
+            http_client: Pooled HTTP client for DeepSeek calls; one with a single connection by default
         """
         self.model_type = model
         self.prompt_template = prompt_template
+        self.retry_policy = retry_policy or RetryPolicy()
         
         if model == "gemini":
+            self.model_name = 'models/gemini-2.0-flash-lite'
             genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('models/gemini-2.0-flash-lite')
+            self.model = genai.GenerativeModel(self.model_name)
         else:  # deepseek
+            self.model_name = 'deepseek-chat'
             self.api_key = api_key
+            # Headers are set on the pooled session once instead of on every call
+            self.http_client = http_client or HTTPClient()
+            self.http_client.session.headers.update({
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            })
             self.api_url = "https://api.deepseek.com/v1/chat/completions"
 
-    def analyze_conversation(self, conversation: str, ticket_id: int) -> Dict:
+    def chat_request_body(self, prompt: str) -> Dict:
+        """Chat completion request for a prompt, as DeepSeek takes it and batch job files hold it"""
+        return {
+            "model": self.model_name,
+            "messages": [
+                {"role": "system", "content": "You are a business operations manager at CoinGate."},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.7
+        }
+
+    def request(self, prompt: str) -> str:
+        """Send one prompt to the selected API and return the response text"""
+        if self.model_type == "gemini":
+            # Make API call with Gemini
+            response = self.model.generate_content(
+                contents=[{
+                    "parts": [{
+                        "text": prompt
+                    }]
+                }],
+                safety_settings=[
+                    {
+                        "category": "HARM_CATEGORY_HARASSMENT",
+                        "threshold": "BLOCK_NONE"
+                    },
+                    {
+                        "category": "HARM_CATEGORY_HATE_SPEECH",
+                        "threshold": "BLOCK_NONE"
+                    },
+                    {
+                        "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+                        "threshold": "BLOCK_NONE"
+                    },
+                    {
+                        "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+                        "threshold": "BLOCK_NONE"
+                    }
+                ]
+            )
+            content = response.text
+        else:
+            # Make API call with DeepSeek
+            response = self.http_client.post(self.api_url, json=self.chat_request_body(prompt))
+            response.raise_for_status()
+            content = response.json()['choices'][0]['message']['content']
+        return content
+    
+    def analyze_conversation(self, conversation: str, ticket_id: int, acquire: Callable[[], Any] = None) -> Dict:
         """
-        Analyze a single conversation using the selected API with retry mechanism
+        Analyze a single conversation using the selected API, retried by the retry policy
         
         Args:
             conversation: The conversation text to analyze
             ticket_id: The ticket ID for logging purposes
+            acquire: Called before every attempt, retries included, such as a rate limiter's acquire
             
         Returns:
-            Dict: The structured analysis result
+            Dict: The structured analysis result, with "failed" set when the call or parsing failed
         """
-        max_retries = 5
-        retry_count = 0
-        
-        while retry_count < max_retries:
-            try:
-                # Format the prompt with the conversation
-                prompt = self.prompt_template.format(conversation=conversation)
-                
-                if self.model_type == "gemini":
-                    # Make API call with Gemini
-                    response = self.model.generate_content(
-                        contents=[{
-                            "parts": [{
-                                "text": prompt
-                            }]
-                        }],
-                        safety_settings=[
-                            {
-                                "category": "HARM_CATEGORY_HARASSMENT",
-                                "threshold": "BLOCK_NONE"
-                            },
-                            {
-                                "category": "HARM_CATEGORY_HATE_SPEECH",
-                                "threshold": "BLOCK_NONE"
-                            },
-                            {
-                                "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                                "threshold": "BLOCK_NONE"
-                            },
-                            {
-                                "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                                "threshold": "BLOCK_NONE"
-                            }
-                        ]
-                    )
-                    content = response.text
-                else:
-                    # Make API call with DeepSeek
-                    headers = {
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    }
-                    
-                    data = {
-                        "model": "deepseek-chat",
-                        "messages": [
-                            {"role": "system", "content": "You are a business operations manager at CoinGate."},
-                            {"role": "user", "content": prompt}
-                        ],
-                        "temperature": 0.7
-                    }
-                    
-                    response = requests.post(self.api_url, headers=headers, json=data)
-                    response.raise_for_status()
-                    content = response.json()['choices'][0]['message']['content']
-                
-                # Try to access the content
-                try:
-                    # Strip markdown code blocks if present
-                    if content.startswith('```'):
-                        content = content.split('\n', 1)[1]  # Remove first line (```json)
-                        content = content.rsplit('\n', 1)[0]  # Remove last line (```)
-                    content = content.strip()
-                    
-                    # Fix escaped quotes before parsing JSON
-                    content = content.replace('\\\'', "'")
-                    
-                    # Parse the response as JSON
-                    analysis = json.loads(content)
-                    return analysis
-                    
-                except Exception as e:
-                    print(f"Error accessing response content: {str(e)}")
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        print(f"Retrying in 10 seconds... (Attempt {retry_count + 1}/{max_retries})")
-                        time.sleep(10)
-                        continue
-                    return {
-                        "summary": "Error accessing response content",
-                        "technical_issues": [],
-                        "keywords": []
-                    }
-                
-            except Exception as e:
-                error_str = str(e)
-                # Check if it's a rate limit error
-                if "rate limit" in error_str.lower() or (self.model_type == "deepseek" and hasattr(response, 'status_code') and response.status_code == 429):
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        print(f"\nRate limit reached, retrying in 10 seconds... (Attempt {retry_count + 1}/{max_retries})")
-                        time.sleep(10)
-                        continue
-                    return {
-                        "summary": f"Error: {error_str}",
-                        "technical_issues": [],
-                        "keywords": []
-                    }
-                else:
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        print(f"Error in analyze_conversation: {error_str}")
-                        print(f"Retrying in 10 seconds... (Attempt {retry_count + 1}/{max_retries})")
-                        time.sleep(10)
-                        continue
-                    return {
-                        "summary": f"Error: {error_str}",
-                        "technical_issues": [],
-                        "keywords": []
-                    }
+        # Format the prompt with the conversation
+        prompt = self.prompt_template.format(conversation=conversation)
         
-        # If we've exhausted all retries
-        return {
-            "summary": "Error: Maximum retry attempts reached",
-            "technical_issues": [],
-            "keywords": []
-        }
+        try:
+            return self.retry_policy.call(lambda: self.request(prompt), parse_json_content, f"ticket {ticket_id}", acquire)
+        except ResponseParseError as e:
+            print(f"Error accessing response content: {str(e)}")
+            return {
+                "summary": "Error accessing response content",
+                "technical_issues": [],
+                "keywords": [],
+                "failed": True
+            }
+        except Exception as e:
+            return {
+                "summary": f"Error: {str(e)}",
+                "technical_issues": [],
+                "keywords": [],
+                "failed": True
+            }
 
 def extract_ticket_id_from_url(url: str) -> int:
     """Extract ticket ID from Zendesk URL or Google Sheets HYPERLINK formula"""
@@ -178,6 +172,46 @@ def extract_ticket_id_from_url(url: str) -> int:
         # Handle regular URL format
         return int(url.replace("https://coingate.zendesk.com/agent/tickets/", ""))
 
+def find_conversation_file(extracted_dir: str, business_type: str) -> str:
+    """Get the extracted conversations file for a business type, preferring Parquet, then JSONL, then legacy JSON"""
+    extensions = ['.parquet', '.jsonl'] if pq is not None else ['.jsonl']
+    for extension in extensions:
+        path = os.path.join(extracted_dir, f'{business_type}_conversations{extension}')
+        if os.path.exists(path):
+            return path
+    return os.path.join(extracted_dir, f'{business_type}_conversations.json')
+
+def iter_conversations(file_path: str) -> Iterator[Dict]:
+    """Lazily yield conversations from a Parquet or JSONL file, or from a legacy JSON list file"""
+    if file_path.endswith('.parquet'):
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=1000):
+            yield from batch.to_pylist()
+    elif file_path.endswith('.jsonl'):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(file_path, 'r') as f:
+            yield from json.load(f)
+
+def iter_ticket_ids(file_path: str) -> Iterator[int]:
+    """Yield the ticket IDs of an extracted file, reading only the Id column of Parquet files"""
+    if file_path.endswith('.parquet'):
+        yield from pq.read_table(file_path, columns=['Id']).column('Id').to_pylist()
+    else:
+        for convo in iter_conversations(file_path):
+            yield convo['Id']
+
+def count_conversations(file_path: str) -> int:
+    """Count conversations in an extracted file without keeping them in memory"""
+    if file_path.endswith('.parquet'):
+        return pq.ParquetFile(file_path).metadata.num_rows
+    if file_path.endswith('.jsonl'):
+        with open(file_path, 'rb') as f:
+            return sum(1 for line in f if line.strip())
+    return sum(1 for _ in iter_conversations(file_path))
+
 def get_processed_ticket_ids(csv_path: str, input_files: List[str]) -> set:
     """Get set of already processed ticket IDs from CSV that also exist in input files"""
     processed_ids = set()
@@ -186,10 +220,7 @@ def get_processed_ticket_ids(csv_path: str, input_files: List[str]) -> set:
         input_ticket_ids = set()
         for input_file in input_files:
             if os.path.exists(input_file):
-                with open(input_file, 'r') as f:
-                    conversations = json.load(f)
-                    for convo in conversations:
-                        input_ticket_ids.add(convo['Id'])
+                input_ticket_ids.update(iter_ticket_ids(input_file))
         
         # Then, only add IDs to processed_ids if they exist in both CSV and input files
         with open(csv_path, 'r') as f:
@@ -200,92 +231,322 @@ def get_processed_ticket_ids(csv_path: str, input_files: List[str]) -> set:
                     processed_ids.add(ticket_id)
     return processed_ids
 
-def process_conversation_file(file_path: str, business_type: str, csv_writer, analyzer: ConversationAnalyzer, processed_ids: set) -> None:
-    """Process a single conversation file and write results to CSV"""
-    print(f"\nProcessing {business_type} conversations...")
+def build_analysis_rows(ticket_id: int, business_id: str, business_type: str, business_order_count, analysis: Dict) -> List[List]:
+    """Turn an analysis into its CSV rows, one per technical issue or a single summary row"""
+    ticket_columns = [
+        format_ticket_url(ticket_id),
+        business_id,
+        business_type,
+        business_order_count,
+        analysis['summary'],
+        ','.join(analysis.get('raw_discovery_tags', []))  # Join raw_discovery_tags with commas
+    ]
+    
+    # Write each technical issue as a separate row
+    if analysis['technical_issues']:
+        return [ticket_columns + [
+            issue.get('category', ''),
+            issue.get('subcategory', ''),
+            issue.get('user_intent_failed', ''),
+            issue.get('error_code', ''),
+            issue.get('system_message', ''),
+            issue.get('affected_component', ''),
+            issue.get('description', ''),
+            issue.get('resolution', ''),
+            issue.get('root_cause_hypothesis', '')
+        ] for issue in analysis['technical_issues']]
     
-    # Read the conversations
-    with open(file_path, 'r') as f:
-        conversations = json.load(f)
+    # If no technical issues, write just the summary and raw_discovery_tags
+    return [ticket_columns + [''] * (len(ANALYSIS_COLUMNS) - len(ticket_columns))]
+
+def analyze_ticket(analyzer: ConversationAnalyzer, conversation: str, ticket_id: int, rate_limiter: Optional[RateLimiter],
+                   cache: Optional[AnalysisCache] = None) -> Dict:
+    """Analyze one conversation from the cache, or with every API attempt let through by the rate limiter"""
+    if cache is not None:
+        analysis = cache.get(analyzer.model_name, analyzer.prompt_template, conversation)
+        if analysis is not None:
+            return analysis
+    acquire = None
+    if rate_limiter is not None:
+        tokens = estimate_tokens(analyzer.prompt_template + conversation)
+        acquire = lambda: rate_limiter.acquire(tokens)
+    analysis = analyzer.analyze_conversation(conversation, ticket_id, acquire)
+    # Failed analyses are retried on the next run; a real summary may well start with "Error"
+    if cache is not None and not analysis.get('failed'):
+        cache.put(analyzer.model_name, analyzer.prompt_template, conversation, analysis)
+    return analysis
+
+def write_analysis(csv_writer, convo: Dict, business_type: str, analysis: Dict) -> bool:
+    """Write the CSV rows of one analyzed conversation, skipping failed analyses; returns whether rows were written"""
+    ticket_id = convo['Id']
+    # Failed analyses stay out of the CSV, so the next run retries them
+    if analysis.get('failed'):
+        print(f"\nSkipping ticket {ticket_id} due to API error")
+        return False
+    csv_writer.writerows(build_analysis_rows(
+        ticket_id, format_business_url(convo['business_id']), business_type, convo['business_order_count'], analysis
+    ))
+    return True
+
+def process_conversation_file(file_path: str, business_type: str, csv_writer, analyzer: ConversationAnalyzer, processed_ids: set,
+                              concurrency: int = 1, rate_limiter: Optional[RateLimiter] = None,
+                              cache: Optional[AnalysisCache] = None) -> None:
+    """
+    Process a single conversation file and write results to CSV
+    
+    With a concurrency above 1, up to that many conversations are analyzed at
+    once on worker threads. Rows are still only written from this thread, in
+    the order the analyses finish. Without a rate limiter, a serial run keeps
+    a one second pause between calls. Conversations found in the cache are
+    not sent to the API at all.
+    """
+    print(f"\nProcessing {business_type} conversations...")
     
-    total = len(conversations)
+    # Count the conversations, then stream them one at a time
+    total = count_conversations(file_path)
     print(f"Found {total} conversations to process")
     
-    for i, convo in enumerate(conversations, 1):
-        ticket_id = convo['Id']
-        
-        # Skip if already processed
-        if ticket_id in processed_ids:
-            print(f"\rSkipping {i}/{total}", end='', flush=True)
-            continue
-            
+    def handle_result(convo: Dict, analysis: Dict):
         try:
-            # Get conversation data and format URLs
-            business_id = format_business_url(convo['business_id'])
-            business_order_count = convo['business_order_count']
-            conversation_text = convo['cleaned_conversation']
+            write_analysis(csv_writer, convo, business_type, analysis)
+        except Exception as e:
+            print(f"\nError processing ticket {convo['Id']}: {str(e)}")
+            # Don't write error to CSV, just log it
+    
+    if concurrency <= 1:
+        for i, convo in enumerate(iter_conversations(file_path), 1):
+            ticket_id = convo['Id']
+            
+            # Skip if already processed
+            if ticket_id in processed_ids:
+                print(f"\rSkipping {i}/{total}", end='', flush=True)
+                continue
             
             # Show progress
             print(f"\r{i}/{total}", end='', flush=True)
             
-            # Analyze the conversation
-            analysis = analyzer.analyze_conversation(conversation_text, ticket_id)
+            try:
+                analysis = analyze_ticket(analyzer, convo['cleaned_conversation'], ticket_id, rate_limiter, cache)
+            except Exception as e:
+                print(f"\nError processing ticket {ticket_id}: {str(e)}")
+                continue
+            handle_result(convo, analysis)
             
-            # Only write to CSV if we got a valid response (not an error)
-            if not analysis['summary'].startswith('Error:'):
-                # Write each technical issue as a separate row
-                if analysis['technical_issues']:
-                    for issue in analysis['technical_issues']:
-                        csv_writer.writerow([
-                            format_ticket_url(ticket_id),
-                            business_id,
-                            business_type,
-                            business_order_count,
-                            analysis['summary'],
-                            ','.join(analysis.get('raw_discovery_tags', [])),  # Join raw_discovery_tags with commas
-                            issue.get('category', ''),
-                            issue.get('subcategory', ''),
-                            issue.get('user_intent_failed', ''),
-                            issue.get('error_code', ''),
-                            issue.get('system_message', ''),
-                            issue.get('affected_component', ''),
-                            issue.get('description', ''),
-                            issue.get('resolution', ''),
-                            issue.get('root_cause_hypothesis', '')
-                        ])
-                else:
-                    # If no technical issues, write just the summary and raw_discovery_tags
-                    csv_writer.writerow([
-                        format_ticket_url(ticket_id),
-                        business_id,
-                        business_type,
-                        business_order_count,
-                        analysis['summary'],
-                        ','.join(analysis.get('raw_discovery_tags', [])),  # Join raw_discovery_tags with commas
-                        '',  # category
-                        '',  # subcategory
-                        '',  # user_intent_failed
-                        '',  # error_code
-                        '',  # system_message
-                        '',  # affected_component
-                        '',  # description
-                        '',  # resolution
-                        ''   # root_cause_hypothesis
-                    ])
-            else:
-                print(f"\nSkipping ticket {ticket_id} due to API error")
+            if rate_limiter is None:
+                # Add a small delay to avoid rate limiting
+                time.sleep(1)
+    else:
+        # Only `concurrency` conversations are held at a time, so memory stays
+        # bounded however long the file is
+        done_count = 0
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            in_flight = {}
             
-        except Exception as e:
-            print(f"\nError processing ticket {ticket_id}: {str(e)}")
-            # Don't write error to CSV, just log it
-        
-        # Add a small delay to avoid rate limiting
-        time.sleep(1)
+            def collect(return_when):
+                nonlocal done_count
+                done, _ = wait(in_flight, return_when=return_when)
+                for future in done:
+                    convo = in_flight.pop(future)
+                    done_count += 1
+                    try:
+                        analysis = future.result()
+                    except Exception as e:
+                        print(f"\nError processing ticket {convo['Id']}: {str(e)}")
+                        continue
+                    handle_result(convo, analysis)
+                print(f"\r{done_count}/{total}", end='', flush=True)
+            
+            for convo in iter_conversations(file_path):
+                if convo['Id'] in processed_ids:
+                    done_count += 1
+                    continue
+                if len(in_flight) >= concurrency:
+                    collect(FIRST_COMPLETED)
+                future = executor.submit(analyze_ticket, analyzer, convo['cleaned_conversation'], convo['Id'], rate_limiter, cache)
+                in_flight[future] = convo
+            while in_flight:
+                collect(FIRST_COMPLETED)
     
     # Print newline after progress counter
     print()
+    if rate_limiter is not None:
+        print(f"Calls waited {rate_limiter.wait_seconds:.1f}s in total for the rate limits")
+
+def write_batch_job(analyzer: ConversationAnalyzer, model: str, business_types: List[str], input_files: List[str],
+                    processed_ids: set, batch_dir: str, csv_writer, cache: Optional[AnalysisCache] = None,
+                    max_requests: int = MAX_BATCH_REQUESTS) -> Optional[Dict]:
+    """
+    Write the conversations not analyzed yet to a new job file, with a tickets file to ingest its results by
+    
+    The requests ask for model, the one the batch backend serves. Conversations
+    found in the cache for that model are written to the CSV straight away
+    instead of being sent. Conversations beyond max_requests are left for the
+    next job.
+    
+    Returns:
+        The state of the new job, or None if no conversation needs a call
+    """
+    job_name = time.strftime('%Y%m%d-%H%M%S')
+    job_path = os.path.join(batch_dir, f'{job_name}.jsonl')
+    tickets_path = os.path.join(batch_dir, f'{job_name}_tickets.jsonl')
+    requests = 0
+    
+    with open(job_path, 'w', encoding='utf-8') as job, open(tickets_path, 'w', encoding='utf-8') as tickets:
+        for business_type, input_file in zip(business_types, input_files):
+            if not os.path.exists(input_file):
+                print(f"Warning: {input_file} not found")
+                continue
+            for convo in iter_conversations(input_file):
+                if requests >= max_requests:
+                    break
+                if convo['Id'] in processed_ids:
+                    continue
+                conversation = convo['cleaned_conversation']
+                if cache is not None:
+                    analysis = cache.get(model, analyzer.prompt_template, conversation)
+                    if analysis is not None:
+                        write_analysis(csv_writer, convo, business_type, analysis)
+                        processed_ids.add(convo['Id'])
+                        continue
+                
+                custom_id = str(convo['Id'])
+                prompt = analyzer.prompt_template.format(conversation=conversation)
+                body = analyzer.chat_request_body(prompt)
+                body['model'] = model
+                job.write(json.dumps(batch_request_line(custom_id, body), ensure_ascii=False) + '\n')
+                # The results only carry the custom ID, so everything the CSV rows and cache need is kept here
+                tickets.write(json.dumps({
+                    'custom_id': custom_id,
+                    'Id': convo['Id'],
+                    'business_type': business_type,
+                    'business_id': convo['business_id'],
+                    'business_order_count': convo['business_order_count'],
+                    'cache_key': cache_key(model, analyzer.prompt_template, conversation),
+                    'tokens': estimate_tokens(analyzer.prompt_template + conversation)
+                }, ensure_ascii=False) + '\n')
+                requests += 1
+    
+    if requests == 0:
+        os.remove(job_path)
+        os.remove(tickets_path)
+        return None
+    print(f"Wrote {requests} requests to '{job_path}'")
+    return {'job_file': job_path, 'tickets_file': tickets_path, 'requests': requests, 'model': model, 'batch_id': None,
+            'status': 'written'}
+
+def ingest_batch_results(output_path: str, tickets_path: str, csv_writer, analyzer: ConversationAnalyzer, model: str,
+                         processed_ids: set, cache: Optional[AnalysisCache] = None) -> int:
+    """
+    Write the analyses of a results file to the CSV by ticket ID, caching them under the job's model
+    
+    Tickets already in the CSV are skipped, so ingesting the same results
+    again after an interrupt doesn't duplicate rows. Failed and unparseable
+    results are left out and go into the next job.
+    
+    Returns:
+        Tickets written
+    """
+    tickets = {ticket['custom_id']: ticket for ticket in iter_jsonl(tickets_path)}
+    written = 0
+    failed = 0
+    for result in iter_jsonl(output_path):
+        ticket = tickets.get(result['custom_id'])
+        if ticket is None or ticket['Id'] in processed_ids:
+            continue
+        try:
+            analysis = parse_json_content(result_content(result))
+        except Exception as e:
+            print(f"Skipping ticket {ticket['Id']}: {str(e)}")
+            failed += 1
+            continue
+        if not write_analysis(csv_writer, ticket, ticket['business_type'], analysis):
+            failed += 1
+            continue
+        processed_ids.add(ticket['Id'])
+        written += 1
+        if cache is not None:
+            cache.put_key(ticket['cache_key'], model, analyzer.prompt_template, ticket['tokens'], analysis)
+    print(f"Ingested {written} analyses, {failed} failed and left for the next job")
+    return written
+
+def run_batch(analyzer: ConversationAnalyzer, backend, business_types: List[str], input_files: List[str], processed_ids: set,
+              batch_dir: str, csv_writer, cache: Optional[AnalysisCache] = None, poll_interval: float = 60.0,
+              max_requests: int = MAX_BATCH_REQUESTS):
+    """
+    Analyze the remaining conversations as one batch job: write, submit, poll and ingest
+    
+    Each step is recorded in the batch directory's state file before the
+    next starts, so running again after an interrupt resumes the job in
+    progress instead of writing a new one.
+    """
+    os.makedirs(batch_dir, exist_ok=True)
+    state = load_batch_state(batch_dir)
+    if state is not None and (state['backend'], state['model']) != (backend.name, backend.model):
+        raise ValueError(f"Batch {state['batch_id']} in '{batch_dir}' was submitted to the {state['backend']} backend "
+                         f"for {state['model']}, not {backend.name} for {backend.model}")
+    
+    if state is None:
+        state = write_batch_job(analyzer, backend.model, business_types, input_files, processed_ids, batch_dir, csv_writer,
+                                cache, max_requests)
+        if state is None:
+            print("No conversations left to analyze")
+            return
+        state['backend'] = backend.name
+        save_batch_state(batch_dir, state)
+    
+    if state['batch_id'] is None:
+        state['batch_id'] = backend.submit(state['job_file'])
+        state['status'] = 'submitted'
+        save_batch_state(batch_dir, state)
+        print(f"Submitted {state['requests']} requests as batch {state['batch_id']}")
+    else:
+        print(f"Resuming batch {state['batch_id']} ({state['status']})")
+    
+    status = wait_for_batch(backend, state, batch_dir, poll_interval)
+    if status['status'] != 'completed':
+        print(f"Warning: batch {state['batch_id']} ended {status['status']}, ingesting the results it has")
+    output_path = backend.download(state['batch_id'], status)
+    if output_path is not None:
+        ingest_batch_results(output_path, state['tickets_file'], csv_writer, analyzer, state['model'], processed_ids, cache)
+    # The job is done; the next run writes a new one for whatever is still missing
+    save_batch_state(batch_dir, None)
 
 def main():
+    parser = argparse.ArgumentParser(description="Analyze extracted support conversations with an LLM")
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help="Conversations analyzed at the same time (default: 1)")
+    parser.add_argument('--rpm', type=float, default=None, help="Requests per minute allowed by the provider quota")
+    parser.add_argument('--tpm', type=float, default=None, help="Tokens per minute allowed by the provider quota")
+    parser.add_argument('--connect-timeout', type=float, default=DEFAULT_CONNECT_TIMEOUT,
+                        help=f"Seconds to connect to the API (default: {DEFAULT_CONNECT_TIMEOUT:g})")
+    parser.add_argument('--read-timeout', type=float, default=DEFAULT_READ_TIMEOUT,
+                        help=f"Seconds to wait for the API response (default: {DEFAULT_READ_TIMEOUT:g})")
+    parser.add_argument('--cache', default=os.path.join(current_dir, ANALYSIS_CACHE_FILENAME),
+                        help=f"Cache of parsed analyses (default: {ANALYSIS_CACHE_FILENAME} next to this script)")
+    parser.add_argument('--no-cache', action='store_true', help="Always call the API and don't cache analyses")
+    parser.add_argument('--price-per-million-tokens', type=float, default=None,
+                        help="Price used to estimate the cost the cache saved")
+    parser.add_argument('--batch', action='store_true',
+                        help="Send the remaining conversations as a batch job and ingest its results; "
+                             "re-run to resume an interrupted job")
+    parser.add_argument('--batch-dir', default=os.path.join(current_dir, 'analysis_batches'),
+                        help="Job files, results and the state of the job in progress (default: analysis_batches)")
+    parser.add_argument('--batch-api-base', default=None,
+                        help="Base URL of an OpenAI-compatible batch API (e.g. https://api.openai.com/v1), "
+                             "called with the BATCH_API_KEY environment variable; "
+                             "without it, jobs are run locally through the synchronous API")
+    parser.add_argument('--batch-model', default=None,
+                        help="Model the batch API runs the job with, required with --batch-api-base")
+    parser.add_argument('--batch-size', type=int, default=MAX_BATCH_REQUESTS,
+                        help=f"Most requests in one job (default: {MAX_BATCH_REQUESTS})")
+    parser.add_argument('--poll-interval', type=float, default=60.0,
+                        help="Seconds between status checks of a submitted job (default: 60)")
+    args = parser.parse_args()
+    if args.batch_api_base and not args.batch_model:
+        parser.error("--batch-api-base needs --batch-model, the model that endpoint serves")
+    if args.batch_model and not args.batch_api_base:
+        parser.error("--batch-model only applies to a batch API given with --batch-api-base")
+    
     # Get API keys from environment variables
     deepseek_api_key = os.getenv('DEEPSEEK_API_KEY')
     gemini_api_key = os.getenv('GEMINI_API_KEY')
@@ -304,7 +565,7 @@ def main():
     # Default prompt template
     prompt_template = """
     You are a business operations manager at CoinGate. Your objective is to analyze customer support conversations from **business merchants** to identify and categorize **unresolved technical issues** on the CoinGate platform. Make sure that all information is written in English. In case the conversation is in another language, translate it, and all the information to English.
-
+    
     **Technical Issue Categories (choose ONE primary category):**
     * **Platform Functionality:**
         * Onboarding/Signup (e.g., account creation errors, form submission)
@@ -337,13 +598,13 @@ def main():
     * **Other:**
         * Security (e.g., fraud flags, account compromise, suspicious activity detection)
         * Feature Limitation (e.g., requested feature not available due to platform design, unchangeable system logic)
-
+    
     **Issues to ignore (do NOT classify as technical issues):**
     * Pending verification (unless there's an underlying **technical block** preventing progress)
     * Suspended order (unless due to an underlying **technical system error**, not compliance or fraud flags)
     * When a customer **fails to provide or provides lacking documents for KYC** (focus on **system issues** preventing submission/processing or unclear instructions, not user error in document provision)
     * Late bank withdrawals (focus on **system issues** causing delays, not external bank processing times)
-
+    
     **Instructions for Analysis and Output:**
     1.  **Focus only on technical issues.** If a conversation begins with a non-technical topic that later shifts to technical problems, disregard the initial non-technical content.
     2.  **Identify only *unresolved* technical issues.**
@@ -352,11 +613,11 @@ def main():
         * However, if a payment issue (even a customer-error one) reveals **other, unrelated, unresolved technical issues** on the platform, **only include those specific, unrelated technical issues**.
     3.  If **no unresolved technical issues** are found based on the above criteria, the `technical_issues` array **must be empty** (`[]`).
     4.  For fields like `error_code`, `system_message`, and `affected_component` within the `technical_issues` array, populate them **if the information is directly mentioned or can be logically inferred from the conversation details.** If not, leave the field empty.
-
+    
     **Your response MUST be a valid JSON object with exactly these fields:**
     * `"summary"`: A brief summary of the conversation's core topic (1-2 sentences, max two sentences, no lists).
     * `"raw_discovery_tags"`: An array of strings. Extract **ONLY concise, technical terms or phrases that directly describe a *problematic system behavior, error message, or specific technical component failure*. Focus on terms that would directly help an engineer diagnose the bug or understand the specific failure mode.**
-
+        
         **Examples of what to INCLUDE (Focus strictly on these types of diagnostic clues):**
         * Specific HTTP error codes (e.g., "500 error", "404 error", "419 error", "error 403").
         * Exact system error messages or alert texts (e.g., "OrderIsNotValid", "Beneficiary is not valid", "Sorry, you have been blocked", "Cart cannot be loaded").
@@ -364,7 +625,7 @@ def main():
         * Specific failure modes of actions (e.g., "document upload failure", "2FA reset issue", "callback not sent", "payment not detected", "withdrawal stuck", "conversion error").
         * Technical protocols or states *if they are part of the problem description* (e.g., "SSL connection error", "certificate verification failed", "pending status stuck").
         * Cryptocurrency details *only if related to a system problem* (e.g., "USDT conversion failure", "wrong network detected").
-
+        
         **EXCLUDE (Be strict about these exclusions - prioritize diagnostics over context):**
         * Specific dates, durations, or timestamps (e.g., "Jan 2nd 2022", "April 2024", "last months", "3 months", "20 hours", "1985-05-08").
         * Personal names or contact details (e.g., "Michael", "Jurgita", "John Doe", email addresses, phone numbers).
@@ -378,7 +639,7 @@ def main():
         * Information that simply describes the *content* of a document or an *external system* without a clear technical issue on CoinGate's side (e.g., "privat bank statement", "verified page with a blue check mark", "reviews of my services").
         * Generic phrases that are not specific diagnostic clues (e.g., "same problem", "issue", "problem", "not working", "technical difficulties" on their own).
         * Specific numerical values or amounts unless they are part of a system limit or a diagnostic clue.
-
+        
         Be comprehensive but concise. Focus *strictly* on technical failure points and diagnostic clues.
     * `"technical_issues"`: An array of objects. Each object in this array **must** have exactly these fields:
         * `"category"`: The **primary category** of the technical issue from the provided list.
@@ -390,13 +651,21 @@ def main():
         * `"root_cause_hypothesis"`: [Optional] A brief, technical hypothesis for the underlying cause of the issue (e.g., "Incorrect API parameter usage", "Database synchronization delay", "Frontend validation bug", "Regulatory limitation"). Leave empty if not clearly inferable from the conversation.
     If a parameter is not present in the conversation, leave the field empty but include the field in the JSON object.arameter usage", "Database synchronization delay", "Frontend validation bug", "Regulatory limitation"). Leave empty if not clearly inferable from the conversation.
         If a parameter is not present in the conversation, leave the field empty but include the field in the JSON object.
-
+    
     Conversation:
     {conversation}
     """
     
     # Initialize analyzer with selected model
-    analyzer = ConversationAnalyzer(api_key, prompt_template, model=selected_model)
+    # DeepSeek calls share one keep-alive connection per concurrent call
+    http_client = HTTPClient(max(args.concurrency, 1), args.connect_timeout, args.read_timeout)
+    analyzer = ConversationAnalyzer(api_key, prompt_template, model=selected_model, http_client=http_client)
+    
+    # Calls are gated by the quota when one is given, otherwise paced one per second
+    rate_limiter = RateLimiter(args.rpm, args.tpm) if args.rpm or args.tpm else None
+    
+    # Analyses are cached by model, prompt and conversation, so re-runs only bill new conversations
+    cache = None if args.no_cache else AnalysisCache(args.cache)
     
     # Define input and output paths
     extracted_dir = os.path.join(current_dir, 'extracted_conversations')
@@ -404,7 +673,7 @@ def main():
     
     # Get list of input files
     business_types = ['vip', 'verified', 'previously_verified', 'unverified']
-    input_files = [os.path.join(extracted_dir, f'{business_type}_conversations.json') for business_type in business_types]
+    input_files = [find_conversation_file(extracted_dir, business_type) for business_type in business_types]
     
     # Get already processed ticket IDs that still exist in input files
     processed_ids = get_processed_ticket_ids(output_csv, input_files)
@@ -417,29 +686,35 @@ def main():
         
         # Write header only if file is new
         if not file_exists:
-            writer.writerow([
-                'ticket_id',
-                'business_id',
-                'business_type',
-                'business_order_count',
-                'summary',
-                'raw_discovery_tags',
-                'category',
-                'user_intent_failed',
-                'error_code',
-                'system_message',
-                'affected_component',
-                'resolution',
-                'root_cause_hypothesis'
-            ])
+            writer.writerow(ANALYSIS_COLUMNS)
         
-        # Process each business type
-        for business_type in business_types:
-            input_file = os.path.join(extracted_dir, f'{business_type}_conversations.json')
-            if os.path.exists(input_file):
-                process_conversation_file(input_file, business_type, writer, analyzer, processed_ids)
+        if args.batch:
+            # DeepSeek and Gemini have no OpenAI-compatible batch API, so jobs run locally unless a base URL is given
+            if args.batch_api_base:
+                # The batch API is a different provider than the selected model's, with its own model and key
+                batch_api_key = os.getenv('BATCH_API_KEY')
+                if not batch_api_key:
+                    raise ValueError("BATCH_API_KEY not found in environment variables")
+                backend = OpenAIBatchBackend(args.batch_api_base, batch_api_key, args.batch_model, args.batch_dir,
+                                             HTTPClient(1, args.connect_timeout, args.read_timeout))
             else:
-                print(f"Warning: {input_file} not found")
+                backend = LocalBatchBackend(analyzer, args.batch_dir, args.concurrency, rate_limiter)
+            run_batch(analyzer, backend, business_types, input_files, processed_ids, args.batch_dir, writer, cache,
+                      args.poll_interval, args.batch_size)
+        else:
+            # Process each business type
+            for business_type, input_file in zip(business_types, input_files):
+                if os.path.exists(input_file):
+                    process_conversation_file(input_file, business_type, writer, analyzer, processed_ids,
+                                              args.concurrency, rate_limiter, cache)
+                else:
+                    print(f"Warning: {input_file} not found")
+    
+    if cache is not None:
+        cache.print_run_stats(args.price_per_million_tokens)
+        cache.close()
+    http_client.print_timings()
+    http_client.close()
     
     print(f"\nAnalysis complete! Results saved to '{output_csv}'")
 
@@ -0,0 +1,235 @@
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, Optional
+
+from llm_utils import HTTPClient, RateLimiter, estimate_tokens
+
+# Endpoint every request of a job file is addressed to, in the OpenAI batch format
+BATCH_ENDPOINT = '/v1/chat/completions'
+
+# Most requests the OpenAI-compatible batch endpoints accept in one job
+MAX_BATCH_REQUESTS = 50000
+
+# Batch statuses after which a job won't change any more
+TERMINAL_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+
+BATCH_STATE_FILENAME = 'batch_state.json'
+
+def batch_request_line(custom_id: str, body: Dict) -> Dict:
+    """One line of a job file: a chat completion request tagged with the ID its result comes back under"""
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+def batch_result_line(custom_id: str, content: str = None, error: str = None) -> Dict:
+    """One line of a results file, in the shape the OpenAI-compatible batch endpoints return"""
+    if error is not None:
+        return {"custom_id": custom_id, "response": None, "error": {"message": error}}
+    return {
+        "custom_id": custom_id,
+        "response": {"status_code": 200, "body": {"choices": [{"message": {"role": "assistant", "content": content}}]}},
+        "error": None
+    }
+
+def result_content(result: Dict) -> str:
+    """Get the response text of a results file line, raising if the request failed"""
+    if result.get('error'):
+        raise RuntimeError(result['error'].get('message', result['error']))
+    response = result['response']
+    if response['status_code'] != 200:
+        raise RuntimeError(f"HTTP {response['status_code']}: {response['body']}")
+    return response['body']['choices'][0]['message']['content']
+
+def iter_jsonl(path: str) -> Iterator[Dict]:
+    """Yield the complete lines of a JSONL file, ignoring a line cut short by an interrupted write"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                break
+            if line.strip():
+                yield json.loads(line)
+
+def open_jsonl_for_append(path: str):
+    """Open a JSONL file for appending, first dropping a line cut short by an interrupted write"""
+    if os.path.exists(path):
+        with open(path, 'rb+') as f:
+            data = f.read()
+            complete = data.rfind(b'\n') + 1
+            if complete < len(data):
+                f.truncate(complete)
+    return open(path, 'a', encoding='utf-8')
+
+def load_batch_state(batch_dir: str) -> Optional[Dict]:
+    """Load the state of the job in progress, or None if there is none"""
+    path = os.path.join(batch_dir, BATCH_STATE_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_batch_state(batch_dir: str, state: Optional[Dict]):
+    """Save the state of the job in progress, or clear it with None"""
+    path = os.path.join(batch_dir, BATCH_STATE_FILENAME)
+    if state is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    # Written next to the state file and moved into place, so an interrupt never leaves half a state
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+class LocalBatchBackend:
+    """
+    Local stand-in for a provider batch endpoint, for providers without one (DeepSeek, Gemini)
+    
+    Polling works through the job file's requests with the analyzer's
+    synchronous API and model, at the given concurrency and rate limits
+    (every attempt, retries included, waits for the rate limiter), and appends
+    each result to the results file as soon as it arrives. Requests already
+    in the results file are not sent again, so an interrupted poll picks up
+    where it stopped.
+    """
+    
+    name = 'local'
+    
+    def __init__(self, analyzer, batch_dir: str, concurrency: int = 1, rate_limiter: Optional[RateLimiter] = None):
+        self.analyzer = analyzer
+        self.model = analyzer.model_name
+        self.batch_dir = batch_dir
+        self.concurrency = max(concurrency, 1)
+        self.rate_limiter = rate_limiter
+    
+    def output_path(self, batch_id: str) -> str:
+        return os.path.join(self.batch_dir, f'{batch_id}_output.jsonl')
+    
+    def submit(self, job_path: str) -> str:
+        """Accept a job file; the requests are sent while polling"""
+        return f"local-{os.path.splitext(os.path.basename(job_path))[0]}"
+    
+    def _run(self, request: Dict) -> Dict:
+        """Send one job file request and turn the outcome into a results file line"""
+        prompt = request['body']['messages'][-1]['content']
+        acquire = None
+        if self.rate_limiter is not None:
+            tokens = estimate_tokens(prompt)
+            acquire = lambda: self.rate_limiter.acquire(tokens)
+        try:
+            # Responses are parsed at ingestion, so only transport failures are retried here
+            content = self.analyzer.retry_policy.call(lambda: self.analyzer.request(prompt), lambda content: content,
+                                                      request['custom_id'], acquire)
+        except Exception as e:
+            return batch_result_line(request['custom_id'], error=str(e))
+        return batch_result_line(request['custom_id'], content)
+    
+    def poll(self, batch_id: str, job_path: str) -> Dict:
+        """Send the requests without a result yet and return the job's status"""
+        output_path = self.output_path(batch_id)
+        done_ids = {result['custom_id'] for result in iter_jsonl(output_path)}
+        total = sum(1 for _ in iter_jsonl(job_path))
+        done_count = len(done_ids)
+        
+        with open_jsonl_for_append(output_path) as output, ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            in_flight = set()
+            
+            def collect():
+                nonlocal done_count
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    in_flight.remove(future)
+                    output.write(json.dumps(future.result(), ensure_ascii=False) + '\n')
+                    done_count += 1
+                # Flushed per result, so an interrupt loses at most the calls in flight
+                output.flush()
+                print(f"\r{done_count}/{total}", end='', flush=True)
+            
+            for request in iter_jsonl(job_path):
+                if request['custom_id'] in done_ids:
+                    continue
+                if len(in_flight) >= self.concurrency:
+                    collect()
+                in_flight.add(executor.submit(self._run, request))
+            while in_flight:
+                collect()
+        print()
+        
+        return {'status': 'completed', 'completed': done_count, 'total': total, 'output_file': output_path}
+    
+    def download(self, batch_id: str, status: Dict) -> str:
+        """Get the path of the job's results file"""
+        return self.output_path(batch_id)
+
+class OpenAIBatchBackend:
+    """
+    Client for an OpenAI-compatible batch endpoint (/files and /batches)
+    
+    The job file is uploaded, a batch is created over it and its status is
+    polled until the provider finishes it, within its 24 hour window. The
+    endpoint's own model and API key are used, not the analyzer's.
+    """
+    
+    name = 'openai'
+    
+    def __init__(self, api_base: str, api_key: str, model: str, batch_dir: str, http_client: HTTPClient = None):
+        self.api_base = api_base.rstrip('/')
+        self.model = model
+        self.batch_dir = batch_dir
+        self.http_client = http_client or HTTPClient()
+        # Not a JSON content type: the job file is uploaded as a multipart form
+        self.http_client.session.headers['Authorization'] = f"Bearer {api_key}"
+    
+    def submit(self, job_path: str) -> str:
+        """Upload the job file and create a batch over it"""
+        with open(job_path, 'rb') as f:
+            response = self.http_client.post(f"{self.api_base}/files", data={'purpose': 'batch'},
+                                             files={'file': (os.path.basename(job_path), f, 'application/jsonl')})
+        response.raise_for_status()
+        input_file_id = response.json()['id']
+        
+        response = self.http_client.post(f"{self.api_base}/batches", json={
+            "input_file_id": input_file_id,
+            "endpoint": BATCH_ENDPOINT,
+            "completion_window": "24h"
+        })
+        response.raise_for_status()
+        return response.json()['id']
+    
+    def poll(self, batch_id: str, job_path: str) -> Dict:
+        """Get the batch's status from the provider"""
+        response = self.http_client.get(f"{self.api_base}/batches/{batch_id}")
+        response.raise_for_status()
+        batch = response.json()
+        counts = batch.get('request_counts') or {}
+        return {
+            'status': batch['status'],
+            'completed': counts.get('completed', 0) + counts.get('failed', 0),
+            'total': counts.get('total', 0),
+            'output_file': batch.get('output_file_id')
+        }
+    
+    def download(self, batch_id: str, status: Dict) -> Optional[str]:
+        """Download the batch's results file, or None if it produced none"""
+        if not status.get('output_file'):
+            return None
+        output_path = os.path.join(self.batch_dir, f'{batch_id}_output.jsonl')
+        # Downloaded next to the target, so an interrupted download is fetched again
+        response = self.http_client.get(f"{self.api_base}/files/{status['output_file']}/content", stream=True)
+        response.raise_for_status()
+        with open(output_path + '.tmp', 'wb') as f:
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
+        os.replace(output_path + '.tmp', output_path)
+        return output_path
+
+def wait_for_batch(backend, state: Dict, batch_dir: str, poll_interval: float) -> Dict:
+    """Poll a submitted job until it reaches a terminal status, saving the last status seen"""
+    while True:
+        status = backend.poll(state['batch_id'], state['job_file'])
+        state['status'] = status['status']
+        save_batch_state(batch_dir, state)
+        print(f"Batch {state['batch_id']}: {status['status']} ({status['completed']}/{status['total']} requests)")
+        if status['status'] in TERMINAL_STATUSES:
+            return status
+        time.sleep(poll_interval)
@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extract_businesses import assemble_businesses
+from generate_synthetic_data import load_warehouse_frames, make_businesses, write_warehouse_frames
+
+def legacy_assemble_businesses(vip_businesses, verified_businesses, previously_verified_businesses, unverified_businesses,
+                               vip_roles, verified_roles, previously_verified_roles, domain_emails):
+    """The iterrows loop with a roles DataFrame scan per business, used before the grouped assembly"""
+    vip_business_ids = vip_businesses['entity_id'].tolist()
+    
+    # Create a dictionary to store all business information
+    businesses = {}
+    
+    # Process VIP businesses
+    for _, row in vip_businesses.iterrows():
+        business_id = row['entity_id']
+        business_email = row['entity_email']
+        domain = business_email.split('@')[1]
+        
+        # Get role emails
+        role_emails = vip_roles[vip_roles['business_id'] == business_id]['entity_email'].tolist()
+        
+        # Add domain-matching emails that aren't already in role_emails
+        if domain in domain_emails:
+            additional_emails = [email for email in domain_emails[domain] if email not in role_emails]
+            role_emails.extend(additional_emails)
+        
+        businesses[business_id] = {
+            'type': 'vip',
+            'main_email': business_email,
+            'role_emails': role_emails,
+            'order_count': int(row['order_count']),
+            'total_amount_eur': float(row['total_amount_eur'])
+        }
+    
+    # Process verified businesses (excluding VIP ones)
+    for _, row in verified_businesses.iterrows():
+        business_id = row['business_id']
+        if business_id not in vip_business_ids:  # Skip if it's a VIP business
+            businesses[business_id] = {
+                'type': 'verified',
+                'main_email': row['entity_email'],
+                'role_emails': verified_roles[verified_roles['business_id'] == business_id]['entity_email'].tolist(),
+                'order_count': int(row['order_count']),
+                'verification_date': row['verification_success_at'].isoformat() if pd.notnull(row['verification_success_at']) else None
+            }
+    
+    # Process previously verified businesses (excluding VIP ones)
+    for _, row in previously_verified_businesses.iterrows():
+        business_id = row['business_id']
+        if business_id not in vip_business_ids:  # Skip if it's a VIP business
+            businesses[business_id] = {
+                'type': 'previously_verified',
+                'main_email': row['entity_email'],
+                'role_emails': previously_verified_roles[previously_verified_roles['business_id'] == business_id]['entity_email'].tolist(),
+                'order_count': int(row['order_count']),
+                'verification_date': row['verification_first_success_at'].isoformat() if pd.notnull(row['verification_first_success_at']) else None
+            }
+    
+    # Process unverified businesses (excluding VIP ones)
+    for _, row in unverified_businesses.iterrows():
+        business_id = row['business_id']
+        if business_id not in vip_business_ids:  # Skip if it's a VIP business
+            businesses[business_id] = {
+                'type': 'unverified',
+                'main_email': row['entity_email'],
+                'role_emails': [],  # Unverified businesses don't have role emails
+                'order_count': int(row['order_count'])
+            }
+    
+    return businesses
+
+def make_frames(businesses: int, seed: int) -> dict:
+    """Create synthetic warehouse frames, with a few missing verification dates"""
+    rng = random.Random(seed)
+    warehouse_dir = tempfile.mkdtemp(prefix='bench_assemble_')
+    try:
+        write_warehouse_frames(warehouse_dir, make_businesses(businesses, rng), rng)
+        frames = load_warehouse_frames(warehouse_dir)
+    finally:
+        shutil.rmtree(warehouse_dir)
+    for name, column in (('verified_businesses', 'verification_success_at'),
+                         ('previously_verified_businesses', 'verification_first_success_at')):
+        frames[name].loc[frames[name].index % 17 == 0, column] = pd.NaT
+    return frames
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the grouped business assembly with the legacy iterrows loop")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help="Businesses in the warehouse frames")
+    parser.add_argument('--max-legacy', type=int, default=100000,
+                        help="Largest size the quadratic legacy loop is run on (larger sizes only time the new assembly)")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'businesses':>10} {'legacy (s)':>12} {'grouped (s)':>12} {'speedup':>10}")
+    for size in args.sizes:
+        frames = make_frames(size, args.seed)
+
+        start = time.perf_counter()
+        businesses = assemble_businesses(**frames)
+        grouped_time = time.perf_counter() - start
+
+        if size > args.max_legacy:
+            print(f"{size:>10} {'skipped':>12} {grouped_time:>12.3f} {'':>10}")
+            continue
+
+        start = time.perf_counter()
+        legacy_businesses = legacy_assemble_businesses(**frames)
+        legacy_time = time.perf_counter() - start
+
+        # businesses.json must come out byte-identical
+        if json.dumps(businesses, indent=2) != json.dumps(legacy_businesses, indent=2):
+            raise AssertionError(f"Grouped assembly differs from the legacy loop at {size} businesses")
+
+        print(f"{size:>10} {legacy_time:>12.3f} {grouped_time:>12.3f} {legacy_time / grouped_time:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
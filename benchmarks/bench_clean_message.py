@@ -0,0 +1,112 @@
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extract_conversation_jsons import clean_message
+
+def legacy_clean_message(message: str) -> str:
+    """The four-pass cleaner used before the compiled single-pass version"""
+    message = re.sub(r'<[^>]+>', '', message)
+    message = re.sub(r'\*\*|\*|__|_', '', message)
+    message = re.sub(r'\n\s*\n', '\n', message)
+    message = message.strip()
+    return message
+
+WORDS = ['payment', 'order', 'invoice', 'withdrawal', 'USDT', 'callback', 'API', 'merchant',
+         'verification', 'refund', 'please', 'thanks', 'account', 'status', 'pending', 'error']
+
+SIGNATURE = "\n\n--\nBest regards,\n**CoinGate Support**\n\n\n"
+
+def make_body(rng: random.Random, heavy_html: bool = False) -> str:
+    """Create a synthetic Zendesk comment body with typical markup"""
+    paragraphs = []
+    for _ in range(rng.randint(1, 6)):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(5, 60))]
+        if rng.random() < 0.3:
+            words[rng.randrange(len(words))] = f"**{rng.choice(WORDS)}**"
+        if rng.random() < 0.2:
+            words[rng.randrange(len(words))] = f"order_id_{rng.randint(1000, 99999)}"
+        text = ' '.join(words)
+        if rng.random() < 0.5:
+            text = f"<p>{text}</p><br>"
+        paragraphs.append(text)
+    body = ('\n \n' if rng.random() < 0.5 else '\n\n').join(paragraphs)
+    if rng.random() < 0.5:
+        body += SIGNATURE
+    if heavy_html:
+        body = ("<style type=\"text/css\">p { margin: 0 > 1 }</style>"
+                "<script>if (a > b) { track(); }</script>"
+                f"{body}&nbsp;&amp;&lt;done&gt;")
+    return body
+
+# Bodies with '&', entities and script/style blocks, and their exact cleaned text
+GOLDEN_CASES = [
+    # Plain-text URLs and bare '&' are never decoded
+    ("Pay at https://pay.example.com/invoice?id=5&currency=EUR&not_paid=1",
+     "Pay at https://pay.example.com/invoice?id=5&currency=EUR&notpaid=1"),
+    ("5 &times 2 & more", "5 &times 2 & more"),
+    ("Plain text &amp; stays as typed", "Plain text &amp; stays as typed"),
+    # Entities are only decoded in HTML bodies, and only when ';'-terminated
+    ("<p>Fees &amp; limits&nbsp;apply</p>", "Fees & limits\xa0apply"),
+    ("<a href=\"https://x.com/?a=1&b=2\">link</a> ?a=1&copy=2 &#8364;5 &#x20AC;5",
+     "link ?a=1&copy=2 \u20ac5 \u20ac5"),
+    ("<b>5 &times 2</b> &lt;order&gt;", "5 &times 2 <order>"),
+    # Script and style blocks go with their content
+    ("<style>p { margin: 0 > 1 }</style>Hello<script>if (a > b && c) { x(); }</script>\n\n\nBye",
+     "Hello\nBye"),
+    ("<SCRIPT type=\"text/javascript\">var a = '&amp;';</SCRIPT>&quot;ok&quot;", '"ok"'),
+]
+
+def throughput(clean, bodies: List[str], total_bytes: int, repeat: int) -> float:
+    """Return cleaning throughput in MB/s (best of repeat runs)"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for body in bodies:
+            clean(body)
+        best = min(best, time.perf_counter() - start)
+    return total_bytes / best / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Golden-output check and throughput benchmark for clean_message")
+    parser.add_argument('--bodies', type=int, default=20000, help="Number of synthetic comment bodies")
+    parser.add_argument('--repeat', type=int, default=3, help="Timing runs per cleaner (best is reported)")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    bodies = [make_body(rng) for _ in range(args.bodies)]
+    total_bytes = sum(len(body.encode('utf-8')) for body in bodies)
+
+    # Golden check: without heavy HTML the output must match the old cleaner exactly
+    mismatches = [body for body in bodies if clean_message(body) != legacy_clean_message(body)]
+    if mismatches:
+        raise AssertionError(f"{len(mismatches)} bodies differ from the legacy cleaner, first: {mismatches[0]!r}")
+    print(f"Golden check passed on {len(bodies)} bodies ({total_bytes / 1e6:.1f} MB)")
+
+    for body, expected in GOLDEN_CASES:
+        cleaned = clean_message(body)
+        if cleaned != expected:
+            raise AssertionError(f"clean_message({body!r}) returned {cleaned!r}, expected {expected!r}")
+    print(f"Golden cases passed ({len(GOLDEN_CASES)} bodies with entities and script/style blocks)")
+
+    # Heavy HTML is now stripped instead of leaking into the conversation text
+    heavy = make_body(rng, heavy_html=True)
+    for fragment in ('margin', 'track()', '&nbsp;', '&amp;'):
+        if fragment in clean_message(heavy):
+            raise AssertionError(f"Heavy HTML fragment {fragment!r} leaked through clean_message")
+    print("Heavy HTML check passed")
+
+    legacy_mbps = throughput(legacy_clean_message, bodies, total_bytes, args.repeat)
+    current_mbps = throughput(clean_message, bodies, total_bytes, args.repeat)
+    print(f"legacy clean_message:  {legacy_mbps:8.1f} MB/s")
+    print(f"current clean_message: {current_mbps:8.1f} MB/s ({current_mbps / legacy_mbps:.2f}x)")
+
+if __name__ == "__main__":
+    main()
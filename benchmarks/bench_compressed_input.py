@@ -0,0 +1,88 @@
+import argparse
+import bz2
+import gzip
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from business_store import BUSINESS_TYPES
+from extract_conversation_jsons import extract_conversations, zstandard
+
+WORDS = ['payment', 'order', 'invoice', 'withdrawal', 'USDT', 'callback', 'API', 'merchant',
+         'verification', 'refund', 'please', 'thanks', 'account', 'status', 'pending', 'error']
+
+def write_convos(path: str, tickets: int, seed: int):
+    """Write a synthetic convos.json with one Zendesk ticket per line"""
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        for ticket_id in range(1, tickets + 1):
+            requester_id = rng.randint(1, 10 ** 6)
+            comments = [{
+                'id': ticket_id * 100 + i,
+                'author_id': requester_id if i % 2 == 0 else 42,
+                'body': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(10, 200)))
+            } for i in range(rng.randint(1, 8))]
+            f.write(json.dumps({
+                'url': f'https://coingate.zendesk.com/api/v2/tickets/{ticket_id}.json',
+                'id': ticket_id,
+                'requester_id': requester_id,
+                'comments': comments
+            }) + '\n')
+
+def compress(src: str, dst: str, opener):
+    with open(src, 'rb') as f_in, opener(dst) as f_out:
+        shutil.copyfileobj(f_in, f_out, 4 * 1024 * 1024)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare extraction wall time on plain and compressed convos.json")
+    parser.add_argument('--tickets', type=int, default=50000, help="Tickets in the synthetic dump")
+    parser.add_argument('--hit-rate', type=float, default=0.1, help="Share of tickets in the filtered CSVs")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench_compressed_')
+    try:
+        plain_path = os.path.join(work_dir, 'convos.json')
+        write_convos(plain_path, args.tickets, args.seed)
+
+        inputs = [('plain', plain_path)]
+        compress(plain_path, plain_path + '.gz', lambda path: gzip.open(path, 'wb', compresslevel=6))
+        inputs.append(('gzip', plain_path + '.gz'))
+        compress(plain_path, plain_path + '.bz2', lambda path: bz2.open(path, 'wb'))
+        inputs.append(('bz2', plain_path + '.bz2'))
+        if zstandard is not None:
+            compress(plain_path, plain_path + '.zst', lambda path: zstandard.ZstdCompressor().stream_writer(open(path, 'wb')))
+            inputs.append(('zstd', plain_path + '.zst'))
+        else:
+            print("zstandard not installed, skipping zstd input")
+
+        rng = random.Random(args.seed)
+        ticket_index = {
+            ticket_id: (rng.choice(BUSINESS_TYPES), {'Id': ticket_id})
+            for ticket_id in range(1, args.tickets + 1) if rng.random() < args.hit_rate
+        }
+
+        results = []
+        for name, path in inputs:
+            output_dir = os.path.join(work_dir, f'out_{name}')
+            os.makedirs(output_dir)
+            start = time.perf_counter()
+            extract_conversations(path, ticket_index, output_dir, workers=args.workers, full_rebuild=True)
+            results.append((name, os.path.getsize(path), time.perf_counter() - start))
+
+        plain_time = results[0][2]
+        print(f"\n{'input':>8} {'size (MB)':>10} {'wall (s)':>10} {'vs plain':>10}")
+        for name, size, elapsed in results:
+            print(f"{name:>8} {size / 1e6:>10.1f} {elapsed:>10.2f} {elapsed / plain_time:>9.2f}x")
+    finally:
+        shutil.rmtree(work_dir)
+
+if __name__ == "__main__":
+    main()
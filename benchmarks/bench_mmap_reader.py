@@ -0,0 +1,80 @@
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, Iterator
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_synthetic_data import generate
+from run_benchmarks import peak_rss_mb
+
+READERS = ['for-line', 'mmap']
+
+def legacy_lines(path: str) -> Iterator[bytes]:
+    """The `for line in f` loop extract_conversations used before the mmap reader"""
+    with open(path, 'rb') as f:
+        for line in f:
+            yield line
+
+def _run_reader(reader: str, data_dir: str, parse: bool, queue):
+    """Child process entry point, so each reader is measured from a fresh interpreter"""
+    from extract_conversation_jsons import MappedLines, build_id_filter, iter_line_conversations, line_may_match_ticket, load_filtered_csvs
+
+    sys.stdout = open(os.devnull, 'w')
+    convos_path = os.path.join(data_dir, 'convos.json')
+    ticket_index = load_filtered_csvs(os.path.join(data_dir, 'filtered_conversations'))
+    id_filter = build_id_filter(ticket_index)
+    rss_before = peak_rss_mb()
+
+    start = time.perf_counter()
+    lines = legacy_lines(convos_path) if reader == 'for-line' else MappedLines(convos_path)
+    if parse:
+        found = sum(1 for _ in iter_line_conversations(lines, ticket_index, id_filter))
+    else:
+        # Only the ID filter, to isolate the cost of producing the lines
+        found = sum(1 for line in lines if line_may_match_ticket(line, ticket_index, id_filter))
+    queue.put({'seconds': time.perf_counter() - start, 'found': found, 'rss_before_mb': rss_before, 'peak_rss_mb': peak_rss_mb()})
+
+def run_reader(reader: str, data_dir: str, parse: bool) -> Dict:
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_reader, args=(reader, data_dir, parse, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the mmap line reader with a `for line in f` loop on convos.json")
+    parser.add_argument('--data-dir', help="Existing data set from generate_synthetic_data.py (default: generate a temporary one)")
+    parser.add_argument('--tickets', type=int, default=100000, help="Tickets to generate when no --data-dir is given")
+    parser.add_argument('--hit-rate', type=float, default=0.1, help="Share of tickets in the filtered CSVs")
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp(prefix='bench_mmap_')
+    try:
+        data_dir = args.data_dir
+        if data_dir is None:
+            data_dir = os.path.join(temp_dir, 'data')
+            generate(data_dir, args.tickets, hit_rate=args.hit_rate)
+        size_mb = os.path.getsize(os.path.join(data_dir, 'convos.json')) / 1e6
+
+        print(f"\nconvos.json: {size_mb:.0f} MB")
+        print(f"{'mode':>8} {'reader':>9} {'wall (s)':>10} {'MB/s':>8} {'peak RSS (MB)':>14} {'RSS growth (MB)':>16}")
+        for parse in (False, True):
+            results = {reader: run_reader(reader, data_dir, parse) for reader in READERS}
+            if results['for-line']['found'] != results['mmap']['found']:
+                raise AssertionError(f"Readers disagree: {results}")
+            for reader, result in results.items():
+                print(f"{'parse' if parse else 'filter':>8} {reader:>9} {result['seconds']:>10.2f} "
+                      f"{size_mb / result['seconds']:>8.0f} {result['peak_rss_mb']:>14.1f} "
+                      f"{result['peak_rss_mb'] - result['rss_before_mb']:>16.1f}")
+    finally:
+        shutil.rmtree(temp_dir)
+
+if __name__ == "__main__":
+    main()
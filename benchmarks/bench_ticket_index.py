@@ -0,0 +1,81 @@
+import argparse
+import os
+import random
+import sys
+import time
+import pandas as pd
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from business_store import BUSINESS_TYPES
+from extract_conversation_jsons import build_ticket_index
+
+def make_csv_data(rows_per_type: int) -> Dict[str, pd.DataFrame]:
+    """Create synthetic filtered CSV frames with unique ticket IDs"""
+    csv_data = {}
+    next_id = 1
+    for business_type in BUSINESS_TYPES:
+        ids = list(range(next_id, next_id + rows_per_type))
+        next_id += rows_per_type
+        csv_data[business_type] = pd.DataFrame({
+            'Id': ids,
+            'Subject': [f'Ticket {i}' for i in ids],
+            'business_id': [i % 5000 for i in ids],
+            'business_order_count': [i % 97 for i in ids]
+        })
+    return csv_data
+
+def legacy_lookup(csv_data: Dict[str, pd.DataFrame], ticket_ids: List[int]) -> int:
+    """The per-line DataFrame scan used by extract_conversations before the index"""
+    found = 0
+    for ticket_id in ticket_ids:
+        for business_type, df in csv_data.items():
+            if ticket_id in df['Id'].values:
+                df[df['Id'] == ticket_id].iloc[0].to_dict()
+                found += 1
+                break
+    return found
+
+def indexed_lookup(csv_data: Dict[str, pd.DataFrame], ticket_ids: List[int]) -> int:
+    """Build the ticket index once, then do one dictionary probe per line"""
+    ticket_index = build_ticket_index(csv_data)
+    found = 0
+    for ticket_id in ticket_ids:
+        if ticket_index.get(ticket_id) is not None:
+            found += 1
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ticket lookup by DataFrame scan and by prebuilt index")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000],
+                        help="Rows per business type CSV")
+    parser.add_argument('--lines', type=int, default=2000, help="Number of convos.json lines to look up")
+    parser.add_argument('--hit-rate', type=float, default=0.2, help="Share of lines that belong to a filtered ticket")
+    args = parser.parse_args()
+
+    print(f"{'rows/type':>10} {'legacy (s)':>12} {'indexed (s)':>12} {'speedup':>10}")
+    for size in args.sizes:
+        csv_data = make_csv_data(size)
+        max_id = size * len(BUSINESS_TYPES)
+        rng = random.Random(size)
+        ticket_ids = [
+            rng.randint(1, max_id) if rng.random() < args.hit_rate else max_id + rng.randint(1, max_id)
+            for _ in range(args.lines)
+        ]
+
+        start = time.perf_counter()
+        legacy_found = legacy_lookup(csv_data, ticket_ids)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        indexed_found = indexed_lookup(csv_data, ticket_ids)
+        indexed_time = time.perf_counter() - start
+
+        if legacy_found != indexed_found:
+            raise AssertionError(f"Lookup mismatch: legacy found {legacy_found}, indexed found {indexed_found}")
+
+        print(f"{size:>10} {legacy_time:>12.3f} {indexed_time:>12.3f} {legacy_time / indexed_time:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import pandas as pd
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyze_extracted_conversations import ANALYSIS_COLUMNS
+from bench_clean_message import WORDS, make_body
+from business_store import BUSINESS_TYPES
+
+# Share of businesses in each cohort; VIP is always the top 25
+VIP_COUNT = 25
+COHORT_WEIGHTS = {'verified': 0.4, 'previously_verified': 0.1, 'unverified': 0.5}
+
+AGENT_IDS = [900001, 900002, 900003, 900004]
+
+# Columns of the Zendesk ticket export the filtered CSVs are built from
+TICKET_EXPORT_COLUMNS = ['Id', 'Subject', 'Requester email', 'Status', 'Created at']
+
+CATEGORIES = {
+    'Payments & Funds': ['Deposit Issues', 'Withdrawal Issues', 'Refund Process', 'Order Processing'],
+    'KYC & Verification': ['Document Submission', 'Document Rejection', 'Live ID Verification'],
+    'API & Integrations': ['API Endpoint Errors', 'Callback Issues', 'Plugin/Module Compatibility'],
+    'Platform Functionality': ['Account Access', 'User Interface/Experience', 'Notifications']
+}
+
+def business_email(business_id: int) -> str:
+    return f"billing@merchant{business_id}.com"
+
+def role_email(business_id: int, user_index: int) -> str:
+    return f"user{user_index}@merchant{business_id}.com"
+
+def requester_email(business: Dict) -> str:
+    """Email a business's tickets come from: its first role user, or the business itself if it has none"""
+    return role_email(business['id'], 0) if business['roles'] else business_email(business['id'])
+
+def make_businesses(count: int, rng: random.Random) -> List[Dict]:
+    """Create the synthetic business population, the first 25 being the VIPs"""
+    cohorts = list(COHORT_WEIGHTS)
+    weights = list(COHORT_WEIGHTS.values())
+    businesses = []
+    for business_id in range(1, count + 1):
+        business_type = 'vip' if business_id <= VIP_COUNT else rng.choices(cohorts, weights)[0]
+        verified_at = None
+        if business_type != 'unverified':
+            verified_at = pd.Timestamp('2020-01-01', tz='UTC') + pd.Timedelta(seconds=rng.randint(0, 5 * 365 * 86400))
+        businesses.append({
+            'id': business_id,
+            'type': business_type,
+            'email': business_email(business_id),
+            'roles': rng.randint(1, 4) if business_type != 'unverified' else 0,
+            'order_count': rng.randint(5000, 50000) if business_type == 'vip' else int(rng.paretovariate(1.2)) - 1,
+            'total_amount_eur': round(rng.uniform(1e5, 1e7), 2),
+            'verified_at': verified_at
+        })
+    return businesses
+
+def write_warehouse_frames(warehouse_dir: str, businesses: List[Dict], rng: random.Random):
+    """Write the BigQuery result frames that extract_businesses.assemble_businesses consumes"""
+    os.makedirs(warehouse_dir, exist_ok=True)
+    vip = [b for b in businesses if b['type'] == 'vip']
+    # VIPs are verified businesses too, so they also show up in the verified cohort
+    verified = [b for b in businesses if b['type'] in ('vip', 'verified')]
+    previously_verified = [b for b in businesses if b['type'] == 'previously_verified']
+    unverified = [b for b in businesses if b['type'] == 'unverified']
+
+    pd.DataFrame({
+        'entity_id': [b['id'] for b in vip],
+        'entity_email': [b['email'] for b in vip],
+        'order_count': [b['order_count'] for b in vip],
+        'total_amount_eur': [b['total_amount_eur'] for b in vip]
+    }).to_csv(os.path.join(warehouse_dir, 'vip_businesses.csv'), index=False)
+    pd.DataFrame({
+        'entity_email': [b['email'] for b in verified],
+        'business_id': [b['id'] for b in verified],
+        'verification_success_at': [b['verified_at'] for b in verified],
+        'order_count': [b['order_count'] for b in verified]
+    }).to_csv(os.path.join(warehouse_dir, 'verified_businesses.csv'), index=False)
+    pd.DataFrame({
+        'entity_email': [b['email'] for b in previously_verified],
+        'business_id': [b['id'] for b in previously_verified],
+        'verification_first_success_at': [b['verified_at'] for b in previously_verified],
+        'verification_status': ['failed'] * len(previously_verified),
+        'order_count': [b['order_count'] for b in previously_verified]
+    }).to_csv(os.path.join(warehouse_dir, 'previously_verified_businesses.csv'), index=False)
+    pd.DataFrame({
+        'entity_email': [b['email'] for b in unverified],
+        'business_id': [b['id'] for b in unverified],
+        'order_count': [b['order_count'] for b in unverified]
+    }).to_csv(os.path.join(warehouse_dir, 'unverified_businesses.csv'), index=False)
+
+    for name, cohort in (('vip', vip), ('verified', verified), ('previously_verified', previously_verified)):
+        rows = [{
+            'business_id': b['id'],
+            'roles': rng.choice(['owner', 'admin', 'accountant', 'developer']),
+            'user_id': b['id'] * 10 + i,
+            'entity_email': role_email(b['id'], i),
+            'business_email': b['email']
+        } for b in cohort for i in range(b['roles'])]
+        pd.DataFrame(rows, columns=['business_id', 'roles', 'user_id', 'entity_email', 'business_email']).to_csv(
+            os.path.join(warehouse_dir, f'{name}_roles.csv'), index=False)
+
+    # Users sharing a VIP email domain, some of them already role users
+    domain_rows = []
+    for b in vip:
+        domain = b['email'].split('@')[1]
+        for i in range(rng.randint(1, 20)):
+            domain_rows.append({'entity_email': role_email(b['id'], i), 'domain': domain})
+    pd.DataFrame(domain_rows, columns=['entity_email', 'domain']).to_csv(
+        os.path.join(warehouse_dir, 'domain_emails.csv'), index=False)
+
+def load_warehouse_frames(warehouse_dir: str) -> Dict:
+    """Read the synthetic warehouse frames back with the dtypes BigQuery would return"""
+    def read(name: str, date_column: str = None) -> pd.DataFrame:
+        df = pd.read_csv(os.path.join(warehouse_dir, f'{name}.csv'))
+        if date_column:
+            df[date_column] = pd.to_datetime(df[date_column], utc=True)
+        return df
+
+    domain_df = read('domain_emails')
+    domain_emails = {}
+    for domain, email in zip(domain_df['domain'], domain_df['entity_email']):
+        domain_emails.setdefault(domain, []).append(email)
+
+    return {
+        'vip_businesses': read('vip_businesses'),
+        'verified_businesses': read('verified_businesses', 'verification_success_at'),
+        'previously_verified_businesses': read('previously_verified_businesses', 'verification_first_success_at'),
+        'unverified_businesses': read('unverified_businesses'),
+        'vip_roles': read('vip_roles'),
+        'verified_roles': read('verified_roles'),
+        'previously_verified_roles': read('previously_verified_roles'),
+        'domain_emails': domain_emails
+    }
+
+def write_businesses_json(path: str, businesses: List[Dict]):
+    """Write businesses.json in the shape extract_businesses.py produces"""
+    output = {}
+    for b in businesses:
+        entry = {
+            'type': b['type'],
+            'main_email': b['email'],
+            'role_emails': [role_email(b['id'], i) for i in range(b['roles'])],
+            'order_count': b['order_count']
+        }
+        if b['type'] == 'vip':
+            entry['total_amount_eur'] = b['total_amount_eur']
+        elif b['type'] != 'unverified':
+            entry['verification_date'] = b['verified_at'].isoformat()
+        output[str(b['id'])] = entry
+    with open(path, 'w') as f:
+        json.dump(output, f, indent=2)
+
+def make_analysis_row(rng: random.Random, ticket_id: int, business: Dict) -> List:
+    """Create one analysis CSV row in the layout of analyze_extracted_conversations"""
+    category = rng.choice(list(CATEGORIES))
+    tags = [' '.join(rng.sample(WORDS, 2)) for _ in range(rng.randint(1, 4))]
+    return [
+        f'=HYPERLINK("https://coingate.zendesk.com/agent/tickets/{ticket_id}", "{ticket_id}")',
+        f'=HYPERLINK("https://admin.coingate.com/admin/businesses/{business["id"]}", "{business["id"]}")',
+        business['type'],
+        business['order_count'],
+        ' '.join(rng.choice(WORDS) for _ in range(rng.randint(15, 40))) + '.',
+        ','.join(tags),
+        category,
+        rng.choice(CATEGORIES[category]),
+        ' '.join(rng.sample(WORDS, 3)),
+        rng.choice(['', '500', '404', '422']),
+        '',
+        rng.choice(['checkout', 'payouts', 'dashboard', 'API']),
+        ' '.join(rng.choice(WORDS) for _ in range(rng.randint(10, 30))),
+        '',
+        ' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 15)))
+    ]
+
+def generate(output_dir: str, tickets: int, businesses_count: int = None, hit_rate: float = 0.1, seed: int = 42) -> Dict:
+    """
+    Generate a synthetic data set for the whole pipeline in output_dir
+
+    Writes convos.json, the tickets.csv export it was filtered from,
+    filtered_conversations/{business_type}_conversations.csv, businesses.json, the warehouse frames behind businesses.json and an analysis
+    CSV. Everything is streamed, so 10M tickets only need disk space. Returns
+    the manifest that is also saved as manifest.json.
+    """
+    rng = random.Random(seed)
+    businesses_count = businesses_count or max(100, tickets // 50)
+    os.makedirs(output_dir, exist_ok=True)
+
+    print(f"Generating {businesses_count} businesses...")
+    businesses = make_businesses(businesses_count, rng)
+    write_warehouse_frames(os.path.join(output_dir, 'warehouse'), businesses, rng)
+    write_businesses_json(os.path.join(output_dir, 'businesses.json'), businesses)
+
+    print(f"Generating {tickets} tickets...")
+    filtered_dir = os.path.join(output_dir, 'filtered_conversations')
+    os.makedirs(filtered_dir, exist_ok=True)
+    csv_files = {bt: open(os.path.join(filtered_dir, f'{bt}_conversations.csv'), 'w', newline='') for bt in BUSINESS_TYPES}
+    csv_writers = {bt: csv.writer(f) for bt, f in csv_files.items()}
+    for writer in csv_writers.values():
+        writer.writerow(TICKET_EXPORT_COLUMNS + ['business_id', 'business_order_count'])
+    tickets_file = open(os.path.join(output_dir, 'tickets.csv'), 'w', newline='')
+    tickets_writer = csv.writer(tickets_file)
+    tickets_writer.writerow(TICKET_EXPORT_COLUMNS)
+    analysis_file = open(os.path.join(output_dir, 'conversation_analysis.csv'), 'w', newline='')
+    analysis_writer = csv.writer(analysis_file)
+    analysis_writer.writerow(ANALYSIS_COLUMNS)
+
+    filtered = 0
+    analysis_rows = 0
+    try:
+        with open(os.path.join(output_dir, 'convos.json'), 'w') as convos:
+            for ticket_id in range(1, tickets + 1):
+                requester_id = rng.randint(1, 10 ** 7)
+                subject = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 8)))
+                created_at = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:00:00Z"
+                comments = []
+                for i in range(rng.randint(1, 8)):
+                    author_id = requester_id if i % 2 == 0 else rng.choice(AGENT_IDS)
+                    comments.append({
+                        'id': ticket_id * 100 + i,
+                        'type': 'Comment',
+                        'author_id': author_id,
+                        'body': make_body(rng, heavy_html=rng.random() < 0.05),
+                        'public': True,
+                        'created_at': created_at
+                    })
+                convos.write(json.dumps({
+                    'url': f'https://coingate.zendesk.com/api/v2/tickets/{ticket_id}.json',
+                    'id': ticket_id,
+                    'subject': subject,
+                    'status': rng.choice(['solved', 'closed', 'open', 'pending']),
+                    'requester_id': requester_id,
+                    'created_at': created_at,
+                    'comments': comments
+                }) + '\n')
+
+                if rng.random() < hit_rate:
+                    business = businesses[rng.randrange(len(businesses))]
+                    ticket_row = [ticket_id, subject, requester_email(business), 'solved', created_at]
+                    tickets_writer.writerow(ticket_row)
+                    csv_writers[business['type']].writerow(ticket_row + [business['id'], business['order_count']])
+                    filtered += 1
+                    for _ in range(rng.choice([1, 1, 1, 2])):
+                        analysis_writer.writerow(make_analysis_row(rng, ticket_id, business))
+                        analysis_rows += 1
+                else:
+                    tickets_writer.writerow([ticket_id, subject, f"customer{requester_id}@example.com", 'solved', created_at])
+
+                if ticket_id % 100000 == 0:
+                    print(f"\rGenerated {ticket_id}/{tickets} tickets", end='', flush=True)
+    finally:
+        for f in csv_files.values():
+            f.close()
+        tickets_file.close()
+        analysis_file.close()
+    print()
+
+    manifest = {
+        'tickets': tickets,
+        'businesses': businesses_count,
+        'filtered_tickets': filtered,
+        'analysis_rows': analysis_rows,
+        'hit_rate': hit_rate,
+        'seed': seed
+    }
+    with open(os.path.join(output_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Wrote {filtered} filtered tickets and {analysis_rows} analysis rows to '{output_dir}'")
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Zendesk and warehouse data set for the benchmarks")
+    parser.add_argument('output_dir', help="Directory to write the data set to")
+    parser.add_argument('--tickets', type=int, default=10000, help="Tickets in convos.json (10k to 10M)")
+    parser.add_argument('--businesses', type=int, help="Businesses in the warehouse frames (default tickets / 50)")
+    parser.add_argument('--hit-rate', type=float, default=0.1, help="Share of tickets in the filtered CSVs")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    generate(args.output_dir, args.tickets, args.businesses, args.hit_rate, args.seed)
+
+if __name__ == "__main__":
+    main()
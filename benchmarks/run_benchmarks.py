@@ -0,0 +1,250 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+STAGES = ['assemble', 'filter', 'extract', 'analyze', 'standardize']
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+def peak_rss_mb() -> float:
+    """Peak RSS of this process and its finished children in MB (ru_maxrss is in KB on Linux)"""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024
+
+def bench_assemble(data_dir: str, work_dir: str, workers: int) -> Dict:
+    """Time extract_businesses.assemble_businesses on the synthetic warehouse frames"""
+    from extract_businesses import assemble_businesses
+    from generate_synthetic_data import load_warehouse_frames
+
+    frames = load_warehouse_frames(os.path.join(data_dir, 'warehouse'))
+    start = time.perf_counter()
+    businesses = assemble_businesses(**frames)
+    return {'seconds': time.perf_counter() - start, 'items': len(businesses)}
+
+def bench_filter(data_dir: str, work_dir: str, workers: int) -> Dict:
+    """Time filter_conversations over the synthetic ticket export"""
+    from filter_conversations import filter_tickets, load_email_index
+
+    with open(os.path.join(data_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+
+    start = time.perf_counter()
+    email_index = load_email_index(os.path.join(data_dir, 'businesses.json'))
+    counts = filter_tickets(os.path.join(data_dir, 'tickets.csv'), email_index, os.path.join(work_dir, 'filtered_conversations'))
+    seconds = time.perf_counter() - start
+    if sum(counts.values()) != manifest['filtered_tickets']:
+        raise AssertionError(f"Filtered {sum(counts.values())} tickets, the data set has {manifest['filtered_tickets']}")
+    return {'seconds': seconds, 'items': manifest['tickets']}
+
+def bench_extract(data_dir: str, work_dir: str, workers: int) -> Dict:
+    """Time loading the filtered CSVs and a full extraction of convos.json"""
+    from extract_conversation_jsons import extract_conversations, fingerprint_filtered_csvs, load_filtered_csvs
+
+    with open(os.path.join(data_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    filtered_dir = os.path.join(data_dir, 'filtered_conversations')
+    output_dir = os.path.join(work_dir, 'extracted_conversations')
+    os.makedirs(output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    ticket_index = load_filtered_csvs(filtered_dir)
+    extract_conversations(os.path.join(data_dir, 'convos.json'), ticket_index, output_dir, workers=workers,
+                          csv_fingerprint=fingerprint_filtered_csvs(filtered_dir), full_rebuild=True)
+    return {'seconds': time.perf_counter() - start, 'items': manifest['tickets']}
+
+def bench_analyze(data_dir: str, work_dir: str, workers: int) -> Dict:
+    """Time analyze_extracted_conversations over the extract stage output with a stubbed LLM"""
+    import analyze_extracted_conversations as analyzer_module
+    from analyze_extracted_conversations import ANALYSIS_COLUMNS, ConversationAnalyzer
+    from business_store import BUSINESS_TYPES
+
+    class StubAnalyzer(ConversationAnalyzer):
+        """Return a canned analysis instead of calling the API"""
+        def __init__(self):
+            self.model_type = 'stub'
+
+        def analyze_conversation(self, conversation: str, ticket_id: int, acquire=None) -> Dict:
+            return {
+                'summary': f"Merchant reports a problem in a {len(conversation)} character conversation.",
+                'raw_discovery_tags': ['callback not received', '500 error'],
+                'technical_issues': [{
+                    'category': 'API & Integrations',
+                    'subcategory': 'Callback Issues',
+                    'user_intent_failed': 'receive payment callback',
+                    'error_code': '500',
+                    'affected_component': 'callbacks',
+                    'description': conversation[:200],
+                    'root_cause_hypothesis': 'callback endpoint timeout'
+                }] if ticket_id % 3 else []
+            }
+
+    # The stub has no rate limit, so skip the per-request throttling sleep
+    analyzer_module.time.sleep = lambda seconds: None
+
+    extracted_dir = os.path.join(work_dir, 'extracted_conversations')
+    if not os.path.isdir(extracted_dir):
+        raise FileNotFoundError("The analyze stage reads the extract stage output, run the extract stage first")
+    output_csv = os.path.join(work_dir, 'conversation_analysis.csv')
+    if os.path.exists(output_csv):
+        os.remove(output_csv)
+
+    analyzer = StubAnalyzer()
+    items = 0
+    start = time.perf_counter()
+    with open(output_csv, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(ANALYSIS_COLUMNS)
+        for business_type in BUSINESS_TYPES:
+            file_path = analyzer_module.find_conversation_file(extracted_dir, business_type)
+            if os.path.exists(file_path):
+                items += analyzer_module.count_conversations(file_path)
+                analyzer_module.process_conversation_file(file_path, business_type, writer, analyzer, set())
+    return {'seconds': time.perf_counter() - start, 'items': items}
+
+def bench_standardize(data_dir: str, work_dir: str, workers: int) -> Dict:
+    """Time standardize_subcategories over the synthetic analysis CSV with a stubbed LLM"""
+    import standardize_subcategories as standardizer_module
+    from standardize_subcategories import SubcategoryStandardizer, standardize_file
+
+    class StubStandardizer(SubcategoryStandardizer):
+        """Match raw discovery tags against the issue types locally instead of calling the API"""
+        def __init__(self):
+            self.model_type = 'stub'
+
+        def standardize_subcategory(self, case_data: Dict, issue_types: List[Dict]) -> str:
+            raw_tags = case_data['raw_discovery_tags'].lower()
+            matches = [t['tag_name'] for t in issue_types if any(tag.lower() in raw_tags for tag in t['raw_tags'])]
+            return ','.join(matches)
+
+    standardizer_module.time.sleep = lambda seconds: None
+
+    with open(os.path.join(os.path.dirname(BENCH_DIR), 'issue_types.json')) as f:
+        issue_types = json.load(f)['Standardized_Issue_Tags']
+    with open(os.path.join(data_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    output_csv = os.path.join(work_dir, 'cs_report_final.csv')
+    if os.path.exists(output_csv):
+        os.remove(output_csv)
+
+    start = time.perf_counter()
+    standardize_file(os.path.join(data_dir, 'conversation_analysis.csv'), output_csv, StubStandardizer(), issue_types, set())
+    return {'seconds': time.perf_counter() - start, 'items': manifest['analysis_rows']}
+
+STAGE_FUNCTIONS = {
+    'assemble': bench_assemble,
+    'filter': bench_filter,
+    'extract': bench_extract,
+    'analyze': bench_analyze,
+    'standardize': bench_standardize
+}
+
+def _run_stage(stage: str, data_dir: str, work_dir: str, workers: int, queue):
+    """Child process entry point, so every stage starts from a fresh interpreter and its own peak RSS"""
+    # Keep the pipeline's progress output out of the report
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        result = STAGE_FUNCTIONS[stage](data_dir, work_dir, workers)
+        result['peak_rss_mb'] = peak_rss_mb()
+        queue.put(result)
+    except Exception as e:
+        queue.put({'error': f"{type(e).__name__}: {e}"})
+
+def run_stage(stage: str, data_dir: str, work_dir: str, workers: int) -> Dict:
+    """Run one benchmark stage in a spawned child process and collect its timings"""
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_stage, args=(stage, data_dir, work_dir, workers, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    if 'error' in result:
+        raise RuntimeError(f"Stage '{stage}' failed: {result['error']}")
+    result['items_per_s'] = result['items'] / result['seconds'] if result['seconds'] > 0 else 0.0
+    return result
+
+def compare_to_baseline(results: Dict[str, Dict], baseline: Dict, tolerance: float) -> List[str]:
+    """List stages whose throughput dropped or whose peak RSS grew by more than the tolerance"""
+    regressions = []
+    for stage, result in results.items():
+        base = baseline['stages'].get(stage)
+        if base is None:
+            continue
+        if result['items_per_s'] < base['items_per_s'] * (1 - tolerance):
+            regressions.append(f"{stage}: throughput {result['items_per_s']:.0f}/s vs baseline {base['items_per_s']:.0f}/s")
+        if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{stage}: peak RSS {result['peak_rss_mb']:.0f} MB vs baseline {base['peak_rss_mb']:.0f} MB")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each pipeline stage on synthetic data and compare against a stored baseline")
+    parser.add_argument('--data-dir', help="Existing data set from generate_synthetic_data.py (default: generate a temporary one)")
+    parser.add_argument('--tickets', type=int, default=10000, help="Tickets to generate when no --data-dir is given")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--workers', type=int, default=1, help="Extraction worker processes")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument('--save-baseline', action='store_true', help="Store this run as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="Allowed relative slowdown or RSS growth")
+    args = parser.parse_args()
+
+    from generate_synthetic_data import generate
+
+    temp_dir = tempfile.mkdtemp(prefix='cg_bench_')
+    try:
+        data_dir = args.data_dir
+        if data_dir is None:
+            data_dir = os.path.join(temp_dir, 'data')
+            generate(data_dir, args.tickets)
+        with open(os.path.join(data_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+        work_dir = os.path.join(temp_dir, 'work')
+        os.makedirs(work_dir)
+
+        # Keep the pipeline order, the analyze stage reads the extract stage output
+        results = {}
+        for stage in [stage for stage in STAGES if stage in args.stages]:
+            print(f"Running {stage}...")
+            results[stage] = run_stage(stage, data_dir, work_dir, args.workers)
+    finally:
+        shutil.rmtree(temp_dir)
+
+    print(f"\n{manifest['tickets']} tickets, {manifest['businesses']} businesses, {manifest['filtered_tickets']} filtered tickets")
+    print(f"{'stage':>12} {'items':>10} {'wall (s)':>10} {'items/s':>12} {'peak RSS (MB)':>14}")
+    for stage, result in results.items():
+        print(f"{stage:>12} {result['items']:>10} {result['seconds']:>10.2f} {result['items_per_s']:>12.0f} {result['peak_rss_mb']:>14.1f}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'manifest': manifest, 'workers': args.workers, 'stages': results}, f, indent=2)
+        print(f"\nBaseline saved to '{args.baseline}'")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("\nNo baseline to compare against, run with --save-baseline to store one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline['manifest'] != manifest or baseline['workers'] != args.workers:
+        print("\nBaseline was recorded on a different data set or worker count, skipping the comparison")
+        return
+
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\nRegressions beyond {args.tolerance:.0%}:")
+        for regression in regressions:
+            print(f"- {regression}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.tolerance:.0%} against the baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+import argparse
+import json
+import os
+import sqlite3
+from typing import Dict, Iterator, List, Optional, Tuple
+
+BUSINESS_STORE_FILENAME = 'businesses.db'
+
+# Business types from highest to lowest priority, shared by every stage. Kept
+# here because this module only needs the standard library to import.
+BUSINESS_TYPES = ['vip', 'verified', 'previously_verified', 'unverified']
+
+SCHEMA = """
+CREATE TABLE businesses (
+    business_id INTEGER PRIMARY KEY,
+    type TEXT NOT NULL,
+    main_email TEXT,
+    order_count INTEGER,
+    total_amount_eur REAL,
+    verification_date TEXT
+);
+CREATE TABLE business_emails (
+    email TEXT NOT NULL,
+    business_id INTEGER NOT NULL,
+    -- 0 for the main email, then the role emails in their businesses.json order
+    position INTEGER NOT NULL,
+    original_email TEXT NOT NULL,
+    PRIMARY KEY (business_id, position)
+) WITHOUT ROWID;
+CREATE INDEX business_emails_email ON business_emails (email);
+CREATE INDEX businesses_type ON businesses (type);
+"""
+
+def normalize_email(email: str) -> str:
+    """Emails are matched case-insensitively, as Zendesk and the warehouse don't agree on case"""
+    return email.strip().lower()
+
+def email_owner_rank(business_type: str, business_id, position: int) -> Tuple[int, bool, int]:
+    """
+    Sort key deciding which business owns an email shared by several, lowest first
+    
+    The highest priority type wins (in BUSINESS_TYPES order); within a type a
+    main email (position 0) wins over a role email, then the lowest ID.
+    """
+    return BUSINESS_TYPES.index(business_type), position > 0, int(business_id)
+
+def write_business_store(businesses: Dict, path: str):
+    """
+    Write the businesses.json dictionary to an indexed SQLite file
+    
+    The file is built next to the target and moved into place at the end, so
+    readers never see a half-written store.
+    """
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+        conn.executemany(
+            "INSERT INTO businesses VALUES (?, ?, ?, ?, ?, ?)",
+            ((int(business_id), business['type'], business['main_email'], business.get('order_count'),
+              business.get('total_amount_eur'), business.get('verification_date'))
+             for business_id, business in businesses.items())
+        )
+        conn.executemany(
+            "INSERT INTO business_emails VALUES (?, ?, ?, ?)",
+            ((normalize_email(email), int(business_id), position, email)
+             for business_id, business in businesses.items()
+             for position, email in enumerate([business['main_email']] + business['role_emails'])
+             if email)
+        )
+        conn.commit()
+        # The store is written once and then only read, so it can be packed
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+
+class BusinessStore:
+    """
+    Read-only access to a business store written by write_business_store
+    
+    Opening the store only opens the SQLite file, so stages that look up a few
+    businesses or emails don't pay for parsing all of businesses.json.
+    Businesses are returned as the same dictionaries businesses.json holds.
+    """
+    
+    def __init__(self, path: str):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Business store not found: {path}")
+        self.path = path
+        self.conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def close(self):
+        self.conn.close()
+    
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM businesses").fetchone()[0]
+    
+    def role_emails(self, business_id: int) -> List[str]:
+        """Get the role emails of a business, in their businesses.json order"""
+        rows = self.conn.execute(
+            "SELECT original_email FROM business_emails WHERE business_id = ? AND position > 0 ORDER BY position",
+            (business_id,)
+        )
+        return [email for email, in rows]
+    
+    def _business(self, row: Tuple, role_emails: List[str] = None) -> Dict:
+        """Rebuild the businesses.json entry of a businesses row"""
+        business_id, business_type, main_email, order_count, total_amount_eur, verification_date = row
+        business = {
+            'type': business_type,
+            'main_email': main_email,
+            'role_emails': self.role_emails(business_id) if role_emails is None else role_emails,
+            'order_count': order_count
+        }
+        if business_type == 'vip':
+            business['total_amount_eur'] = total_amount_eur
+        elif business_type in ('verified', 'previously_verified'):
+            business['verification_date'] = verification_date
+        return business
+    
+    def get(self, business_id: int) -> Optional[Dict]:
+        """Look up a business by ID, or None if it isn't in the store"""
+        row = self.conn.execute("SELECT * FROM businesses WHERE business_id = ?", (int(business_id),)).fetchone()
+        return self._business(row) if row is not None else None
+    
+    def business_ids_for_email(self, email: str) -> List[int]:
+        """Get the IDs of every business an email is the main or a role email of, owner (email_owner_rank) first"""
+        rows = self.conn.execute(
+            """
+            SELECT business_emails.business_id, businesses.type, MIN(business_emails.position)
+            FROM business_emails
+            JOIN businesses ON businesses.business_id = business_emails.business_id
+            WHERE business_emails.email = ?
+            GROUP BY business_emails.business_id
+            """,
+            (normalize_email(email),)
+        ).fetchall()
+        rows.sort(key=lambda row: email_owner_rank(row[1], row[0], row[2]))
+        return [business_id for business_id, _, _ in rows]
+    
+    def find_by_email(self, email: str) -> Optional[Tuple[int, Dict]]:
+        """Get the highest priority business an email belongs to, as (business_id, business), or None"""
+        business_ids = self.business_ids_for_email(email)
+        if not business_ids:
+            return None
+        return business_ids[0], self.get(business_ids[0])
+    
+    def iter_emails(self) -> Iterator[Tuple[str, int, str, int, int]]:
+        """Yield (normalized email, business_id, type, order count, position) for every main and role email"""
+        yield from self.conn.execute(
+            """
+            SELECT business_emails.email, business_emails.business_id, businesses.type, businesses.order_count,
+                   business_emails.position
+            FROM business_emails
+            JOIN businesses ON businesses.business_id = business_emails.business_id
+            """
+        )
+    
+    def iter_type(self, business_type: str) -> Iterator[Tuple[int, Dict]]:
+        """Yield (business_id, business) for every business of a type, by ID"""
+        # Walk the businesses and their role emails side by side, both in ID
+        # order, instead of querying the role emails of each business
+        rows = self.conn.execute("SELECT * FROM businesses WHERE type = ? ORDER BY business_id", (business_type,))
+        email_rows = self.conn.cursor().execute(
+            """
+            SELECT business_emails.business_id, business_emails.original_email
+            FROM business_emails
+            JOIN businesses ON businesses.business_id = business_emails.business_id
+            WHERE businesses.type = ? AND business_emails.position > 0
+            ORDER BY business_emails.business_id, business_emails.position
+            """,
+            (business_type,)
+        )
+        next_email = email_rows.fetchone()
+        for row in rows:
+            role_emails = []
+            while next_email is not None and next_email[0] == row[0]:
+                role_emails.append(next_email[1])
+                next_email = email_rows.fetchone()
+            yield row[0], self._business(row, role_emails)
+
+def main():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    parser = argparse.ArgumentParser(description="Build or query the indexed business store")
+    parser.add_argument('--store', default=os.path.join(current_dir, BUSINESS_STORE_FILENAME), help="Business store file")
+    parser.add_argument('--build-from', metavar='BUSINESSES_JSON', help="Build the store from an existing businesses.json")
+    parser.add_argument('--id', type=int, help="Print the business with this ID")
+    parser.add_argument('--email', help="Print the business this email belongs to")
+    parser.add_argument('--type', choices=BUSINESS_TYPES, help="Print the IDs of all businesses of this type")
+    args = parser.parse_args()
+    
+    if args.build_from:
+        with open(args.build_from, 'r') as f:
+            businesses = json.load(f)
+        write_business_store(businesses, args.store)
+        print(f"Wrote {len(businesses)} businesses to '{args.store}'")
+    
+    with BusinessStore(args.store) as store:
+        if args.id is not None:
+            print(json.dumps(store.get(args.id), indent=2))
+        if args.email:
+            match = store.find_by_email(args.email)
+            print(json.dumps(match and {'business_id': match[0], **match[1]}, indent=2))
+        if args.type:
+            for business_id, _ in store.iter_type(args.type):
+                print(business_id)
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,304 @@
+import numpy as np
 import pandas as pd
-from google.cloud import bigquery
+import argparse
+import hashlib
 import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List
+from business_store import BUSINESS_STORE_FILENAME, write_business_store
 
-def get_vip_businesses():
-    """Get top 25 businesses by order volume with their order counts"""
-    print("\nStep 1: Getting VIP businesses...")
-    client = bigquery.Client()
+# pyarrow is needed to stream query results and cache them as Parquet; it is
+# checked for when the warehouse client is created, so this module imports without it
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# google-cloud-bigquery is only needed when a query isn't served from the cache
+try:
+    from google.cloud import bigquery
+except ImportError:
+    bigquery = None
+
+# The BigQuery Storage read API is optional; when installed, query results are
+# streamed over it instead of being paged through the REST API
+try:
+    from google.cloud import bigquery_storage
+except ImportError:
+    bigquery_storage = None
+
+# Number of top businesses by 12-month EUR volume classified as VIP
+VIP_BUSINESS_COUNT = 25
+
+# Business IDs per role email query; chunks are sent as an array parameter
+ROLE_QUERY_CHUNK_SIZE = 10000
+
+# Role email queries run at the same time
+ROLE_QUERY_WORKERS = 4
+
+# Cached query results are reused for this long unless --cache-ttl says otherwise
+DEFAULT_CACHE_TTL_HOURS = 24
+
+# Rows per record batch when streaming a cached result
+CACHE_BATCH_ROWS = 65536
+
+# Incremental mode keeps its business snapshot and sync watermark here
+SYNC_STATE_FILENAME = 'sync_state.json'
+SNAPSHOT_TABLES = ['businesses', 'daily_orders', 'roles']
+
+# Incremental mode still rebuilds the snapshot from scratch this often, to
+# correct drift from hard deletes and late-arriving rows
+DEFAULT_FULL_REBUILD_DAYS = 7
+
+# The next incremental run re-reads changes from this long before the last
+# sync started, to cover rows the warehouse loads with a delay
+WATERMARK_OVERLAP = pd.Timedelta(hours=1)
+
+class WarehouseClient:
+    """
+    Runs BigQuery queries through a local Parquet cache
+    
+    Results are streamed as Arrow record batches, so callers can consume them
+    incrementally rather than as one DataFrame. They are cached by the
+    normalized SQL text and query parameters. A cached result younger than the
+    TTL is served without touching BigQuery; in offline mode every query must
+    be served from the cache, whatever its age.
+    """
+    
+    def __init__(self, cache_dir: str = None, ttl_hours: float = DEFAULT_CACHE_TTL_HOURS, offline: bool = False):
+        """
+        Args:
+            cache_dir: Directory for cached results, or None to disable the cache
+            ttl_hours: Maximum age of a cached result
+            offline: Only serve results from the cache
+        """
+        if pa is None:
+            raise ImportError("pyarrow is required to stream and cache warehouse query results (pip install pyarrow)")
+        if offline and cache_dir is None:
+            raise ValueError("Offline mode needs a cache directory")
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_hours * 3600
+        self.offline = offline
+        self._client = None
+        self._bqstorage_client = None
+        self._client_lock = threading.Lock()
+        # (label, source, rows, start, end) of every query, relative to started_at
+        self.timings = []
+        self.started_at = time.perf_counter()
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+    
+    @property
+    def client(self):
+        """The BigQuery client, created on first use so cached and offline runs never need credentials"""
+        with self._client_lock:
+            if self._client is None:
+                if bigquery is None:
+                    raise ImportError("google-cloud-bigquery is required to run warehouse queries")
+                self._client = bigquery.Client()
+                if bigquery_storage is not None:
+                    self._bqstorage_client = bigquery_storage.BigQueryReadClient()
+            return self._client
+    
+    def cache_path(self, query: str, params: list) -> str:
+        """Get the cache file of a query, keyed by its whitespace-normalized SQL and its parameters"""
+        normalized = ' '.join(query.split()).rstrip(';').strip()
+        key = hashlib.sha256(json.dumps([normalized, params], sort_keys=True, default=str).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f'{key}.parquet')
+    
+    def query_batches(self, query: str, params: list = None, label: str = 'query', cached: bool = True) -> Iterator['pa.RecordBatch']:
+        """
+        Run a query, or serve it from the cache, yielding the result as Arrow record batches
+        
+        A BigQuery result is written to the cache batch by batch as it streams
+        through, and only kept once it has been read to the end.
+        
+        Args:
+            query: SQL text
+            params: Query parameters as (name, type, value) tuples; a list value
+                is sent as an array parameter
+            label: Name of the query in the timing report
+            cached: Whether the result may be served from and kept in the cache
+        """
+        start = time.perf_counter()
+        params = [list(param) for param in params or []]
+        cache_path = self.cache_path(query, params) if self.cache_dir is not None and cached else None
+        rows = 0
+        
+        if cache_path is not None and os.path.exists(cache_path):
+            age = time.time() - os.path.getmtime(cache_path)
+            if self.offline or age < self.ttl_seconds:
+                for batch in pq.ParquetFile(cache_path).iter_batches(batch_size=CACHE_BATCH_ROWS):
+                    rows += batch.num_rows
+                    yield batch
+                self.record_timing(label, 'cache', rows, start)
+                return
+        if self.offline:
+            raise FileNotFoundError(f"No cached result for this query in offline mode ({cache_path})")
+        
+        client = self.client
+        job_config = None
+        if params:
+            job_config = bigquery.QueryJobConfig(query_parameters=[
+                bigquery.ArrayQueryParameter(name, param_type, value) if isinstance(value, list)
+                else bigquery.ScalarQueryParameter(name, param_type, value)
+                for name, param_type, value in params
+            ])
+        result = client.query(query, job_config=job_config).result()
+        
+        # Write to a temporary file first, so an interrupted run never leaves a truncated cache entry
+        tmp_path = f'{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp' if cache_path is not None else None
+        writer = None
+        complete = False
+        try:
+            for batch in result.to_arrow_iterable(bqstorage_client=self._bqstorage_client):
+                if tmp_path is not None:
+                    if writer is None:
+                        writer = pq.ParquetWriter(tmp_path, batch.schema)
+                    writer.write_batch(batch)
+                rows += batch.num_rows
+                yield batch
+            complete = True
+        finally:
+            if writer is not None:
+                writer.close()
+                if complete:
+                    os.replace(tmp_path, cache_path)
+                elif os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        self.record_timing(label, 'bigquery', rows, start)
+    
+    def record_timing(self, label: str, source: str, rows: int, start: float):
+        # list.append is atomic, so role chunk threads can record concurrently
+        self.timings.append((label, source, rows, start - self.started_at, time.perf_counter() - self.started_at))
+    
+    def print_timings(self):
+        """Print when each query ran, so the critical path of the run is visible"""
+        print("\nQuery timings (seconds since start):")
+        print(f"{'query':<36} {'source':<9} {'rows':>10} {'start':>8} {'end':>8} {'took':>8}")
+        for label, source, rows, start, end in sorted(self.timings, key=lambda timing: timing[3]):
+            print(f"{label:<36} {source:<9} {rows:>10} {start:>8.1f} {end:>8.1f} {end - start:>8.1f}")
+
+def get_business_cohorts(warehouse: WarehouseClient):
+    """
+    Get the VIP, verified, previously verified and unverified businesses with one scan of fct_orders
+    
+    The 12-month paid order counts and EUR totals are aggregated once and every
+    business is classified in the same result set. VIP businesses (the top
+    VIP_BUSINESS_COUNT by EUR volume) are flagged separately, as they also
+    belong to a verification category.
+    """
+    print("\nStep 1: Getting VIP, verified, previously verified and unverified businesses...")
     
     query = """
     WITH business_orders AS (
         SELECT
-            dim_businesses.entity_id,
-            dim_businesses.entity_email,
+            fct_orders.entity_id,
             COUNT(*) as order_count,
             SUM(fct_orders.pay_amount_eur) as total_amount_eur
         FROM
             `coingate-production`.`dbt_prod_warehouse`.`fct_orders` AS fct_orders
-        INNER JOIN
-            `coingate-production`.`dbt_prod_warehouse`.`dim_businesses` AS dim_businesses
-        ON
-            fct_orders.entity_id = dim_businesses.entity_id
         WHERE
             fct_orders.status = 'paid'
             AND fct_orders.created_at >= DATE_SUB(CURRENT_DATE(), INTERVAL 12 MONTH)
         GROUP BY
-            1, 2
-        ORDER BY
-            SUM(fct_orders.pay_amount_eur) DESC
-        LIMIT 25
+            fct_orders.entity_id
+    ),
+    classified_businesses AS (
+        SELECT
+            dim_businesses.entity_id,
+            dim_businesses.entity_email,
+            dim_businesses.verification_status,
+            dim_businesses.verification_success_at,
+            dim_businesses.verification_first_success_at,
+            COALESCE(bo.order_count, 0) as order_count,
+            bo.total_amount_eur,
+            -- VIP ranks all businesses with paid orders, deleted or not
+            bo.entity_id IS NOT NULL
+                AND ROW_NUMBER() OVER (ORDER BY bo.total_amount_eur DESC NULLS LAST) <= @vip_count as is_vip,
+            CASE
+                WHEN dim_businesses.deleted_at IS NOT NULL THEN NULL
+                WHEN dim_businesses.verification_status = 'success' THEN 'verified'
+                WHEN dim_businesses.verification_status != 'success'
+                    AND dim_businesses.verification_first_success_at IS NOT NULL THEN 'previously_verified'
+                WHEN dim_businesses.verification_status != 'success' THEN 'unverified'
+            END as category
+        FROM
+            `coingate-production`.`dbt_prod_warehouse`.`dim_businesses` AS dim_businesses
+        LEFT JOIN
+            business_orders bo
+        ON
+            dim_businesses.entity_id = bo.entity_id
     )
     SELECT
-        bo.*,
-        COALESCE(bo.order_count, 0) as order_count
+        *
     FROM
-        business_orders bo;
+        classified_businesses
+    WHERE
+        is_vip OR category IS NOT NULL;
     """
     
-    df = client.query(query).to_dataframe()
-    print(f"Found {len(df)} VIP businesses")
-    return df
+    return split_business_cohorts(warehouse.query_batches(query, [('vip_count', 'INT64', VIP_BUSINESS_COUNT)], label='business cohorts'))
+
+def batch_to_frame(batch, categories: List[str] = ()) -> pd.DataFrame:
+    """Convert an Arrow record batch (or a DataFrame) to pandas, with low-cardinality text columns as categoricals"""
+    if isinstance(batch, pd.DataFrame):
+        return batch.astype({column: 'category' for column in categories})
+    return batch.to_pandas(categories=list(categories))
+
+def concat_frames(frames: List[pd.DataFrame], columns: List[str], categories: List[str] = ()) -> pd.DataFrame:
+    """Concatenate per-batch frames, re-unifying categoricals whose categories differ between batches"""
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    df = pd.concat(frames, ignore_index=True)
+    return df.astype({column: 'category' for column in categories})
 
-def get_business_roles(business_ids, business_type):
-    """Get all role emails for businesses"""
-    print(f"\nGetting role emails for {business_type} businesses...")
-    client = bigquery.Client()
+def split_business_cohorts(batches: Iterable) -> tuple:
+    """
+    Split the classified businesses into the VIP, verified, previously verified and unverified frames
+    
+    Batches are split as they arrive, so only the columns each cohort keeps
+    are held in memory, never the full classified result.
+    """
+    cohort_columns = {
+        'vip': ['entity_id', 'entity_email', 'order_count', 'total_amount_eur'],
+        'verified': ['entity_email', 'business_id', 'verification_success_at', 'order_count'],
+        'previously_verified': ['entity_email', 'business_id', 'verification_first_success_at', 'verification_status', 'order_count'],
+        'unverified': ['entity_email', 'business_id', 'order_count']
+    }
+    frames = {cohort: [] for cohort in cohort_columns}
+    
+    for batch in batches:
+        df = batch_to_frame(batch, ['verification_status', 'category'])
+        frames['vip'].append(df.loc[df['is_vip'].astype(bool), cohort_columns['vip']])
+        df = df.rename(columns={'entity_id': 'business_id'})
+        for cohort in ('verified', 'previously_verified', 'unverified'):
+            frames[cohort].append(df.loc[df['category'] == cohort, cohort_columns[cohort]])
+    
+    vip_businesses = concat_frames(frames['vip'], cohort_columns['vip'])
+    vip_businesses = vip_businesses.sort_values('total_amount_eur', ascending=False).reset_index(drop=True)
+    print(f"Found {len(vip_businesses)} VIP businesses")
+    
+    verified_businesses = concat_frames(frames['verified'], cohort_columns['verified'])
+    print(f"Found {len(verified_businesses)} verified businesses")
+    print(f"Verified businesses with 0 orders in past 12 months: {len(verified_businesses[verified_businesses['order_count'] == 0])}")
     
-    # Convert list of business IDs to string for SQL query (without quotes since they're numeric)
-    business_ids_str = ','.join([str(id) for id in business_ids])
+    previously_verified_businesses = concat_frames(frames['previously_verified'], cohort_columns['previously_verified'], ['verification_status'])
+    print(f"Found {len(previously_verified_businesses)} previously verified businesses")
     
-    query = f"""
+    unverified_businesses = concat_frames(frames['unverified'], cohort_columns['unverified'])
+    print(f"Found {len(unverified_businesses)} unverified businesses")
+    
+    return vip_businesses, verified_businesses, previously_verified_businesses, unverified_businesses
+
+def query_business_roles(warehouse: WarehouseClient, business_ids, label: str = 'roles') -> Dict[int, List[str]]:
+    """Get the role emails for one chunk of business IDs (passed as an array parameter), grouped by business"""
+    query = """
     SELECT
         t0.business_id,
         t0.roles,
@@ -67,292 +316,587 @@ def get_business_roles(business_ids, business_type):
     ON
         t0.business_id = dim_businesses.entity_id
     WHERE
-        dim_businesses.entity_id IN ({business_ids_str})
+        dim_businesses.entity_id IN UNNEST(@business_ids)
     ORDER BY
         business_id, roles;
     """
     
-    df = client.query(query).to_dataframe()
-    print(f"Found {len(df)} role emails for {business_type} businesses")
-    return df
+    return group_role_emails(warehouse.query_batches(query, [('business_ids', 'INT64', business_ids)], label))
+
+def get_business_roles(cohort_ids, warehouse: WarehouseClient):
+    """
+    Get all role emails for several business cohorts concurrently
+    
+    Args:
+        cohort_ids: Business IDs by cohort name
+        warehouse: Client the queries run on
+    
+    Returns:
+        Role emails grouped by business ID, by cohort name
+    """
+    print(f"\nGetting role emails for {', '.join(cohort_ids)} businesses...")
+    
+    # Sorted chunks keep each query parameter small; as each chunk is ordered by
+    # business ID, concatenating them in order keeps the ORDER BY of one query
+    chunks = []
+    for cohort, business_ids in cohort_ids.items():
+        business_ids = sorted(set(int(business_id) for business_id in business_ids))
+        for i in range(0, len(business_ids), ROLE_QUERY_CHUNK_SIZE):
+            chunks.append((cohort, business_ids[i:i + ROLE_QUERY_CHUNK_SIZE], f'{cohort} roles {i // ROLE_QUERY_CHUNK_SIZE + 1}'))
+    
+    with ThreadPoolExecutor(max_workers=ROLE_QUERY_WORKERS) as executor:
+        chunk_roles = list(executor.map(lambda chunk: query_business_roles(warehouse, chunk[1], chunk[2]), chunks))
+    
+    # Chunks hold disjoint business IDs, so merging them in order keeps the query order
+    roles = {cohort: {} for cohort in cohort_ids}
+    for (cohort, _, _), role_emails in zip(chunks, chunk_roles):
+        roles[cohort].update(role_emails)
+    for cohort, role_emails in roles.items():
+        print(f"Found {count_role_emails(role_emails)} role emails for {cohort} businesses")
+    return roles
 
-def get_verified_businesses():
-    """Get all verified businesses with their order counts"""
-    print("\nStep 2: Getting verified businesses...")
-    client = bigquery.Client()
+def get_domain_matching_emails(vip_businesses, warehouse: WarehouseClient):
+    """
+    Get all users whose email domains match VIP business domains
+    
+    The match is a join in the warehouse against the domains of the VIP
+    businesses (passed by ID), so only matching users come back.
+    """
+    print("\nGetting additional domain-matching emails for VIP businesses...")
+    vip_business_ids = sorted(int(business_id) for business_id in vip_businesses['entity_id'].tolist())
     
     query = """
-    WITH verified_businesses AS (
-        SELECT
-            dim_businesses.entity_email,
-            dim_businesses.entity_id AS business_id,
-            dim_businesses.verification_success_at
+    WITH vip_domains AS (
+        SELECT DISTINCT
+            SPLIT(dim_businesses.entity_email, '@')[OFFSET(1)] as domain
         FROM
             `coingate-production`.`dbt_prod_warehouse`.`dim_businesses` AS dim_businesses
         WHERE
-            dim_businesses.verification_status = 'success'
-            AND dim_businesses.deleted_at IS NULL
+            dim_businesses.entity_id IN UNNEST(@vip_business_ids)
+            AND ARRAY_LENGTH(SPLIT(dim_businesses.entity_email, '@')) > 1
     ),
-    business_orders AS (
+    valid_emails AS (
         SELECT
-            fct_orders.entity_id,
-            COUNT(*) as order_count
+            dim_users.entity_email,
+            SPLIT(dim_users.entity_email, '@')[OFFSET(1)] as domain
         FROM
-            `coingate-production`.`dbt_prod_warehouse`.`fct_orders` AS fct_orders
+            `coingate-production`.`dbt_prod_warehouse`.`dim_users` AS dim_users
         WHERE
-            fct_orders.status = 'paid'
-            AND fct_orders.created_at >= DATE_SUB(CURRENT_DATE(), INTERVAL 12 MONTH)
-        GROUP BY
-            fct_orders.entity_id
+            dim_users.entity_email LIKE '%@%'
+            AND dim_users.deleted_at IS NULL
+            AND ARRAY_LENGTH(SPLIT(dim_users.entity_email, '@')) > 1
     )
     SELECT
-        vb.*,
-        COALESCE(bo.order_count, 0) as order_count
+        valid_emails.entity_email,
+        valid_emails.domain
     FROM
-        verified_businesses vb
-    LEFT JOIN
-        business_orders bo
+        valid_emails
+    INNER JOIN
+        vip_domains
     ON
-        vb.business_id = bo.entity_id;
+        valid_emails.domain = vip_domains.domain;
     """
     
-    df = client.query(query).to_dataframe()
-    print(f"Found {len(df)} verified businesses")
-    print(f"Verified businesses with 0 orders in past 12 months: {len(df[df['order_count'] == 0])}")
-    return df
+    # Group emails by domain as the batches arrive; a single dict pass over the
+    # Arrow columns, as with role emails
+    domain_emails = {}
+    total = 0
+    for batch in warehouse.query_batches(query, [('vip_business_ids', 'INT64', vip_business_ids)], label='VIP domain emails'):
+        for domain, email in zip(column_values(batch, 'domain'), column_values(batch, 'entity_email')):
+            domain_emails.setdefault(domain, []).append(email)
+        total += batch.num_rows
+    print(f"Found {total} additional domain-matching emails")
+    
+    return domain_emails
 
-def get_unverified_businesses():
-    """Get businesses that have never been verified"""
-    print("\nStep 4: Getting unverified businesses...")
-    client = bigquery.Client()
+def fetch_frame(warehouse: WarehouseClient, query: str, params: list = None, label: str = 'query') -> pd.DataFrame:
+    """
+    Run a snapshot query and collect its record batches into one DataFrame
     
+    Snapshot queries bypass the cache: the watermark stored after them has to
+    match when the warehouse was actually read.
+    """
+    frames = [batch_to_frame(batch) for batch in warehouse.query_batches(query, params, label, cached=False)]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def fetch_business_rows(warehouse: WarehouseClient, since: str = None) -> pd.DataFrame:
+    """Get the dim_businesses columns the cohorts are classified on, for all businesses or those changed since a timestamp"""
     query = """
-    WITH unverified_businesses AS (
-        SELECT
-            dim_businesses.entity_email,
-            dim_businesses.entity_id AS business_id
-        FROM
-            `coingate-production`.`dbt_prod_warehouse`.`dim_businesses` AS dim_businesses
-        WHERE
-            dim_businesses.verification_first_success_at IS NULL
-            AND dim_businesses.verification_status != 'success'
-            AND dim_businesses.deleted_at IS NULL
-    ),
-    business_orders AS (
+    SELECT
+        dim_businesses.entity_id,
+        dim_businesses.entity_email,
+        dim_businesses.verification_status,
+        dim_businesses.verification_success_at,
+        dim_businesses.verification_first_success_at,
+        dim_businesses.deleted_at
+    FROM
+        `coingate-production`.`dbt_prod_warehouse`.`dim_businesses` AS dim_businesses
+    """
+    if since is None:
+        return fetch_frame(warehouse, query, label='snapshot businesses')
+    query += """
+    WHERE
+        dim_businesses.updated_at >= @since;
+    """
+    return fetch_frame(warehouse, query, [('since', 'TIMESTAMP', since)], 'changed businesses')
+
+def fetch_daily_orders(warehouse: WarehouseClient, since: str = None) -> pd.DataFrame:
+    """
+    Get 12-month paid order counts and EUR totals per business and day
+    
+    With since, only the (business, day) pairs that have an order changed
+    since then are returned, recomputed in full, with zero counts for pairs
+    that no longer have paid orders.
+    """
+    if since is None:
+        query = """
         SELECT
             fct_orders.entity_id,
-            COUNT(*) as order_count
+            DATE(fct_orders.created_at) as order_date,
+            COUNT(*) as order_count,
+            SUM(fct_orders.pay_amount_eur) as total_amount_eur
         FROM
             `coingate-production`.`dbt_prod_warehouse`.`fct_orders` AS fct_orders
         WHERE
             fct_orders.status = 'paid'
             AND fct_orders.created_at >= DATE_SUB(CURRENT_DATE(), INTERVAL 12 MONTH)
         GROUP BY
-            fct_orders.entity_id
-    )
-    SELECT
-        ub.*,
-        COALESCE(bo.order_count, 0) as order_count
-    FROM
-        unverified_businesses ub
-    LEFT JOIN
-        business_orders bo
-    ON
-        ub.business_id = bo.entity_id;
-    """
-    
-    df = client.query(query).to_dataframe()
-    print(f"Found {len(df)} unverified businesses")
-    return df
-
-def get_previously_verified_businesses():
-    """Get businesses that were verified before but are not verified now"""
-    print("\nStep 3: Getting previously verified businesses...")
-    client = bigquery.Client()
+            1, 2;
+        """
+        return fetch_frame(warehouse, query, label='snapshot daily orders')
     
     query = """
-    WITH previously_verified_businesses AS (
-        SELECT
-            dim_businesses.entity_email,
-            dim_businesses.entity_id AS business_id,
-            dim_businesses.verification_first_success_at,
-            dim_businesses.verification_status
+    WITH changed_days AS (
+        SELECT DISTINCT
+            fct_orders.entity_id,
+            DATE(fct_orders.created_at) as order_date
         FROM
-            `coingate-production`.`dbt_prod_warehouse`.`dim_businesses` AS dim_businesses
+            `coingate-production`.`dbt_prod_warehouse`.`fct_orders` AS fct_orders
         WHERE
-            dim_businesses.verification_first_success_at IS NOT NULL
-            AND dim_businesses.verification_status != 'success'
-            AND dim_businesses.deleted_at IS NULL
+            fct_orders.updated_at >= @since
+            AND fct_orders.created_at >= DATE_SUB(CURRENT_DATE(), INTERVAL 12 MONTH)
     ),
-    business_orders AS (
+    paid_days AS (
         SELECT
             fct_orders.entity_id,
-            COUNT(*) as order_count
+            DATE(fct_orders.created_at) as order_date,
+            COUNT(*) as order_count,
+            SUM(fct_orders.pay_amount_eur) as total_amount_eur
         FROM
             `coingate-production`.`dbt_prod_warehouse`.`fct_orders` AS fct_orders
+        INNER JOIN
+            changed_days
+        ON
+            fct_orders.entity_id = changed_days.entity_id
+            AND DATE(fct_orders.created_at) = changed_days.order_date
         WHERE
             fct_orders.status = 'paid'
-            AND fct_orders.created_at >= DATE_SUB(CURRENT_DATE(), INTERVAL 12 MONTH)
         GROUP BY
-            fct_orders.entity_id
+            1, 2
     )
     SELECT
-        pvb.*,
-        COALESCE(bo.order_count, 0) as order_count
+        changed_days.entity_id,
+        changed_days.order_date,
+        COALESCE(paid_days.order_count, 0) as order_count,
+        paid_days.total_amount_eur
     FROM
-        previously_verified_businesses pvb
+        changed_days
     LEFT JOIN
-        business_orders bo
+        paid_days
     ON
-        pvb.business_id = bo.entity_id;
+        changed_days.entity_id = paid_days.entity_id
+        AND changed_days.order_date = paid_days.order_date;
     """
-    
-    df = client.query(query).to_dataframe()
-    print(f"Found {len(df)} previously verified businesses")
-    return df
+    return fetch_frame(warehouse, query, [('since', 'TIMESTAMP', since)], 'changed daily orders')
 
-def get_domain_matching_emails(vip_businesses):
-    """Get all users whose email domains match VIP business domains"""
-    print("\nGetting additional domain-matching emails for VIP businesses...")
-    client = bigquery.Client()
-    
-    # Extract domains from VIP business emails
-    domains = set()
-    for email in vip_businesses['entity_email']:
-        if '@' in email:
-            domain = email.split('@')[1]
-            domains.add(domain)
+def fetch_role_rows(warehouse: WarehouseClient, since: str = None) -> pd.DataFrame:
+    """
+    Get the role bridge rows with their user emails
     
-    # Convert domains to SQL string
-    domains_str = ','.join([f"'{domain}'" for domain in domains])
+    With since, all current rows of the businesses whose bridge rows or users
+    changed since then are returned. Hard-deleted rows leave nothing to query
+    by, so they stay in the snapshot until the next full rebuild.
+    """
+    if since is None:
+        query = """
+        SELECT
+            t0.business_id,
+            t0.roles,
+            t0.user_id,
+            dim_users.entity_email
+        FROM
+            `coingate-production`.`dbt_prod_warehouse`.`bridge_business_users` AS t0
+        INNER JOIN
+            `coingate-production`.`dbt_prod_warehouse`.`dim_users` AS dim_users
+        ON
+            t0.user_id = dim_users.entity_id;
+        """
+        return fetch_frame(warehouse, query, label='snapshot roles')
     
-    query = f"""
-    WITH valid_emails AS (
+    query = """
+    WITH business_roles AS (
         SELECT
+            t0.business_id,
+            t0.roles,
+            t0.user_id,
             dim_users.entity_email,
-            SPLIT(dim_users.entity_email, '@')[OFFSET(1)] as domain
+            t0.updated_at >= @since OR dim_users.updated_at >= @since as changed
         FROM
+            `coingate-production`.`dbt_prod_warehouse`.`bridge_business_users` AS t0
+        INNER JOIN
             `coingate-production`.`dbt_prod_warehouse`.`dim_users` AS dim_users
+        ON
+            t0.user_id = dim_users.entity_id
+    ),
+    changed_businesses AS (
+        SELECT DISTINCT
+            business_id
+        FROM
+            business_roles
         WHERE
-            dim_users.entity_email LIKE '%@%'
-            AND dim_users.deleted_at IS NULL
-            AND ARRAY_LENGTH(SPLIT(dim_users.entity_email, '@')) > 1
+            changed
     )
     SELECT
-        entity_email,
-        domain
+        changed_businesses.business_id,
+        business_roles.roles,
+        business_roles.user_id,
+        business_roles.entity_email
     FROM
-        valid_emails
-    WHERE
-        domain IN ({domains_str});
+        changed_businesses
+    LEFT JOIN
+        business_roles
+    ON
+        changed_businesses.business_id = business_roles.business_id;
+    """
+    return fetch_frame(warehouse, query, [('since', 'TIMESTAMP', since)], 'changed roles')
+
+def patch_snapshot(snapshot: pd.DataFrame, changes: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+    """Replace every snapshot row whose key appears in changes with the changed rows"""
+    if changes.empty:
+        return snapshot
+    changed_keys = pd.MultiIndex.from_frame(changes[keys])
+    kept = snapshot[~pd.MultiIndex.from_frame(snapshot[keys]).isin(changed_keys)]
+    return pd.concat([kept, changes], ignore_index=True)
+
+def window_start():
+    """First day of the 12-month order window, as DATE_SUB(CURRENT_DATE(), INTERVAL 12 MONTH) computes it"""
+    return (pd.Timestamp.now(tz='UTC').normalize() - pd.DateOffset(months=12)).date()
+
+def load_sync_state(state_dir: str) -> Dict:
+    """Load the sync state and snapshot of the last incremental run, or None if there is none"""
+    state_path = os.path.join(state_dir, SYNC_STATE_FILENAME)
+    if not os.path.exists(state_path):
+        return None
+    if not all(os.path.exists(os.path.join(state_dir, f'{table}.parquet')) for table in SNAPSHOT_TABLES):
+        return None
+    with open(state_path, 'r') as f:
+        state = json.load(f)
+    for table in SNAPSHOT_TABLES:
+        state[table] = pd.read_parquet(os.path.join(state_dir, f'{table}.parquet'))
+    return state
+
+def save_sync_state(state_dir: str, snapshot: Dict[str, pd.DataFrame], watermark: str, last_full_rebuild: str):
+    """Write the snapshot tables, then the state file that makes them current"""
+    os.makedirs(state_dir, exist_ok=True)
+    for table in SNAPSHOT_TABLES:
+        path = os.path.join(state_dir, f'{table}.parquet')
+        snapshot[table].to_parquet(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+    state_path = os.path.join(state_dir, SYNC_STATE_FILENAME)
+    with open(state_path + '.tmp', 'w') as f:
+        json.dump({'watermark': watermark, 'last_full_rebuild': last_full_rebuild}, f, indent=2)
+    os.replace(state_path + '.tmp', state_path)
+
+def refresh_business_snapshot(warehouse: WarehouseClient, state_dir: str, full_rebuild: bool = False,
+                              full_rebuild_days: float = DEFAULT_FULL_REBUILD_DAYS) -> Dict[str, pd.DataFrame]:
     """
+    Bring the local business snapshot up to date and return its tables
     
-    df = client.query(query).to_dataframe()
-    print(f"Found {len(df)} additional domain-matching emails")
+    The first run, a forced run and any run more than full_rebuild_days after
+    the last full rebuild pull the whole snapshot. Other runs only query the
+    businesses, order days and role bridges changed since the stored
+    watermark and patch them into the snapshot. Rows deleted outright in the
+    warehouse leave no change to pull, and are dropped by the full rebuild.
+    """
+    started_at = pd.Timestamp.now(tz='UTC')
+    state = None if full_rebuild else load_sync_state(state_dir)
+    if state is not None and started_at - pd.Timestamp(state['last_full_rebuild']) >= pd.Timedelta(days=full_rebuild_days):
+        print(f"Last full rebuild is more than {full_rebuild_days} days old")
+        state = None
     
-    # Group emails by domain
-    domain_emails = {}
-    for _, row in df.iterrows():
-        domain = row['domain']
-        if domain not in domain_emails:
-            domain_emails[domain] = []
-        domain_emails[domain].append(row['entity_email'])
+    fetchers = {'businesses': fetch_business_rows, 'daily_orders': fetch_daily_orders, 'roles': fetch_role_rows}
+    since = None if state is None else state['watermark']
+    if since is None:
+        print("Pulling the full business snapshot...")
+    else:
+        print(f"Pulling businesses, orders and roles changed since {since}...")
+    with ThreadPoolExecutor(max_workers=len(fetchers)) as executor:
+        futures = {table: executor.submit(fetch, warehouse, since) for table, fetch in fetchers.items()}
+        fetched = {table: future.result() for table, future in futures.items()}
     
-    return domain_emails
+    if state is None:
+        snapshot = fetched
+        last_full_rebuild = started_at.isoformat()
+    else:
+        for table, changes in fetched.items():
+            print(f"- {len(changes)} changed {table.replace('_', ' ')} rows")
+        snapshot = {
+            'businesses': patch_snapshot(state['businesses'], fetched['businesses'], ['entity_id']),
+            'daily_orders': patch_snapshot(state['daily_orders'], fetched['daily_orders'], ['entity_id', 'order_date']),
+            # Only businesses with a changed bridge row or user are replaced; bridge
+            # rows deleted outright are only dropped by the periodic full rebuild
+            'roles': patch_snapshot(state['roles'], fetched['roles'], ['business_id'])
+        }
+        last_full_rebuild = state['last_full_rebuild']
+    
+    # Days that have left the 12-month window no longer count towards anything
+    daily_orders = snapshot['daily_orders']
+    snapshot['daily_orders'] = daily_orders[(daily_orders['order_date'] >= window_start()) & (daily_orders['order_count'] > 0)].reset_index(drop=True)
+    
+    save_sync_state(state_dir, snapshot, (started_at - WATERMARK_OVERLAP).isoformat(), last_full_rebuild)
+    return snapshot
+
+def classify_businesses(businesses: pd.DataFrame, daily_orders: pd.DataFrame) -> pd.DataFrame:
+    """
+    Classify snapshot businesses like the get_business_cohorts query does
+    
+    Returns the same columns as the query, so split_business_cohorts can
+    consume it.
+    """
+    window = daily_orders[daily_orders['order_date'] >= window_start()]
+    totals = window.groupby('entity_id').agg(order_count=('order_count', 'sum'))
+    # SUM in SQL is NULL only if every amount is NULL
+    totals['total_amount_eur'] = window.groupby('entity_id')['total_amount_eur'].sum(min_count=1)
+    df = businesses.merge(totals, left_on='entity_id', right_index=True, how='left')
+    
+    # VIP ranks all businesses with paid orders, deleted or not
+    has_orders = df['order_count'].notna()
+    rank = df['total_amount_eur'].rank(method='first', ascending=False, na_option='bottom')
+    df['is_vip'] = has_orders & (rank <= VIP_BUSINESS_COUNT)
+    df['order_count'] = df['order_count'].fillna(0).astype('int64')
+    
+    status = df['verification_status']
+    active = df['deleted_at'].isna() & status.notna()
+    df['category'] = np.select(
+        [active & (status == 'success'),
+         active & (status != 'success') & df['verification_first_success_at'].notna(),
+         active & (status != 'success')],
+        ['verified', 'previously_verified', 'unverified'],
+        default=None
+    )
+    
+    df = df[df['is_vip'] | df['category'].notna()]
+    return df.drop(columns=['deleted_at']).reset_index(drop=True)
+
+def snapshot_role_emails(roles: pd.DataFrame, business_ids: List[int]) -> Dict[int, List[str]]:
+    """Group the snapshot role emails of a cohort, in the business_id, roles order of the role query"""
+    cohort_roles = roles[roles['business_id'].isin(business_ids)].sort_values(['business_id', 'roles'], kind='stable')
+    return group_role_emails(cohort_roles)
+
+def get_snapshot_cohorts(warehouse: WarehouseClient, state_dir: str, full_rebuild: bool = False,
+                         full_rebuild_days: float = DEFAULT_FULL_REBUILD_DAYS):
+    """
+    Get the business cohorts and their role emails from the incrementally refreshed snapshot
+    
+    Returns the get_business_cohorts frames followed by the get_business_roles
+    dictionary.
+    """
+    print("\nStep 1: Refreshing the business snapshot...")
+    snapshot = refresh_business_snapshot(warehouse, state_dir, full_rebuild, full_rebuild_days)
+    cohorts = split_business_cohorts([classify_businesses(snapshot['businesses'], snapshot['daily_orders'])])
+    vip_businesses, verified_businesses, previously_verified_businesses, _ = cohorts
+    
+    print("\nStep 2: Getting role emails from the snapshot...")
+    roles = {
+        'VIP': snapshot_role_emails(snapshot['roles'], vip_businesses['entity_id']),
+        'verified': snapshot_role_emails(snapshot['roles'], verified_businesses['business_id']),
+        'previously verified': snapshot_role_emails(snapshot['roles'], previously_verified_businesses['business_id'])
+    }
+    for cohort, role_emails in roles.items():
+        print(f"Found {count_role_emails(role_emails)} role emails for {cohort} businesses")
+    return cohorts + (roles,)
+
+def column_values(batch, column: str) -> list:
+    """Get a column of an Arrow record batch or a DataFrame as a Python list"""
+    values = batch[column]
+    return values.to_pylist() if pa is not None and isinstance(values, (pa.Array, pa.ChunkedArray)) else values.tolist()
+
+def group_role_emails(roles) -> Dict[int, List[str]]:
+    """
+    Group role emails by business ID in one pass, keeping the query's row order
+    
+    roles is a DataFrame, an iterable of DataFrames or Arrow record batches,
+    or role emails that are already grouped.
+    """
+    if isinstance(roles, dict):
+        return roles
+    if isinstance(roles, pd.DataFrame):
+        roles = [roles]
+    
+    # A hash grouping over plain lists; groupby().agg(list) builds a Series per
+    # business and is slower than the grouping it replaces
+    role_emails = {}
+    for batch in roles:
+        for business_id, email in zip(column_values(batch, 'business_id'), column_values(batch, 'entity_email')):
+            role_emails.setdefault(business_id, []).append(email)
+    return role_emails
+
+def count_role_emails(roles) -> int:
+    """Count role emails, grouped or as a DataFrame"""
+    return sum(len(emails) for emails in roles.values()) if isinstance(roles, dict) else len(roles)
+
+def format_verification_dates(dates):
+    return [date.isoformat() if pd.notnull(date) else None for date in dates.tolist()]
+
+def assemble_businesses(vip_businesses, verified_businesses, previously_verified_businesses, unverified_businesses,
+                        vip_roles, verified_roles, previously_verified_roles, domain_emails):
+    """
+    Combine the business cohorts, role emails and VIP domain emails into the final business dictionary
+    
+    Role emails can be DataFrames or already grouped by business ID, as
+    get_business_roles returns them.
+    """
+    vip_business_ids = set(vip_businesses['entity_id'].tolist())
+    
+    # Create a dictionary to store all business information
+    businesses = {}
+    
+    # Process VIP businesses
+    vip_role_emails = group_role_emails(vip_roles)
+    for business_id, business_email, order_count, total_amount_eur in zip(
+            vip_businesses['entity_id'].tolist(), vip_businesses['entity_email'].tolist(),
+            vip_businesses['order_count'].tolist(), vip_businesses['total_amount_eur'].tolist()):
+        domain = business_email.split('@')[1]
+        role_emails = list(vip_role_emails.get(business_id, []))
+        
+        # Add domain-matching emails that aren't already in role_emails
+        if domain in domain_emails:
+            existing_emails = set(role_emails)
+            role_emails.extend(email for email in domain_emails[domain] if email not in existing_emails)
+        
+        businesses[business_id] = {
+            'type': 'vip',
+            'main_email': business_email,
+            'role_emails': role_emails,
+            'order_count': int(order_count),
+            'total_amount_eur': float(total_amount_eur)
+        }
+    
+    # Process verified businesses (excluding VIP ones)
+    verified = verified_businesses[~verified_businesses['business_id'].isin(vip_business_ids)]
+    verified_role_emails = group_role_emails(verified_roles)
+    for business_id, email, order_count, verification_date in zip(
+            verified['business_id'].tolist(), verified['entity_email'].tolist(),
+            verified['order_count'].tolist(), format_verification_dates(verified['verification_success_at'])):
+        businesses[business_id] = {
+            'type': 'verified',
+            'main_email': email,
+            'role_emails': verified_role_emails.get(business_id, []),
+            'order_count': int(order_count),
+            'verification_date': verification_date
+        }
+    
+    # Process previously verified businesses (excluding VIP ones)
+    previously_verified = previously_verified_businesses[~previously_verified_businesses['business_id'].isin(vip_business_ids)]
+    previously_verified_role_emails = group_role_emails(previously_verified_roles)
+    for business_id, email, order_count, verification_date in zip(
+            previously_verified['business_id'].tolist(), previously_verified['entity_email'].tolist(),
+            previously_verified['order_count'].tolist(), format_verification_dates(previously_verified['verification_first_success_at'])):
+        businesses[business_id] = {
+            'type': 'previously_verified',
+            'main_email': email,
+            'role_emails': previously_verified_role_emails.get(business_id, []),
+            'order_count': int(order_count),
+            'verification_date': verification_date
+        }
+    
+    # Process unverified businesses (excluding VIP ones)
+    unverified = unverified_businesses[~unverified_businesses['business_id'].isin(vip_business_ids)]
+    for business_id, email, order_count in zip(
+            unverified['business_id'].tolist(), unverified['entity_email'].tolist(), unverified['order_count'].tolist()):
+        businesses[business_id] = {
+            'type': 'unverified',
+            'main_email': email,
+            'role_emails': [],  # Unverified businesses don't have role emails
+            'order_count': int(order_count)
+        }
+    
+    return businesses
 
 def main():
     # Get current directory
     current_dir = os.path.dirname(os.path.abspath(__file__))
     
+    parser = argparse.ArgumentParser(description="Extract business categories and their emails from the warehouse")
+    parser.add_argument('--cache-dir', default=os.path.join(current_dir, 'warehouse_cache'),
+                        help="Directory for cached query results (default: warehouse_cache next to this script)")
+    parser.add_argument('--cache-ttl', type=float, default=DEFAULT_CACHE_TTL_HOURS,
+                        help=f"Hours a cached query result stays fresh (default: {DEFAULT_CACHE_TTL_HOURS})")
+    parser.add_argument('--no-cache', action='store_true', help="Always query BigQuery and don't cache results")
+    parser.add_argument('--offline', action='store_true',
+                        help="Serve every query from the cache, whatever its age, without contacting BigQuery")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Keep a local business snapshot and only pull rows changed since the last run")
+    parser.add_argument('--state-dir', default=os.path.join(current_dir, 'business_state'),
+                        help="Directory for the incremental snapshot and watermark (default: business_state next to this script)")
+    parser.add_argument('--full-rebuild', action='store_true', help="Rebuild the incremental snapshot from scratch")
+    parser.add_argument('--full-rebuild-days', type=float, default=DEFAULT_FULL_REBUILD_DAYS,
+                        help=f"Days after which an incremental run rebuilds the snapshot from scratch (default: {DEFAULT_FULL_REBUILD_DAYS})")
+    parser.add_argument('--business-store', nargs='?', const=os.path.join(current_dir, BUSINESS_STORE_FILENAME),
+                        help=f"Also write an indexed SQLite business store (default path: {BUSINESS_STORE_FILENAME} next to this script)")
+    args = parser.parse_args()
+    if args.incremental and args.offline:
+        parser.error("--incremental has to query the warehouse for changes and can't run --offline")
+    
+    warehouse = WarehouseClient(None if args.no_cache else args.cache_dir, args.cache_ttl, args.offline)
+    
     try:
-        # Step 1: Get VIP businesses
-        vip_businesses = get_vip_businesses()
-        vip_business_ids = vip_businesses['entity_id'].tolist()
-        
-        # Step 2: Get verified businesses
-        verified_businesses = get_verified_businesses()
-        verified_business_ids = verified_businesses['business_id'].tolist()
-        
-        # Step 3: Get previously verified businesses
-        previously_verified_businesses = get_previously_verified_businesses()
-        previously_verified_business_ids = previously_verified_businesses['business_id'].tolist()
-        
-        # Step 4: Get unverified businesses
-        unverified_businesses = get_unverified_businesses()
-        
-        # Step 5: Get role emails for all business types
-        vip_roles = get_business_roles(vip_business_ids, "VIP")
-        verified_roles = get_business_roles(verified_business_ids, "verified")
-        previously_verified_roles = get_business_roles(previously_verified_business_ids, "previously verified")
-        
-        # Step 6: Get additional domain-matching emails for VIP businesses
-        domain_emails = get_domain_matching_emails(vip_businesses)
-        
-        # Create a dictionary to store all business information
-        print("\nStep 7: Creating final business dictionary...")
-        businesses = {}
-        
-        # Process VIP businesses
-        for _, row in vip_businesses.iterrows():
-            business_id = row['entity_id']
-            business_email = row['entity_email']
-            domain = business_email.split('@')[1]
-            
-            # Get role emails
-            role_emails = vip_roles[vip_roles['business_id'] == business_id]['entity_email'].tolist()
+        if args.incremental:
+            # Steps 1 and 2: Classify the snapshot locally, only changed rows are queried
+            (vip_businesses, verified_businesses, previously_verified_businesses, unverified_businesses,
+             roles) = get_snapshot_cohorts(warehouse, args.state_dir, args.full_rebuild, args.full_rebuild_days)
             
-            # Add domain-matching emails that aren't already in role_emails
-            if domain in domain_emails:
-                additional_emails = [email for email in domain_emails[domain] if email not in role_emails]
-                role_emails.extend(additional_emails)
+            # Step 3: Get additional domain-matching emails for VIP businesses
+            domain_emails = get_domain_matching_emails(vip_businesses, warehouse)
+        else:
+            # Step 1: Get all four business categories from one warehouse query
+            vip_businesses, verified_businesses, previously_verified_businesses, unverified_businesses = get_business_cohorts(warehouse)
+            vip_business_ids = vip_businesses['entity_id'].tolist()
+            verified_business_ids = verified_businesses['business_id'].tolist()
+            previously_verified_business_ids = previously_verified_businesses['business_id'].tolist()
             
-            businesses[business_id] = {
-                'type': 'vip',
-                'main_email': business_email,
-                'role_emails': role_emails,
-                'order_count': int(row['order_count']),
-                'total_amount_eur': float(row['total_amount_eur'])
-            }
+            # Steps 2 and 3 only depend on the cohorts, so their queries run side by side
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                # Step 2: Get role emails for all business types
+                roles_future = executor.submit(get_business_roles, {
+                    'VIP': vip_business_ids,
+                    'verified': verified_business_ids,
+                    'previously verified': previously_verified_business_ids
+                }, warehouse)
+                
+                # Step 3: Get additional domain-matching emails for VIP businesses
+                domain_emails_future = executor.submit(get_domain_matching_emails, vip_businesses, warehouse)
+                
+                roles = roles_future.result()
+                domain_emails = domain_emails_future.result()
+        vip_roles = roles['VIP']
+        verified_roles = roles['verified']
+        previously_verified_roles = roles['previously verified']
+        warehouse.print_timings()
         
-        # Process verified businesses (excluding VIP ones)
-        for _, row in verified_businesses.iterrows():
-            business_id = row['business_id']
-            if business_id not in vip_business_ids:  # Skip if it's a VIP business
-                businesses[business_id] = {
-                    'type': 'verified',
-                    'main_email': row['entity_email'],
-                    'role_emails': verified_roles[verified_roles['business_id'] == business_id]['entity_email'].tolist(),
-                    'order_count': int(row['order_count']),
-                    'verification_date': row['verification_success_at'].isoformat() if pd.notnull(row['verification_success_at']) else None
-                }
-        
-        # Process previously verified businesses (excluding VIP ones)
-        for _, row in previously_verified_businesses.iterrows():
-            business_id = row['business_id']
-            if business_id not in vip_business_ids:  # Skip if it's a VIP business
-                businesses[business_id] = {
-                    'type': 'previously_verified',
-                    'main_email': row['entity_email'],
-                    'role_emails': previously_verified_roles[previously_verified_roles['business_id'] == business_id]['entity_email'].tolist(),
-                    'order_count': int(row['order_count']),
-                    'verification_date': row['verification_first_success_at'].isoformat() if pd.notnull(row['verification_first_success_at']) else None
-                }
-        
-        # Process unverified businesses (excluding VIP ones)
-        for _, row in unverified_businesses.iterrows():
-            business_id = row['business_id']
-            if business_id not in vip_business_ids:  # Skip if it's a VIP business
-                businesses[business_id] = {
-                    'type': 'unverified',
-                    'main_email': row['entity_email'],
-                    'role_emails': [],  # Unverified businesses don't have role emails
-                    'order_count': int(row['order_count'])
-                }
+        # Create a dictionary to store all business information
+        print("\nStep 4: Creating final business dictionary...")
+        businesses = assemble_businesses(
+            vip_businesses, verified_businesses, previously_verified_businesses, unverified_businesses,
+            vip_roles, verified_roles, previously_verified_roles, domain_emails
+        )
         
         # Save the results
         output_path = os.path.join(current_dir, 'businesses.json')
         with open(output_path, 'w') as f:
             json.dump(businesses, f, indent=2)
+        if args.business_store:
+            write_business_store(businesses, args.business_store)
         
         # Print detailed statistics
         print(f"\nFinal results:")
@@ -364,8 +908,8 @@ def main():
         
         # Print role email statistics
         total_vip_roles = sum(len(b['role_emails']) for b in businesses.values() if b['type'] == 'vip')
-        total_verified_roles = len(verified_roles)
-        total_previously_verified_roles = len(previously_verified_roles)
+        total_verified_roles = count_role_emails(verified_roles)
+        total_previously_verified_roles = count_role_emails(previously_verified_roles)
         
         avg_vip_roles = total_vip_roles / len(vip_businesses) if len(vip_businesses) > 0 else 0
         avg_verified_roles = total_verified_roles / (len(verified_businesses) - len(vip_businesses)) if (len(verified_businesses) - len(vip_businesses)) > 0 else 0
@@ -380,6 +924,8 @@ def main():
         print(f"- Average roles per previously verified business: {avg_previously_verified_roles:.2f}")
         
         print(f"\nResults saved to '{output_path}'")
+        if args.business_store:
+            print(f"Business store saved to '{args.business_store}'")
         
     except Exception as e:
         print(f"\nError occurred: {str(e)}")
@@ -1,20 +1,158 @@
 import pandas as pd
+import argparse
+import bz2
+import collections
+import gzip
+import hashlib
+import html
+import io
 import json
+import mmap
+import multiprocessing
 import os
 import re
-from typing import Dict, List, Set
+import time
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+from business_store import BUSINESS_TYPES
+
+# orjson is optional; when installed it decodes convos.json lines several times
+# faster (extracted outputs may contain NaN, so they are read with json)
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    def json_loads(data):
+        # json.loads doesn't take the memoryview lines of the mmap reader
+        return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+# zstandard is optional and only needed for .zst inputs
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# pyarrow is optional and only needed for Parquet output
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Bytes hashed at the start of convos.json and just before the checkpoint
+# offset to tell an appended-to file from a replaced one
+FINGERPRINT_BYTES = 64 * 1024
+
+CHECKPOINT_FILENAME = 'extraction_checkpoint.json'
+
+# Compressed inputs are recognised by extension first, then by magic bytes
+COMPRESSION_EXTENSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.zst': 'zstd', '.zstd': 'zstd'}
+COMPRESSION_MAGIC = {b'\x1f\x8b': 'gzip', b'BZh': 'bz2', b'\x28\xb5\x2f\xfd': 'zstd'}
+
+# Read buffer for input files, large enough that decompression and readline
+# work on big blocks instead of the 8 KB default
+READ_BUFFER_BYTES = 4 * 1024 * 1024
+
+# Rows per Parquet row group when exporting extracted conversations
+PARQUET_BATCH_ROWS = 20000
+
+# Upper bound on shard size, so a worker never holds more than this much
+# input worth of results in memory at once
+MAX_SHARD_BYTES = 64 * 1024 * 1024
+
+# The mmap reader drops pages it has read past from its mapping every this
+# many bytes, so peak RSS doesn't grow with the size of convos.json
+MMAP_RELEASE_BYTES = 16 * 1024 * 1024
+
+def detect_compression(path: str) -> Optional[str]:
+    """Detect gzip/bz2/zstd compression of a file by extension or magic bytes"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in COMPRESSION_EXTENSIONS:
+        return COMPRESSION_EXTENSIONS[extension]
+    with open(path, 'rb') as f:
+        head = f.read(4)
+    for magic, compression in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+def open_input(path: str) -> BinaryIO:
+    """Open a plain or compressed input file as a buffered, decompressing binary stream"""
+    compression = detect_compression(path)
+    if compression is None:
+        return open(path, 'rb', buffering=READ_BUFFER_BYTES)
+    
+    if compression == 'gzip':
+        stream = gzip.open(path, 'rb')
+    elif compression == 'bz2':
+        stream = bz2.open(path, 'rb')
+    else:
+        if zstandard is None:
+            raise ImportError(f"zstandard is required to read {path}")
+        raw = open(path, 'rb', buffering=READ_BUFFER_BYTES)
+        stream = zstandard.ZstdDecompressor().stream_reader(raw, read_size=READ_BUFFER_BYTES, closefd=True)
+    
+    # Hand decompressed data out in large blocks, so readline stays cheap
+    return io.BufferedReader(stream, buffer_size=READ_BUFFER_BYTES)
+
+def seek_input(stream: BinaryIO, offset: int):
+    """Move a stream from open_input to an offset in its uncompressed data"""
+    if stream.seekable():
+        # Plain files seek directly, gzip/bz2 decompress up to the offset
+        stream.seek(offset)
+        return
+    remaining = offset
+    while remaining > 0:
+        block = stream.read(min(remaining, READ_BUFFER_BYTES))
+        if not block:
+            break
+        remaining -= len(block)
+
+def find_input_file(directory: str, filename: str) -> str:
+    """Find a file or its compressed variant (.gz, .bz2, .zst), falling back to the plain path"""
+    for extension in ['', *COMPRESSION_EXTENSIONS]:
+        path = os.path.join(directory, filename + extension)
+        if os.path.exists(path):
+            return path
+    return os.path.join(directory, filename)
+
+# HTML removed from messages in one pass: style/script blocks and comments
+# (whose content is never message text) and any other tag
+HTML_PATTERN = re.compile(
+    r'<(?:(script|style)\b[^>]*>.*?</\1\s*>'
+    r'|!--.*?-->'
+    r'|[^>]+>)',
+    re.IGNORECASE | re.DOTALL
+)
+BLANK_LINES_PATTERN = re.compile(r'\n\s*\n')
+# HTML entities, only in their ';'-terminated form, so plain-text query strings
+# like "?id=5&currency=EUR" are left alone
+ENTITY_PATTERN = re.compile(r'&(?:[a-zA-Z][a-zA-Z0-9]*|#[0-9]+|#[xX][0-9a-fA-F]+);')
+
+# An "id" key in a raw convos.json line. Quotes inside JSON strings are escaped,
+# so this only ever matches real keys, one of which is the ticket's top-level id.
+ID_PATTERN = re.compile(rb'"id"\s*:\s*(\d+)')
+JSON_STRING_PATTERN = re.compile(rb'"(?:[^"\\]|\\.)*"')
 
 def clean_message(message: str) -> str:
     """Clean a message by removing unnecessary formatting and whitespace"""
-    # Remove HTML tags
-    message = re.sub(r'<[^>]+>', '', message)
-    # Remove markdown formatting
-    message = re.sub(r'\*\*|\*|__|_', '', message)
-    # Remove multiple newlines
-    message = re.sub(r'\n\s*\n', '\n', message)
+    # Remove HTML blocks and tags
+    is_html = False
+    if '<' in message:
+        message, tags = HTML_PATTERN.subn('', message)
+        is_html = tags > 0
+    # Remove markdown formatting (every '*' and '_', which str.replace does far
+    # faster than a regex)
+    message = message.replace('*', '').replace('_', '')
+    # Decode the HTML entities rich-text comments leave behind; plain-text
+    # bodies are kept as written
+    if is_html and '&' in message:
+        message = ENTITY_PATTERN.sub(lambda match: html.unescape(match.group()), message)
+    # Remove multiple newlines (after markup removal, which can leave blank lines)
+    if '\n' in message:
+        message = BLANK_LINES_PATTERN.sub('\n', message)
     # Remove leading/trailing whitespace
-    message = message.strip()
-    return message
+    return message.strip()
 
 def format_conversation(comments: List[Dict], requester_id: int) -> str:
     """Format a conversation into a minimal format with Merchant/Agent labels"""
@@ -47,94 +185,676 @@ def format_conversation(comments: List[Dict], requester_id: int) -> str:
     # Join all messages with double newlines
     return "\n\n".join(formatted_messages)
 
-def load_filtered_csvs(filtered_dir: str) -> Dict[str, pd.DataFrame]:
-    """Load filtered CSV files"""
+def build_ticket_index(csv_data: Dict[str, pd.DataFrame]) -> Dict[int, Tuple[str, Dict]]:
+    """Build a ticket ID -> (business type, CSV row) lookup from the filtered CSVs"""
+    ticket_index = {}
+    
+    # Business types are checked in priority order, so a ticket listed in several
+    # CSVs keeps the first type it was found in (same as the old per-line scan)
+    for business_type in BUSINESS_TYPES:
+        df = csv_data.get(business_type)
+        if df is None:
+            continue
+        # Blank rows read as a NaN Id and match no ticket. They also make the
+        # column float, so it is cast back for int IDs in records, outputs and checkpoints
+        df = df.dropna(subset=['Id']).astype({'Id': 'int64'})
+        for record in df.to_dict('records'):
+            ticket_index.setdefault(record['Id'], (business_type, record))
+    
+    return ticket_index
+
+def load_filtered_csvs(filtered_dir: str) -> Dict[int, Tuple[str, Dict]]:
+    """Load filtered CSV files and index their rows by ticket ID"""
     print("Loading filtered CSV files...")
     csv_data = {}
     
-    for business_type in ['vip', 'verified', 'previously_verified', 'unverified']:
-        csv_path = os.path.join(filtered_dir, f'{business_type}_conversations.csv')
+    for business_type in BUSINESS_TYPES:
+        csv_path = find_input_file(filtered_dir, f'{business_type}_conversations.csv')
         if os.path.exists(csv_path):
-            df = pd.read_csv(csv_path)
+            with open_input(csv_path) as f:
+                df = pd.read_csv(f)
             csv_data[business_type] = df
             print(f"Loaded {len(df)} rows from {business_type} CSV")
     
-    return csv_data
+    ticket_index = build_ticket_index(csv_data)
+    print(f"Indexed {len(ticket_index)} unique ticket IDs")
+    return ticket_index
 
-def extract_conversations(convos_path: str, csv_data: Dict[str, pd.DataFrame], output_dir: str):
-    """Extract and clean conversations from convos.json and save them by business type"""
-    print("\nExtracting conversations...")
+def fingerprint_filtered_csvs(filtered_dir: str) -> str:
+    """Hash the filtered CSV files, so a change to any of them forces a full rebuild"""
+    digest = hashlib.sha256()
+    for business_type in BUSINESS_TYPES:
+        csv_path = find_input_file(filtered_dir, f'{business_type}_conversations.csv')
+        if os.path.exists(csv_path):
+            digest.update(business_type.encode())
+            with open(csv_path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+    return digest.hexdigest()
+
+def fingerprint_range(path: str, start: int, end: int) -> str:
+    """Hash the (uncompressed) bytes of a file between two offsets"""
+    with open_input(path) as f:
+        seek_input(f, start)
+        return hashlib.sha256(f.read(end - start)).hexdigest()
+
+def find_complete_end(convos_path: str) -> int:
+    """Get the offset just past the last complete line, leaving a line still being written for the next run"""
+    file_size = os.path.getsize(convos_path)
+    last_line_start = 0
     
-    # Initialize conversation lists for each business type
-    conversations = {
-        'vip': [],
-        'verified': [],
-        'previously_verified': [],
-        'unverified': []
+    with open(convos_path, 'rb') as f:
+        position = file_size
+        while position > 0:
+            block_start = max(position - FINGERPRINT_BYTES, 0)
+            f.seek(block_start)
+            newline = f.read(position - block_start).rfind(b'\n')
+            if newline != -1:
+                last_line_start = block_start + newline + 1
+                break
+            position = block_start
+        
+        if last_line_start == file_size:
+            return file_size
+        
+        # A last line without a newline is complete if it parses on its own
+        f.seek(last_line_start)
+        try:
+            json_loads(f.read())
+            return file_size
+        except ValueError:
+            return last_line_start
+
+def load_checkpoint(output_dir: str) -> Dict:
+    """Load the checkpoint left by the previous extraction run, if any"""
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILENAME)
+    if not os.path.exists(checkpoint_path):
+        return None
+    with open(checkpoint_path, 'r') as f:
+        checkpoint = json.load(f)
+    # JSON object keys are strings, ticket IDs are ints (saved as "1.0" by
+    # runs that indexed a float Id column)
+    checkpoint['emitted'] = {int(float(ticket_id)): digest for ticket_id, digest in checkpoint['emitted'].items()}
+    return checkpoint
+
+def save_checkpoint(output_dir: str, checkpoint: Dict):
+    """Atomically write the extraction checkpoint"""
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILENAME)
+    tmp_path = checkpoint_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, checkpoint_path)
+
+def can_resume(checkpoint: Dict, convos_path: str, csv_fingerprint: str) -> bool:
+    """Check that convos.json was only appended to and the filtered CSVs are unchanged since the checkpoint"""
+    if checkpoint is None:
+        print("No extraction checkpoint found, running a full rebuild")
+        return False
+    if checkpoint['csv_fingerprint'] != csv_fingerprint:
+        print("Filtered CSVs changed since the last run, running a full rebuild")
+        return False
+    
+    offset = checkpoint['convos_offset']
+    # The uncompressed size of a compressed file is unknown up front; a shorter
+    # stream still fails the fingerprint check below
+    if detect_compression(convos_path) is None and os.path.getsize(convos_path) < offset:
+        print("convos.json is smaller than at the last run, running a full rebuild")
+        return False
+    head_end = min(FINGERPRINT_BYTES, offset)
+    tail_start = max(offset - FINGERPRINT_BYTES, 0)
+    if (fingerprint_range(convos_path, 0, head_end) != checkpoint['convos_head_sha256']
+            or fingerprint_range(convos_path, tail_start, offset) != checkpoint['convos_tail_sha256']):
+        print("convos.json was replaced since the last run, running a full rebuild")
+        return False
+    
+    return True
+
+def output_fingerprints(output_dir: str) -> Dict[str, Tuple[int, str]]:
+    """Get the size and tail hash of each JSONL output file, to find what a run that died wrote after its checkpoint"""
+    fingerprints = {}
+    for business_type in BUSINESS_TYPES:
+        output_path = os.path.join(output_dir, f'{business_type}_conversations.jsonl')
+        if os.path.exists(output_path):
+            size = os.path.getsize(output_path)
+            fingerprints[business_type] = (size, fingerprint_range(output_path, max(size - FINGERPRINT_BYTES, 0), size))
+    return fingerprints
+
+def restore_outputs(checkpoint: Dict, output_dir: str) -> bool:
+    """
+    Truncate the JSONL output files back to their size at the checkpoint
+    
+    A run that dies after appending but before saving its checkpoint would
+    otherwise have its tickets appended a second time by the resumed run.
+    Outputs that were rewritten rather than appended to since the checkpoint
+    can't be restored, and need a full rebuild.
+    """
+    if 'outputs' not in checkpoint:
+        print("Checkpoint predates output tracking, running a full rebuild")
+        return False
+    outputs = checkpoint['outputs']
+    for business_type in BUSINESS_TYPES:
+        output_path = os.path.join(output_dir, f'{business_type}_conversations.jsonl')
+        if business_type not in outputs:
+            continue
+        size, tail_sha256 = outputs[business_type]
+        if (not os.path.exists(output_path) or os.path.getsize(output_path) < size
+                or fingerprint_range(output_path, max(size - FINGERPRINT_BYTES, 0), size) != tail_sha256):
+            print(f"{output_path} changed since the last run, running a full rebuild")
+            return False
+    
+    for business_type in BUSINESS_TYPES:
+        output_path = os.path.join(output_dir, f'{business_type}_conversations.jsonl')
+        if business_type in outputs:
+            size = outputs[business_type][0]
+            if os.path.getsize(output_path) > size:
+                print(f"Dropping {os.path.getsize(output_path) - size} bytes written to {output_path} after the last checkpoint")
+                os.truncate(output_path, size)
+        elif os.path.exists(output_path):
+            # Created by a run that died before its checkpoint
+            os.remove(output_path)
+    return True
+
+def find_shard_offsets(convos_path: str, num_shards: int, start: int = 0, end: int = None) -> List[Tuple[int, int]]:
+    """Split a byte range of a file into (start, end) ranges that begin and end on line boundaries"""
+    if end is None:
+        end = os.path.getsize(convos_path)
+    boundaries = [start]
+    
+    if num_shards > 1 and end > start:
+        with open(convos_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for i in range(1, num_shards):
+                # Step back one byte so a target that is already a line start is kept
+                target = start + (end - start) * i // num_shards
+                newline = mm.find(b'\n', max(target - 1, 0), end)
+                offset = end if newline == -1 else newline + 1
+                if boundaries[-1] < offset < end:
+                    boundaries.append(offset)
+    
+    boundaries.append(end)
+    return [(shard_start, shard_end) for shard_start, shard_end in zip(boundaries, boundaries[1:]) if shard_start < shard_end]
+
+def new_extraction_stats() -> Dict[str, float]:
+    """Counters for the pre-parse ticket ID filter"""
+    return {
+        'skipped_lines': 0,
+        'skipped_bytes': 0,
+        'decoded_lines': 0,
+        'decoded_bytes': 0,
+        'decode_seconds': 0.0,
+        'filter_seconds': 0.0
     }
+
+def merge_extraction_stats(total: Dict[str, float], stats: Dict[str, float]):
+    for key, value in stats.items():
+        total[key] += value
+
+def print_extraction_stats(stats: Dict[str, float]):
+    """Report how many lines the ID filter skipped and roughly how much decode time that saved"""
+    print(f"\nDecoded {stats['decoded_lines']} lines, skipped {stats['skipped_lines']} lines without a filtered ticket ID")
+    if stats['decoded_bytes']:
+        # Estimate what decoding the skipped lines would have cost at the observed rate
+        seconds_per_byte = stats['decode_seconds'] / stats['decoded_bytes']
+        saved = seconds_per_byte * stats['skipped_bytes'] - stats['filter_seconds']
+        print(f"Estimated decode time saved: {saved:.1f}s (ID filter cost {stats['filter_seconds']:.1f}s)")
+
+def build_id_filter(ticket_index: Dict[int, Tuple[str, Dict]]) -> Set[bytes]:
+    """Encode the indexed ticket IDs as they appear in raw JSON, for the pre-parse filter"""
+    return {str(int(ticket_id)).encode() for ticket_id in ticket_index}
+
+def line_may_match_ticket(line: bytes, ticket_index: Dict[int, Tuple[str, Dict]], id_filter: Set[bytes]) -> bool:
+    """Check a raw line (bytes or a memoryview slice) for an indexed ticket ID without decoding the JSON"""
+    match = ID_PATTERN.search(line)
+    if match is None:
+        return False
     
-    # Read convos.json line by line
-    with open(convos_path, 'r') as f:
-        for line in f:
-            try:
-                convo = json.loads(line.strip())
-                ticket_id = convo.get('id')
-                
-                if ticket_id is None:
-                    continue
-                
-                # Find which business type this ticket belongs to
-                for business_type, df in csv_data.items():
-                    if ticket_id in df['Id'].values:
-                        # Get the CSV row data for this ticket
-                        ticket_data = df[df['Id'] == ticket_id].iloc[0].to_dict()
-                        
-                        # Format the conversation
-                        cleaned_conversation = format_conversation(
-                            convo.get('comments', []),
-                            convo.get('requester_id')
-                        )
-                        
-                        # Create the final object with CSV data and cleaned conversation
-                        final_convo = {
-                            **ticket_data,  # Include all CSV data
-                            'cleaned_conversation': cleaned_conversation
-                        }
-                        
-                        conversations[business_type].append(final_convo)
-                        break
+    # Zendesk puts the ticket id near the start of the object. If the first id
+    # key sits directly in the top-level object, it is the ticket id.
+    prefix = JSON_STRING_PATTERN.sub(b'', line[:match.start()])
+    if prefix.count(b'{') - prefix.count(b'}') == 1 and prefix.count(b'[') == prefix.count(b']'):
+        return int(match.group(1)) in ticket_index
+    
+    # Otherwise the first id is a nested one, so check every id in the line
+    return not id_filter.isdisjoint(ID_PATTERN.findall(line, match.start()))
+
+class InputLines:
+    """
+    Iterates the lines of a plain or compressed file from a byte offset, tracking the offset reached
+    
+    With keep_tail the last FINGERPRINT_BYTES read are kept, so the checkpoint
+    fingerprint of a compressed file doesn't need a second decompression pass.
+    """
+    
+    def __init__(self, path: str, start: int = 0, end: Optional[int] = None, keep_tail: bool = False):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.position = start
+        self.keep_tail = keep_tail
+        self.tail = bytearray()
+    
+    def __iter__(self) -> Iterator[bytes]:
+        with open_input(self.path) as f:
+            seek_input(f, self.start)
+            self.position = self.start
+            while self.end is None or self.position < self.end:
+                line = f.readline()
+                if not line:
+                    break
+                self.position += len(line)
+                if self.keep_tail:
+                    self.tail += line
+                    if len(self.tail) > 2 * FINGERPRINT_BYTES:
+                        del self.tail[:-FINGERPRINT_BYTES]
+                yield line
+    
+    def tail_fingerprint(self) -> str:
+        """Hash the FINGERPRINT_BYTES before the offset reached"""
+        tail_start = max(self.position - FINGERPRINT_BYTES, 0)
+        if self.keep_tail and len(self.tail) >= self.position - tail_start:
+            return hashlib.sha256(bytes(self.tail[len(self.tail) - (self.position - tail_start):])).hexdigest()
+        return fingerprint_range(self.path, tail_start, self.position)
+
+class MappedLines(InputLines):
+    """
+    Iterates the lines of a plain file through mmap, as memoryview slices of the mapping
+    
+    Lines are never copied; the ID filter runs on the slices and only the lines
+    it selects are decoded. Compressed files need InputLines.
+    """
+    
+    def __iter__(self) -> Iterator[memoryview]:
+        end = os.path.getsize(self.path) if self.end is None else self.end
+        self.position = self.start
+        if end <= self.start:
+            return
+        
+        f = open(self.path, 'rb')
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mm)
+        try:
+            if hasattr(mm, 'madvise'):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            released = self.start - self.start % mmap.PAGESIZE
+            position = self.start
+            while position < end:
+                newline = mm.find(b'\n', position, end)
+                line_end = end if newline == -1 else newline + 1
+                self.position = line_end
+                yield view[position:line_end]
+                position = line_end
                 
-            except json.JSONDecodeError:
-                print(f"Warning: Skipping invalid JSON line")
+                # Pages already read stay in the page cache, but are dropped
+                # from this process
+                if position - released >= MMAP_RELEASE_BYTES and hasattr(mmap, 'MADV_DONTNEED'):
+                    page_end = position - position % mmap.PAGESIZE
+                    mm.madvise(mmap.MADV_DONTNEED, released, page_end - released)
+                    released = page_end
+        finally:
+            view.release()
+            try:
+                mm.close()
+            except BufferError:
+                # The caller still holds the last line, the mapping is closed
+                # once it is garbage collected
+                pass
+            f.close()
+
+def iter_line_batches(lines: Iterator[bytes], batch_bytes: int) -> Iterator[List[bytes]]:
+    """Group lines into batches of roughly batch_bytes for the worker pool"""
+    batch = []
+    size = 0
+    for line in lines:
+        batch.append(line)
+        size += len(line)
+        if size >= batch_bytes:
+            yield batch
+            batch = []
+            size = 0
+    if batch:
+        yield batch
+
+def iter_line_conversations(lines: Iterator[bytes], ticket_index: Dict[int, Tuple[str, Dict]], id_filter: Set[bytes] = None, stats: Dict[str, float] = None) -> Iterator[Tuple[str, Dict]]:
+    """Parse and clean the conversations in raw convos.json lines"""
+    if id_filter is None:
+        id_filter = build_id_filter(ticket_index)
+    if stats is None:
+        stats = new_extraction_stats()
+    
+    for line in lines:
+        # Skip lines that can't belong to a filtered ticket without decoding them
+        filter_start = time.perf_counter()
+        candidate = line_may_match_ticket(line, ticket_index, id_filter)
+        stats['filter_seconds'] += time.perf_counter() - filter_start
+        if not candidate:
+            stats['skipped_lines'] += 1
+            stats['skipped_bytes'] += len(line)
+            continue
+        
+        try:
+            decode_start = time.perf_counter()
+            convo = json_loads(line)
+            stats['decode_seconds'] += time.perf_counter() - decode_start
+            stats['decoded_lines'] += 1
+            stats['decoded_bytes'] += len(line)
+            ticket_id = convo.get('id')
+            
+            if ticket_id is None:
                 continue
+            
+            # Find which business type this ticket belongs to
+            match = ticket_index.get(ticket_id)
+            if match is None:
+                continue
+            business_type, ticket_data = match
+            
+            # Format the conversation
+            cleaned_conversation = format_conversation(
+                convo.get('comments', []),
+                convo.get('requester_id')
+            )
+            
+            # Create the final object with CSV data and cleaned conversation
+            final_convo = {
+                **ticket_data,  # Include all CSV data
+                'cleaned_conversation': cleaned_conversation
+            }
+            
+            yield business_type, final_convo
+            
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            print(f"Warning: Skipping invalid JSON line")
+            continue
+
+def serialize_conversation(conversation: Dict) -> str:
+    """Encode a conversation as one compact JSONL line (without the newline)"""
+    return json.dumps(conversation, ensure_ascii=False, separators=(',', ':'))
+
+class ConversationWriter:
+    """Appends extracted conversations to one JSONL file per business type"""
+    
+    def __init__(self, output_dir: str, append: bool = False):
+        self.output_dir = output_dir
+        self.mode = 'a' if append else 'w'
+        self.files = {}
+        self.counts = {business_type: 0 for business_type in BUSINESS_TYPES}
     
-    # Save conversations to separate JSON files
-    print("\nSaving conversations...")
-    for business_type, convos in conversations.items():
-        if convos:
-            output_path = os.path.join(output_dir, f'{business_type}_conversations.json')
-            with open(output_path, 'w') as f:
-                json.dump(convos, f, indent=2)
-            print(f"Saved {len(convos)} conversations to {output_path}")
+    def output_path(self, business_type: str) -> str:
+        return os.path.join(self.output_dir, f'{business_type}_conversations.jsonl')
+    
+    def write_line(self, business_type: str, line: str):
+        f = self.files.get(business_type)
+        if f is None:
+            # Files are only opened once the first ticket of a type is found
+            f = open(self.output_path(business_type), self.mode, encoding='utf-8')
+            self.files[business_type] = f
+        f.write(line)
+        f.write('\n')
+        self.counts[business_type] += 1
+    
+    def write(self, business_type: str, conversation: Dict):
+        self.write_line(business_type, serialize_conversation(conversation))
+    
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+def replace_conversations(output_path: str, replacements: Dict[int, str]):
+    """Rewrite a JSONL output file, swapping out the records of changed tickets"""
+    tmp_path = output_path + '.tmp'
+    with open(output_path, 'r', encoding='utf-8') as src, open(tmp_path, 'w', encoding='utf-8') as dst:
+        for line in src:
+            # Output records can hold NaN for empty CSV cells, which only the
+            # standard json module accepts
+            if json.loads(line)['Id'] not in replacements:
+                dst.write(line)
+        for line in replacements.values():
+            dst.write(line)
+            dst.write('\n')
+    os.replace(tmp_path, output_path)
+
+def parquet_dtypes(ticket_index: Dict[int, Tuple[str, Dict]], business_type: str) -> Dict:
+    """Get the column dtypes of a business type's filtered CSV rows, plus the extracted columns"""
+    csv_frame = pd.DataFrame.from_records([record for row_type, record in ticket_index.values() if row_type == business_type])
+    dtypes = csv_frame.dtypes.to_dict()
+    dtypes['business_type'] = pd.CategoricalDtype(BUSINESS_TYPES)
+    dtypes['cleaned_conversation'] = object
+    return dtypes
+
+def export_parquet(jsonl_path: str, parquet_path: str, business_type: str, dtypes: Dict):
+    """Convert a JSONL output file to Parquet in row-group sized batches"""
+    writer = None
+    tmp_path = parquet_path + '.tmp'
+    rows = 0
+    
+    def write_batch(batch: List[Dict]):
+        nonlocal writer
+        df = pd.DataFrame.from_records(batch, columns=[column for column in dtypes if column != 'business_type'])
+        df['business_type'] = business_type
+        # Cast to the CSV dtypes, so a batch where a text column happens to be
+        # all empty still matches the file schema
+        table = pa.Table.from_pandas(df.astype(dtypes), preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(tmp_path, table.schema, compression='zstd')
+        writer.write_table(table)
+    
+    try:
+        batch = []
+        with open(jsonl_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                batch.append(json.loads(line))
+                if len(batch) >= PARQUET_BATCH_ROWS:
+                    write_batch(batch)
+                    rows += len(batch)
+                    batch = []
+        if batch or writer is None:
+            write_batch(batch)
+            rows += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    
+    os.replace(tmp_path, parquet_path)
+    print(f"Exported {rows} conversations to {parquet_path}")
+
+def read_extracted_parquet(output_dir: str, columns: List[str] = None, business_types: List[str] = None) -> 'pa.Table':
+    """
+    Read extracted conversations from the Parquet outputs
+    
+    Only the requested columns are read, so e.g. columns=['Id', 'business_type']
+    never touches conversation text. business_types limits which files are read.
+    """
+    tables = []
+    for business_type in business_types or BUSINESS_TYPES:
+        parquet_path = os.path.join(output_dir, f'{business_type}_conversations.parquet')
+        if os.path.exists(parquet_path):
+            tables.append(pq.read_table(parquet_path, columns=columns))
+    return pa.concat_tables(tables, promote_options='permissive') if tables else None
+
+# Ticket index shared with pool workers through the initializer, so it is
+# sent to each worker once rather than with every shard
+_worker_ticket_index = None
+_worker_id_filter = None
+
+def _init_worker(ticket_index: Dict[int, Tuple[str, Dict]]):
+    global _worker_ticket_index, _worker_id_filter
+    _worker_ticket_index = ticket_index
+    _worker_id_filter = build_id_filter(ticket_index)
+
+def _extract_worker(task: Union[Tuple[str, int, int], List[bytes]]) -> Tuple[List[Tuple[str, Dict]], Dict[str, float]]:
+    # A task is either a (path, start, end) byte range of a plain file or a
+    # batch of lines already read from a compressed one
+    lines = MappedLines(*task) if isinstance(task, tuple) else task
+    stats = new_extraction_stats()
+    conversations = list(iter_line_conversations(lines, _worker_ticket_index, _worker_id_filter, stats))
+    return conversations, stats
+
+def imap_bounded(pool: multiprocessing.Pool, func: Callable, tasks: Iterable, max_pending: int) -> Iterator[Any]:
+    """Like Pool.imap, but reads at most max_pending tasks ahead of the results consumed"""
+    pending = collections.deque()
+    for task in tasks:
+        pending.append(pool.apply_async(func, (task,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+def extract_conversations(convos_path: str, ticket_index: Dict[int, Tuple[str, Dict]], output_dir: str, workers: int = 1, csv_fingerprint: str = None, full_rebuild: bool = False, output_format: str = 'jsonl'):
+    """
+    Extract and clean conversations from convos.json and stream them to JSONL files by business type
+    
+    convos.json may be gzip, bz2 or zstd compressed. A checkpoint is saved after
+    each run. If convos.json has only been appended to and the filtered CSVs are
+    unchanged (same csv_fingerprint), the next run reads only the new lines,
+    appending new tickets and replacing changed ones. Output written after the
+    last checkpoint, by a run that died before saving it, is dropped first.
+    
+    With output_format='parquet' the JSONL files are also exported to
+    {business_type}_conversations.parquet with typed CSV columns.
+    """
+    print("\nExtracting conversations...")
+    
+    if output_format == 'parquet' and pq is None:
+        raise ImportError("pyarrow is required for Parquet output")
+    
+    checkpoint = None if full_rebuild else load_checkpoint(output_dir)
+    if not full_rebuild and can_resume(checkpoint, convos_path, csv_fingerprint) and restore_outputs(checkpoint, output_dir):
+        start = checkpoint['convos_offset']
+        emitted = checkpoint['emitted']
+        print(f"Resuming from byte {start} with {len(emitted)} previously extracted tickets")
+    else:
+        start = 0
+        emitted = {}
+        # Drop outputs of the previous run so no stale business type file survives
+        for business_type in BUSINESS_TYPES:
+            stale_path = os.path.join(output_dir, f'{business_type}_conversations.jsonl')
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+    
+    # Compressed input can't be split by byte range, so it is read to the end
+    # as one stream (and handed to workers in batches of lines)
+    compressed = detect_compression(convos_path) is not None
+    if compressed:
+        lines = InputLines(convos_path, start, keep_tail=True)
+    else:
+        lines = MappedLines(convos_path, start, find_complete_end(convos_path))
+    
+    writer = ConversationWriter(output_dir, append=start > 0)
+    stats = new_extraction_stats()
+    # Changed tickets by business type, as ticket ID -> replacement line
+    changed = {business_type: {} for business_type in BUSINESS_TYPES}
+    pool = None
+    
+    def emit(business_type: str, convo: Dict):
+        line = serialize_conversation(convo)
+        digest = hashlib.blake2b(line.encode('utf-8'), digest_size=16).hexdigest()
+        ticket_id = int(convo['Id'])
+        previous = emitted.get(ticket_id)
+        if previous is None:
+            writer.write_line(business_type, line)
+        elif previous != digest:
+            changed[business_type][ticket_id] = line
+        emitted[ticket_id] = digest
+    
+    try:
+        if workers <= 1:
+            # Read convos.json line by line in this process
+            for business_type, convo in iter_line_conversations(lines, ticket_index, stats=stats):
+                emit(business_type, convo)
+        else:
+            if compressed:
+                tasks = iter_line_batches(lines, MAX_SHARD_BYTES // 4)
+                print(f"Parsing compressed input in batches with {workers} workers...")
+            else:
+                # Use a few shards per worker so one slow shard doesn't hold up the pool
+                num_shards = max(workers * 4, -(-(lines.end - start) // MAX_SHARD_BYTES))
+                shards = find_shard_offsets(convos_path, num_shards, start, lines.end)
+                tasks = [(convos_path, shard_start, shard_end) for shard_start, shard_end in shards]
+                # Workers read the shards themselves, covering the whole range
+                lines.position = lines.end
+                print(f"Parsing {len(shards)} shards with {workers} workers...")
+            pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(ticket_index,))
+            # Results come back in file order, so the output matches a
+            # single-process run exactly
+            for shard_conversations, shard_stats in imap_bounded(pool, _extract_worker, tasks, workers * 2):
+                for business_type, convo in shard_conversations:
+                    emit(business_type, convo)
+                merge_extraction_stats(stats, shard_stats)
+    finally:
+        writer.close()
+        if pool is not None:
+            pool.close()
+            pool.join()
+    end = lines.position
+    
+    # Swap the old records of changed tickets for their latest version
+    for business_type, replacements in changed.items():
+        if replacements:
+            replace_conversations(writer.output_path(business_type), replacements)
+    
+    save_checkpoint(output_dir, {
+        'convos_offset': end,
+        'convos_head_sha256': fingerprint_range(convos_path, 0, min(FINGERPRINT_BYTES, end)),
+        'convos_tail_sha256': lines.tail_fingerprint(),
+        'csv_fingerprint': csv_fingerprint,
+        'outputs': output_fingerprints(output_dir),
+        'emitted': emitted
+    })
+    
+    print_extraction_stats(stats)
+    
+    print()
+    for business_type in BUSINESS_TYPES:
+        if writer.counts[business_type] or changed[business_type]:
+            print(f"Saved {writer.counts[business_type]} new and {len(changed[business_type])} updated conversations to {writer.output_path(business_type)}")
+    
+    for business_type in BUSINESS_TYPES:
+        jsonl_path = writer.output_path(business_type)
+        parquet_path = os.path.join(output_dir, f'{business_type}_conversations.parquet')
+        if output_format == 'parquet' and os.path.exists(jsonl_path):
+            export_parquet(jsonl_path, parquet_path, business_type, parquet_dtypes(ticket_index, business_type))
+        elif os.path.exists(parquet_path):
+            # Readers prefer Parquet, so don't leave an out of date copy behind
+            os.remove(parquet_path)
 
 def main():
+    parser = argparse.ArgumentParser(description="Extract and clean support conversations by business type")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of worker processes used to parse convos.json (default: 1)")
+    parser.add_argument('--full-rebuild', action='store_true',
+                        help="Ignore the checkpoint and re-extract all of convos.json")
+    parser.add_argument('--convos', default=None,
+                        help="Path to the Zendesk conversation dump, plain or .gz/.bz2/.zst "
+                             "(default: convos.json or a compressed variant next to this script)")
+    parser.add_argument('--format', choices=['jsonl', 'parquet'], default='jsonl',
+                        help="Also export the extracted conversations to Parquet (needs pyarrow)")
+    args = parser.parse_args()
+    
     # Get current directory
     current_dir = os.path.dirname(os.path.abspath(__file__))
     
     # Define file paths
     filtered_dir = os.path.join(current_dir, 'filtered_conversations')
-    convos_path = os.path.join(current_dir, 'convos.json')
+    convos_path = args.convos or find_input_file(current_dir, 'convos.json')
     output_dir = os.path.join(current_dir, 'extracted_conversations')
     
     try:
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
         
-        # Load CSV data
-        csv_data = load_filtered_csvs(filtered_dir)
+        # Load CSV data into a ticket ID index
+        ticket_index = load_filtered_csvs(filtered_dir)
         
-        # Extract and save conversations
-        extract_conversations(convos_path, csv_data, output_dir)
+        # Extract and save conversations, resuming from the last checkpoint when possible
+        extract_conversations(
+            convos_path,
+            ticket_index,
+            output_dir,
+            workers=args.workers,
+            csv_fingerprint=fingerprint_filtered_csvs(filtered_dir),
+            full_rebuild=args.full_rebuild,
+            output_format=args.format
+        )
         
     except Exception as e:
         print(f"\nError occurred: {str(e)}")
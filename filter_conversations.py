@@ -0,0 +1,160 @@
+import argparse
+import csv
+import io
+import json
+import os
+import time
+from typing import Dict, Tuple
+
+from business_store import BUSINESS_TYPES, BusinessStore, email_owner_rank, normalize_email
+from extract_conversation_jsons import find_input_file, open_input
+
+# Ticket export column holding the email a ticket is matched on
+DEFAULT_EMAIL_COLUMN = 'Requester email'
+
+# Columns appended to every filtered CSV row
+BUSINESS_COLUMNS = ['business_id', 'business_order_count']
+
+# Tickets between progress lines
+PROGRESS_INTERVAL = 1000000
+
+def build_email_index(businesses: Dict) -> Dict[str, Tuple[str, str, int]]:
+    """
+    Build an email -> (business type, business ID, order count) lookup from businesses.json
+    
+    An email shared by several businesses maps to its owner by
+    business_store.email_owner_rank, the same business BusinessStore.find_by_email returns.
+    """
+    email_index = {}
+    ranks = {}
+    
+    for business_id, business in businesses.items():
+        entry = (business['type'], str(business_id), business['order_count'])
+        for position, email in enumerate([business['main_email']] + business['role_emails']):
+            if not email:
+                continue
+            email = normalize_email(email)
+            rank = email_owner_rank(business['type'], business_id, position)
+            if email not in ranks or rank < ranks[email]:
+                ranks[email] = rank
+                email_index[email] = entry
+    
+    return email_index
+
+def load_email_index(businesses_path: str) -> Dict[str, Tuple[str, str, int]]:
+    """Load businesses.json and index its main and role emails"""
+    print(f"Loading businesses from '{businesses_path}'...")
+    with open(businesses_path, 'r') as f:
+        businesses = json.load(f)
+    email_index = build_email_index(businesses)
+    print(f"Indexed {len(email_index)} emails of {len(businesses)} businesses")
+    return email_index
+
+def load_store_email_index(store_path: str) -> Dict[str, Tuple[str, str, int]]:
+    """Build the email index from the business store, reading only its email rows instead of all of businesses.json"""
+    print(f"Loading business emails from '{store_path}'...")
+    email_index = {}
+    ranks = {}
+    with BusinessStore(store_path) as store:
+        for email, business_id, business_type, order_count, position in store.iter_emails():
+            rank = email_owner_rank(business_type, business_id, position)
+            if email not in ranks or rank < ranks[email]:
+                ranks[email] = rank
+                email_index[email] = (business_type, str(business_id), order_count)
+        print(f"Indexed {len(email_index)} emails of {len(store)} businesses")
+    return email_index
+
+def filter_tickets(tickets_path: str, email_index: Dict[str, Tuple[str, str, int]], filtered_dir: str,
+                   email_column: str = DEFAULT_EMAIL_COLUMN) -> Dict[str, int]:
+    """
+    Stream a Zendesk ticket export and write each matched ticket to its business type's filtered CSV
+    
+    Tickets are read and written one row at a time, so memory only holds the
+    email index, whatever the size of the export. The CSVs are written next to
+    their final paths and moved into place once the export has been read.
+    
+    Returns:
+        Tickets written by business type
+    """
+    os.makedirs(filtered_dir, exist_ok=True)
+    output_paths = {business_type: os.path.join(filtered_dir, f'{business_type}_conversations.csv') for business_type in BUSINESS_TYPES}
+    files = {business_type: open(path + '.tmp', 'w', newline='', encoding='utf-8') for business_type, path in output_paths.items()}
+    counts = {business_type: 0 for business_type in BUSINESS_TYPES}
+    tickets = 0
+    start = time.time()
+    complete = False
+    
+    try:
+        # utf-8-sig drops the byte order mark Zendesk puts at the start of its exports
+        with io.TextIOWrapper(open_input(tickets_path), encoding='utf-8-sig', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            if email_column not in header:
+                raise ValueError(f"Ticket export has no '{email_column}' column")
+            email_position = header.index(email_column)
+            # Business columns from an earlier pass are replaced, not repeated
+            kept_positions = [i for i, column in enumerate(header) if column not in BUSINESS_COLUMNS]
+            
+            writers = {business_type: csv.writer(output) for business_type, output in files.items()}
+            for writer in writers.values():
+                writer.writerow([header[i] for i in kept_positions] + BUSINESS_COLUMNS)
+            
+            for row in reader:
+                tickets += 1
+                if tickets % PROGRESS_INTERVAL == 0:
+                    print(f"Read {tickets} tickets ({tickets / (time.time() - start):.0f}/s)")
+                if len(row) <= email_position or not row[email_position]:
+                    continue
+                match = email_index.get(normalize_email(row[email_position]))
+                if match is None:
+                    continue
+                business_type, business_id, order_count = match
+                writers[business_type].writerow([row[i] for i in kept_positions] + [business_id, order_count])
+                counts[business_type] += 1
+        complete = True
+    finally:
+        for business_type, f in files.items():
+            f.close()
+            if complete:
+                os.replace(f.name, output_paths[business_type])
+            else:
+                os.remove(f.name)
+    
+    print(f"Matched {sum(counts.values())} of {tickets} tickets to businesses")
+    for business_type in BUSINESS_TYPES:
+        print(f"- {business_type}: {counts[business_type]} tickets")
+    return counts
+
+def main():
+    # Get current directory
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    parser = argparse.ArgumentParser(description="Split a Zendesk ticket export into the filtered CSVs by business type")
+    parser.add_argument('--tickets', default=None,
+                        help="Path to the Zendesk ticket export CSV, plain or .gz/.bz2/.zst "
+                             "(default: tickets.csv or a compressed variant next to this script)")
+    parser.add_argument('--businesses', default=os.path.join(current_dir, 'businesses.json'),
+                        help="businesses.json written by extract_businesses.py")
+    parser.add_argument('--business-store', default=None,
+                        help="businesses.db written by extract_businesses.py --business-store, read instead of businesses.json")
+    parser.add_argument('--email-column', default=DEFAULT_EMAIL_COLUMN,
+                        help=f"Ticket export column matched against business emails (default: {DEFAULT_EMAIL_COLUMN})")
+    args = parser.parse_args()
+    
+    tickets_path = args.tickets or find_input_file(current_dir, 'tickets.csv')
+    filtered_dir = os.path.join(current_dir, 'filtered_conversations')
+    
+    try:
+        if args.business_store:
+            email_index = load_store_email_index(args.business_store)
+        else:
+            email_index = load_email_index(args.businesses)
+        filter_tickets(tickets_path, email_index, filtered_dir, args.email_column)
+        print(f"\nFiltered CSVs saved to '{filtered_dir}'")
+    except Exception as e:
+        print(f"\nError occurred: {str(e)}")
+        print(f"Error type: {type(e)}")
+        raise
+
+if __name__ == "__main__":
+    main()
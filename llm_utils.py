@@ -0,0 +1,363 @@
+import json
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.request import ACCEPT_ENCODING
+
+# Rough characters per token of English prompt text, for budgeting before a call
+CHARS_PER_TOKEN = 4
+
+# Output tokens budgeted per call on top of the prompt
+RESPONSE_TOKENS_ESTIMATE = 1000
+
+def estimate_tokens(prompt: str) -> int:
+    """Estimate the tokens a call uses, its prompt plus a typical response"""
+    return len(prompt) // CHARS_PER_TOKEN + RESPONSE_TOKENS_ESTIMATE
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute token buckets shared by all threads of a run
+    
+    Each bucket holds up to one minute of quota and refills continuously. A
+    call waits until both buckets can cover it, so bursts up to the per-minute
+    limits go out at once and sustained load settles at the quota.
+    """
+    
+    def __init__(self, requests_per_minute: float = None, tokens_per_minute: float = None):
+        """
+        Args:
+            requests_per_minute: Request quota, or None for no request limit
+            tokens_per_minute: Token quota, or None for no token limit
+        """
+        self.limits = {'requests': requests_per_minute, 'tokens': tokens_per_minute}
+        self.levels = {name: limit for name, limit in self.limits.items() if limit}
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+        self.wait_seconds = 0.0
+    
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        for name, level in self.levels.items():
+            limit = self.limits[name]
+            self.levels[name] = min(limit, level + elapsed * limit / 60)
+    
+    def acquire(self, tokens: int = 0) -> float:
+        """Block until one request of this many tokens fits both quotas, then use it up; returns the seconds waited"""
+        # A call larger than a whole minute of quota would never fit, so it
+        # only waits for a full bucket
+        costs = {'requests': 1, 'tokens': tokens}
+        costs = {name: min(costs[name], self.limits[name]) for name in self.levels}
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                wait = max([(costs[name] - level) * 60 / self.limits[name] for name, level in self.levels.items()] + [0])
+                if wait <= 0:
+                    for name in self.levels:
+                        self.levels[name] -= costs[name]
+                    self.wait_seconds += waited
+                    return waited
+            time.sleep(wait)
+            waited += wait
+
+# Seconds to establish a connection and to wait between bytes of the response;
+# an analysis can take a minute or more to generate before the first byte
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 180.0
+
+# HTTP statuses worth retrying besides 5xx; any other 4xx is a bad request that
+# fails the same way every time
+RETRYABLE_STATUSES = {408, 409, 429}
+
+class ResponseParseError(ValueError):
+    """Raised when a provider keeps answering with content that can't be parsed"""
+
+def parse_json_content(content: str):
+    """Parse a model response as JSON, tolerating a markdown code block around it"""
+    # Strip markdown code blocks if present
+    if content.startswith('```'):
+        content = content.split('\n', 1)[1]  # Remove first line (```json)
+        content = content.rsplit('\n', 1)[0]  # Remove last line (```)
+    content = content.strip()
+    
+    # Fix escaped quotes before parsing JSON
+    content = content.replace('\\\'', "'")
+    
+    return json.loads(content)
+
+def error_status(error: Exception) -> Optional[int]:
+    """Get the HTTP status behind a requests or Google API error, if there is one"""
+    response = getattr(error, 'response', None)
+    if isinstance(response, requests.Response):
+        return response.status_code
+    code = getattr(error, 'code', None)
+    return code if isinstance(code, int) else None
+
+def is_outage(error: Exception) -> bool:
+    """Whether an error means the provider is unreachable or failing, rather than rejecting one call"""
+    status = error_status(error)
+    return isinstance(error, (requests.ConnectionError, requests.Timeout)) or (status is not None and status >= 500)
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Get the delay a Retry-After header asks for, in seconds or as an HTTP date"""
+    response = getattr(error, 'response', None)
+    if not isinstance(response, requests.Response):
+        return None
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+class CircuitBreaker:
+    """
+    Pauses every call of a run while the provider is down
+    
+    After failure_threshold outage errors in a row the breaker opens and all
+    calls wait out a cooldown. Then a single trial call goes through: if it
+    succeeds the breaker closes, otherwise it opens again for twice as long,
+    up to max_cooldown_seconds.
+    """
+    
+    def __init__(self, failure_threshold: int = 5, cooldown_seconds: float = 30, max_cooldown_seconds: float = 600):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown_seconds
+        self.max_cooldown = max_cooldown_seconds
+        self.cooldown = cooldown_seconds
+        self.failures = 0
+        self.open_until = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+    
+    def wait_until_closed(self):
+        """Block while the breaker is open; after the cooldown, let one trial call through"""
+        while True:
+            with self.lock:
+                if self.open_until is None:
+                    return
+                wait = self.open_until - time.monotonic()
+                if wait <= 0 and not self.trial_in_flight:
+                    self.trial_in_flight = True
+                    return
+            # Calls queued behind a trial check back until it has finished
+            time.sleep(wait if wait > 0 else 0.5)
+    
+    def record_success(self):
+        """The provider answered, whatever the answer was"""
+        with self.lock:
+            if self.open_until is not None:
+                print("\nProvider is answering again, resuming calls")
+            self.failures = 0
+            self.open_until = None
+            self.trial_in_flight = False
+            self.cooldown = self.base_cooldown
+    
+    def record_failure(self):
+        """The provider was unreachable or failed with a server error"""
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_flight or (self.open_until is None and self.failures >= self.failure_threshold):
+                if self.trial_in_flight:
+                    self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                self.trial_in_flight = False
+                self.open_until = time.monotonic() + self.cooldown
+                print(f"\nProvider looks down after {self.failures} failures in a row, pausing all calls for {self.cooldown:.1f}s")
+
+class RetryPolicy:
+    """
+    Retries model calls with exponential backoff and full jitter
+    
+    Transport errors (connection problems, timeouts, 408/409/429 and 5xx
+    responses) and unparseable responses have separate retry budgets. A
+    Retry-After header overrides the backoff, up to max_retry_after. Other
+    4xx responses are raised at once. Outage errors feed a circuit breaker, which one policy shares
+    between all threads of a run.
+    """
+    
+    def __init__(self, transport_retries: int = 5, parse_retries: int = 2, base_delay: float = 1.0,
+                 max_delay: float = 60.0, max_retry_after: float = 300.0, breaker: CircuitBreaker = None):
+        """
+        Args:
+            transport_retries: Retries after transport errors
+            parse_retries: Retries after responses that can't be parsed
+            base_delay: Backoff cap of the first retry, doubled on every further retry
+            max_delay: Largest backoff cap
+            max_retry_after: Longest Retry-After honoured, so one bad header can't stall a worker for hours
+            breaker: Circuit breaker to share, or None for a new one
+        """
+        self.transport_retries = transport_retries
+        self.parse_retries = parse_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.breaker = breaker or CircuitBreaker()
+    
+    def backoff(self, retry: int) -> float:
+        """Full jitter: a uniform delay between 0 and the exponential cap of this retry"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+    
+    def call(self, request: Callable[[], str], parse: Callable, label: str = 'call', acquire: Callable[[], Any] = None):
+        """
+        Run request and parse its response, retrying both within their budgets
+        
+        acquire, typically a RateLimiter.acquire, runs before every attempt,
+        so retries stay within the rate limits as well.
+        
+        Raises:
+            ResponseParseError: Every response failed to parse
+            Exception: The last transport error once the transport budget is
+                used up, or a non-retryable error at once
+        """
+        transport_failures = 0
+        parse_failures = 0
+        while True:
+            self.breaker.wait_until_closed()
+            if acquire is not None:
+                acquire()
+            try:
+                content = request()
+            except Exception as e:
+                status = error_status(e)
+                if is_outage(e):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if status is not None and status < 500 and status not in RETRYABLE_STATUSES:
+                    raise
+                transport_failures += 1
+                if transport_failures > self.transport_retries:
+                    raise
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = self.backoff(transport_failures - 1)
+                else:
+                    delay = min(delay, self.max_retry_after)
+                print(f"\nError in {label}: {str(e)}")
+                print(f"Retrying in {delay:.1f} seconds... (transport retry {transport_failures}/{self.transport_retries})")
+                time.sleep(delay)
+                continue
+            
+            self.breaker.record_success()
+            try:
+                return parse(content)
+            except Exception as e:
+                parse_failures += 1
+                if parse_failures > self.parse_retries:
+                    raise ResponseParseError(f"{label}: {str(e)}") from e
+                # A fresh sample usually parses, so there is nothing to wait for
+                print(f"\nError parsing response content in {label}: {str(e)}")
+                print(f"Retrying... (parse retry {parse_failures}/{self.parse_retries})")
+
+# Connection setup time of the current thread's request, set by the timed connections
+_connection_timing = threading.local()
+
+class TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _connection_timing.seconds = getattr(_connection_timing, 'seconds', 0.0) + time.perf_counter() - start
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        # TCP and TLS handshakes both happen here
+        start = time.perf_counter()
+        super().connect()
+        _connection_timing.seconds = getattr(_connection_timing, 'seconds', 0.0) + time.perf_counter() - start
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections record how long they took to set up"""
+    
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+
+class HTTPClient:
+    """
+    Pooled keep-alive HTTP client for the model APIs, shared by all threads of a run
+    
+    Connections are reused across calls, so only the first call on each pays
+    the TCP and TLS handshakes. Every request has connect and read timeouts
+    and accepts compressed responses. Each call's connection setup time, time
+    to first byte and total time are recorded for print_timings.
+    """
+    
+    def __init__(self, pool_size: int = 1, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT, headers: dict = None):
+        """
+        Args:
+            pool_size: Connections kept open per host, the number of concurrent calls
+            connect_timeout: Seconds to establish a connection
+            read_timeout: Seconds to wait for the next bytes of a response
+            headers: Headers sent with every request, such as the API key
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        # Retries are up to RetryPolicy; a blocking pool keeps the connection count at pool_size
+        adapter = TimedHTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # requests only asks for gzip and deflate; urllib3 also lists br and zstd
+        # when the brotli and zstandard packages are there to decode them
+        self.session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+        self.session.headers.update(headers or {})
+        # (connection setup, time to first byte, total) of every call, in seconds
+        self.timings = []
+    
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request on a pooled connection and record its timings"""
+        _connection_timing.seconds = 0.0
+        start = time.perf_counter()
+        response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+        total = time.perf_counter() - start
+        connect = _connection_timing.seconds
+        # elapsed runs from sending the request until the response headers are parsed
+        ttfb = max(response.elapsed.total_seconds() - connect, 0.0)
+        # list.append is atomic, so concurrent calls can record without a lock
+        self.timings.append((connect, ttfb, total))
+        return response
+    
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """POST a request on a pooled connection and record its timings"""
+        return self.request('POST', url, **kwargs)
+    
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """GET a resource on a pooled connection and record its timings"""
+        return self.request('GET', url, **kwargs)
+    
+    def close(self):
+        self.session.close()
+    
+    def print_timings(self):
+        """Print how call time splits into connection setup, time to first byte and download"""
+        if not self.timings:
+            return
+        print("\nHTTP call timings (seconds):")
+        print(f"{'':<18} {'p50':>8} {'p95':>8} {'max':>8}")
+        new_connections = sum(1 for connect, _, _ in self.timings if connect > 0)
+        for name, index in [('connection setup', 0), ('time to 1st byte', 1), ('total', 2)]:
+            values = sorted(timing[index] for timing in self.timings)
+            p50 = values[len(values) // 2]
+            p95 = values[min(int(len(values) * 0.95), len(values) - 1)]
+            print(f"{name:<18} {p50:>8.3f} {p95:>8.3f} {values[-1]:>8.3f}")
+        print(f"{len(self.timings)} calls on {new_connections} new connections")
@@ -1,11 +1,12 @@
+import argparse
 import json
 import os
 import csv
 import time
-import requests
 import google.generativeai as genai
 from typing import Dict, List, Literal
 from dotenv import load_dotenv
+from llm_utils import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, HTTPClient, RetryPolicy, parse_json_content
 
 # Load environment variables
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -13,7 +14,8 @@ env_path = os.path.join(current_dir, 'env.env')
 load_dotenv(env_path)
 
 class SubcategoryStandardizer:
-    def __init__(self, api_key: str, prompt_template: str, model: Literal["gemini", "deepseek"] = "deepseek"):
+    def __init__(self, api_key: str, prompt_template: str, model: Literal["gemini", "deepseek"] = "deepseek",
+                 retry_policy: RetryPolicy = None, http_client: HTTPClient = None):
         """
         Initialize the standardizer with API key and prompt template
         
@@ -21,17 +23,72 @@ class SubcategoryStandardizer:
             api_key: The API key for the selected model
             prompt_template: The template for the analysis prompt
             model: Which model to use ("gemini" or "deepseek")
+            retry_policy: Retry policy for API calls
+            http_client: Pooled HTTP client for DeepSeek calls; one with a single connection by default
         """
         self.model_type = model
         self.prompt_template = prompt_template
+        self.retry_policy = retry_policy or RetryPolicy()
         
         if model == "gemini":
             genai.configure(api_key=api_key)
             self.model = genai.GenerativeModel('models/gemini-2.0-flash-lite')
         else:  # deepseek
             self.api_key = api_key
+            # Headers are set on the pooled session once instead of on every call
+            self.http_client = http_client or HTTPClient()
+            self.http_client.session.headers.update({
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            })
             self.api_url = "https://api.deepseek.com/v1/chat/completions"
 
+    def request(self, prompt: str) -> str:
+        """Send one prompt to the selected API and return the response text"""
+        if self.model_type == "gemini":
+            # Make API call with Gemini
+            response = self.model.generate_content(
+                contents=[{
+                    "parts": [{
+                        "text": prompt
+                    }]
+                }],
+                safety_settings=[
+                    {
+                        "category": "HARM_CATEGORY_HARASSMENT",
+                        "threshold": "BLOCK_NONE"
+                    },
+                    {
+                        "category": "HARM_CATEGORY_HATE_SPEECH",
+                        "threshold": "BLOCK_NONE"
+                    },
+                    {
+                        "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+                        "threshold": "BLOCK_NONE"
+                    },
+                    {
+                        "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+                        "threshold": "BLOCK_NONE"
+                    }
+                ]
+            )
+            content = response.text
+        else:
+            # Make API call with DeepSeek
+            data = {
+                "model": "deepseek-chat",
+                "messages": [
+                    {"role": "system", "content": "You are a business operations manager at CoinGate."},
+                    {"role": "user", "content": prompt}
+                ],
+                "temperature": 0.7
+            }
+            
+            response = self.http_client.post(self.api_url, json=data)
+            response.raise_for_status()
+            content = response.json()['choices'][0]['message']['content']
+        return content
+
     def standardize_subcategory(self, case_data: Dict, issue_types: List[Dict]) -> str:
         """
         Analyze a single case and determine the appropriate tag_name(s)
@@ -43,111 +100,22 @@ class SubcategoryStandardizer:
         Returns:
             str: Comma-separated list of matching tag_names
         """
-        max_retries = 5
-        retry_count = 0
+        # Format the prompt with the case data and issue types
+        prompt = self.prompt_template.format(
+            summary=case_data['summary'],
+            raw_discovery_tags=case_data['raw_discovery_tags'],
+            issue_types=json.dumps(issue_types, indent=2)
+        )
         
-        while retry_count < max_retries:
-            try:
-                # Format the prompt with the case data and issue types
-                prompt = self.prompt_template.format(
-                    summary=case_data['summary'],
-                    raw_discovery_tags=case_data['raw_discovery_tags'],
-                    issue_types=json.dumps(issue_types, indent=2)
-                )
-                
-                if self.model_type == "gemini":
-                    # Make API call with Gemini
-                    response = self.model.generate_content(
-                        contents=[{
-                            "parts": [{
-                                "text": prompt
-                            }]
-                        }],
-                        safety_settings=[
-                            {
-                                "category": "HARM_CATEGORY_HARASSMENT",
-                                "threshold": "BLOCK_NONE"
-                            },
-                            {
-                                "category": "HARM_CATEGORY_HATE_SPEECH",
-                                "threshold": "BLOCK_NONE"
-                            },
-                            {
-                                "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                                "threshold": "BLOCK_NONE"
-                            },
-                            {
-                                "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                                "threshold": "BLOCK_NONE"
-                            }
-                        ]
-                    )
-                    content = response.text
-                else:
-                    # Make API call with DeepSeek
-                    headers = {
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    }
-                    
-                    data = {
-                        "model": "deepseek-chat",
-                        "messages": [
-                            {"role": "system", "content": "You are a business operations manager at CoinGate."},
-                            {"role": "user", "content": prompt}
-                        ],
-                        "temperature": 0.7
-                    }
-                    
-                    response = requests.post(self.api_url, headers=headers, json=data)
-                    response.raise_for_status()
-                    content = response.json()['choices'][0]['message']['content']
-                
-                # Try to parse the response
-                try:
-                    # Strip markdown code blocks if present
-                    if content.startswith('```'):
-                        content = content.split('\n', 1)[1]  # Remove first line (```json)
-                        content = content.rsplit('\n', 1)[0]  # Remove last line (```)
-                    content = content.strip()
-                    
-                    # Fix escaped quotes before parsing JSON
-                    content = content.replace('\\\'', "'")
-                    
-                    # Parse the response as JSON
-                    result = json.loads(content)
-                    return result.get('tag_names', '')
-                    
-                except Exception as e:
-                    print(f"Error parsing response content: {str(e)}")
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        print(f"Retrying in 10 seconds... (Attempt {retry_count + 1}/{max_retries})")
-                        time.sleep(10)
-                        continue
-                    return ''
-                
-            except Exception as e:
-                error_str = str(e)
-                # Check if it's a rate limit error
-                if "rate limit" in error_str.lower() or (self.model_type == "deepseek" and hasattr(response, 'status_code') and response.status_code == 429):
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        print(f"\nRate limit reached, retrying in 10 seconds... (Attempt {retry_count + 1}/{max_retries})")
-                        time.sleep(10)
-                        continue
-                    return ''
-                else:
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        print(f"Error in standardize_subcategory: {error_str}")
-                        print(f"Retrying in 10 seconds... (Attempt {retry_count + 1}/{max_retries})")
-                        time.sleep(10)
-                        continue
-                    return ''
-        
-        # If we've exhausted all retries
-        return ''
+        try:
+            return self.retry_policy.call(
+                lambda: self.request(prompt),
+                lambda content: parse_json_content(content).get('tag_names', ''),
+                'standardize_subcategory'
+            )
+        except Exception as e:
+            print(f"Error in standardize_subcategory: {str(e)}")
+            return ''
 
 def extract_ticket_id_from_url(url: str) -> int:
     """Extract ticket ID from Zendesk URL or Google Sheets HYPERLINK formula"""
@@ -169,7 +137,60 @@ def get_processed_ticket_ids(csv_path: str) -> set:
                 processed_ids.add(ticket_id)
     return processed_ids
 
+def standardize_file(input_csv: str, output_csv: str, standardizer: SubcategoryStandardizer, issue_types: List[Dict], processed_ids: set) -> None:
+    """Standardize the subcategory of every unprocessed row in the analysis CSV and append it to the output CSV"""
+    with open(input_csv, 'r') as infile:
+        reader = csv.DictReader(infile)
+        fieldnames = reader.fieldnames
+        
+        # Create or append to output file
+        file_exists = os.path.exists(output_csv)
+        with open(output_csv, 'a', newline='') as outfile:
+            writer = csv.DictWriter(outfile, fieldnames=fieldnames)
+            
+            # Write header only if file is new
+            if not file_exists:
+                writer.writeheader()
+            
+            total_rows = sum(1 for row in reader)
+            infile.seek(0)
+            next(reader)  # Skip header
+            
+            for i, row in enumerate(reader, 1):
+                # Extract ticket ID
+                ticket_id = extract_ticket_id_from_url(row['ticket_id'])
+                
+                # Skip if already processed
+                if ticket_id in processed_ids:
+                    print(f"\rSkipping {i}/{total_rows}", end='', flush=True)
+                    continue
+                
+                # Skip rows without raw_discovery_tags
+                if not row['raw_discovery_tags']:
+                    continue
+                
+                print(f"\rProcessing row {i}/{total_rows}", end='', flush=True)
+                
+                # Get standardized subcategory
+                standardized_tags = standardizer.standardize_subcategory(row, issue_types)
+                
+                # Update the subcategory field
+                row['subcategory'] = standardized_tags
+                
+                # Write the updated row
+                writer.writerow(row)
+                
+                # Add a small delay to avoid rate limiting
+                time.sleep(1)
+
 def main():
+    parser = argparse.ArgumentParser(description="Map analyzed conversations to the standardized issue tags with an LLM")
+    parser.add_argument('--connect-timeout', type=float, default=DEFAULT_CONNECT_TIMEOUT,
+                        help=f"Seconds to connect to the API (default: {DEFAULT_CONNECT_TIMEOUT:g})")
+    parser.add_argument('--read-timeout', type=float, default=DEFAULT_READ_TIMEOUT,
+                        help=f"Seconds to wait for the API response (default: {DEFAULT_READ_TIMEOUT:g})")
+    args = parser.parse_args()
+    
     # Get API keys from environment variables
     deepseek_api_key = os.getenv('DEEPSEEK_API_KEY')
     gemini_api_key = os.getenv('GEMINI_API_KEY')
@@ -218,7 +239,9 @@ def main():
     """
     
     # Initialize standardizer
-    standardizer = SubcategoryStandardizer(api_key, prompt_template, model=selected_model)
+    # Cases are standardized one at a time, so DeepSeek calls share one keep-alive connection
+    http_client = HTTPClient(1, args.connect_timeout, args.read_timeout)
+    standardizer = SubcategoryStandardizer(api_key, prompt_template, model=selected_model, http_client=http_client)
     
     # Define input and output paths
     input_csv = os.path.join(current_dir, 'conversation_analysis_7.csv')
@@ -229,49 +252,10 @@ def main():
     print(f"Found {len(processed_ids)} already processed tickets")
     
     # Process the CSV file
-    with open(input_csv, 'r') as infile:
-        reader = csv.DictReader(infile)
-        fieldnames = reader.fieldnames
-        
-        # Create or append to output file
-        file_exists = os.path.exists(output_csv)
-        with open(output_csv, 'a', newline='') as outfile:
-            writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-            
-            # Write header only if file is new
-            if not file_exists:
-                writer.writeheader()
-            
-            total_rows = sum(1 for row in reader)
-            infile.seek(0)
-            next(reader)  # Skip header
-            
-            for i, row in enumerate(reader, 1):
-                # Extract ticket ID
-                ticket_id = extract_ticket_id_from_url(row['ticket_id'])
-                
-                # Skip if already processed
-                if ticket_id in processed_ids:
-                    print(f"\rSkipping {i}/{total_rows}", end='', flush=True)
-                    continue
-                
-                # Skip rows without raw_discovery_tags
-                if not row['raw_discovery_tags']:
-                    continue
-                
-                print(f"\rProcessing row {i}/{total_rows}", end='', flush=True)
-                
-                # Get standardized subcategory
-                standardized_tags = standardizer.standardize_subcategory(row, issue_types)
-                
-                # Update the subcategory field
-                row['subcategory'] = standardized_tags
-                
-                # Write the updated row
-                writer.writerow(row)
-                
-                # Add a small delay to avoid rate limiting
-                time.sleep(1)
+    standardize_file(input_csv, output_csv, standardizer, issue_types, processed_ids)
+    
+    http_client.print_timings()
+    http_client.close()
     
     print(f"\nStandardization complete! Results saved to '{output_csv}'")
 